@@ -86,16 +86,103 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.JWTAuthentication',
         "rest_framework.authentication.SessionAuthentication",
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
+    # Number of proxies in front of the api whose X-Forwarded-For is trusted to
+    # get the IP of the client (throttles). 0 for REMOTE_ADDR only, raise it
+    # behind a reverse proxy, otherwise a client can pick its IP in the header.
+    'NUM_PROXIES': 0,
+    # logins to /api/token/ by IP and by username (see api/throttling.py)
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '30/min',
+        'login_username': '10/min',
+    },
 }
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "api.authentication.TokenObtainPairSerializer",
+}
+
+# Iterations of the PBKDF2 password hashes (api.hashers.PBKDF2PasswordHasher),
+# None for the django default (1 000 000). 600 000 is the OWASP minimum for
+# PBKDF2-SHA256. The hashes of fewer iterations are updated at the next login
+# of the users, the hashes of more iterations (django's 1 000 000) are kept.
+PASSWORD_HASH_ITERATIONS = 600_000
+
+# Number of logins hashing a password at the same time in a process, the other
+# ones wait up to LOGIN_HASH_TIMEOUT seconds then get a 503. None for no limit.
+# Keep it under the number of CPUs so the other requests still get some.
+LOGIN_HASH_WORKERS = 2
+LOGIN_HASH_TIMEOUT = 5
+
+# Time (in seconds) the username, staff and active flags of the user of a token
+# are kept in the cache by the JWT authentication, instead of a query by request.
+# None to read the user every time. The entry is dropped when the user is saved:
+# only enable it with a cache shared by all the workers (memcached, redis...),
+# otherwise a worker could accept a deactivated user until the timeout.
+JWT_USER_CACHE_TIMEOUT = None
+
+# Build the user from the claims of the token (ID, username, staff flag) without
+# query nor cache. The refreshed access tokens copy the claims of the refresh
+# token, so a deactivated user or a removed staff flag is only seen when the
+# refresh token expire (REFRESH_TOKEN_LIFETIME). Not used with CHECK_REVOKE_TOKEN,
+# which needs the password of the user.
+JWT_USER_FROM_CLAIMS = False
+
+# Time (in seconds) the project IDs of a user are kept in the cache for the
+# permission checks. None to only keep them for the current request.
+# Only enable it with a cache shared by all the workers (memcached, redis...),
+# otherwise a worker could keep a removed contributor in his cache.
+MEMBERSHIP_CACHE_TIMEOUT = None
+
+# Serve the JSON reads of the projects, issues and comments (list and detail)
+# with async views and the async ORM. Off for WSGI (runserver, Config.wsgi)
+# where the async views only add overhead, Config.asgi use Config.settings_asgi
+# which turn it on.
+ASYNC_READ_VIEWS = False
+
+# Maximum page size a client can ask with the keyset (cursor) pagination.
+KEYSET_MAX_PAGE_SIZE = 100
+
+# Maximum number of items accepted by the bulk endpoints.
+BULK_MAX_SIZE = 500
+
+# Full-text search backend of the issues and comments.
+# api.search.DatabaseSearchBackend for the databases without FTS5.
+SEARCH_BACKEND = 'api.search.SQLiteFTSBackend'
+
+# Number of rows fetched at once by the streamed project export.
+EXPORT_CHUNK_SIZE = 2000
+
+# Number of NDJSON lines inserted together by the bulk import.
+IMPORT_BATCH_SIZE = 1000
+
+# Maximum number of changes read by a call to the change feed.
+CHANGE_FEED_PAGE_SIZE = 500
+
+# Cache of the rendered responses of the project, contributor, issue and comment
+# read endpoints. api.cache.SharedResponseCache with {'alias': 'default', 'timeout': 300}
+# to share it between the processes through a django cache.
+RESPONSE_CACHE = {
+    'BACKEND': 'api.cache.LRUResponseCache',
+    'OPTIONS': {'max_entries': 1000},
+}
+
+# Broker of the project event streams (Server-Sent Events). LocalEventBroker
+# only reach the streams of its process: with many processes or nodes use
+# api.events.ChangeLogEventBroker with {'poll_interval': 1.0}, it reads the change log.
+EVENT_BROKER = {
+    'BACKEND': 'api.events.LocalEventBroker',
+    'OPTIONS': {'max_queue_size': 1000},
 }
+
+# Seconds without event before a heartbeat is sent on the event streams.
+EVENT_STREAM_HEARTBEAT = 15
+
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
@@ -110,6 +197,15 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
+# the first hasher hash the passwords, the others only check the old hashes
+PASSWORD_HASHERS = [
+    'api.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -0,0 +1,7 @@
+"""
+Settings of the ASGI deployment (Config.asgi): the settings of the project
+with the async read views.
+"""
+from .settings import *  # noqa: F401,F403
+
+ASYNC_READ_VIEWS = True
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issue', '0003_comment'),
+        ('project', '0003_project_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ['pk']},
+        ),
+        migrations.AlterModelOptions(
+            name='issue',
+            options={'ordering': ['pk']},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['issue', 'id'], name='comment_issue_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['uuid'], name='comment_uuid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['project', 'id'], name='issue_project_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['project', 'statue'], name='issue_project_statue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['project', 'assign_to'], name='issue_project_assign_idx'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='issue',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='issue.issue', verbose_name='Ticket'),
+        ),
+        migrations.AlterField(
+            model_name='issue',
+            name='project',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='project.project'),
+        ),
+    ]
@@ -1,10 +1,34 @@
-from django.db import models
+from django.db import models, transaction
 import uuid
 from accounts.models import CustomUser
 from project.models import Project
 
 
-class Issue(models.Model):
+class LoadedValuesMixin:
+    """
+    Keep the values of the loaded_fields read from the database, so a save
+    knows which of them it change (has_changed).
+    """
+
+    loaded_fields = []
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.keep_loaded_values()
+        return instance
+
+    def keep_loaded_values(self):
+        self._loaded_values = {
+            name: self.__dict__[name] for name in self.loaded_fields if name in self.__dict__}
+
+    def has_changed(self, *names):
+        """ check if one of the fields changed since loaded, a value not loaded may have."""
+        loaded = getattr(self, '_loaded_values', {})
+        return any(name not in loaded or loaded[name] != self.__dict__.get(name) for name in names)
+
+
+class Issue(LoadedValuesMixin, models.Model):
     STATUE_CHOICES = [
         ('Todo', 'To do'),
         ('InProgress', 'In progress'),
@@ -29,7 +53,9 @@ class Issue(models.Model):
         limit_choices_to={'contributor__project': models.F('project')},
         verbose_name="assigner à"
     )
-    project = models.ForeignKey(Project, null=False, on_delete=models.CASCADE)
+    # indexed by the composite indexes that start with the project
+    project = models.ForeignKey(
+        Project, null=False, on_delete=models.CASCADE, db_index=False)
     title = models.CharField(max_length=30, null=False)
     description = models.TextField(
         max_length=500, verbose_name="Description ticket")
@@ -40,23 +66,111 @@ class Issue(models.Model):
     tag = models.CharField(
         max_length=12, choices=TAG_CHOICES, verbose_name="tag")
     created_time = models.DateField(auto_now_add=True)
+    # rank of the priority (Low < Medium < High), computed by the database
+    # to filter and order the issues by priority with an index
+    priority_rank = models.GeneratedField(
+        expression=models.Case(
+            models.When(priority='Low', then=models.Value(0)),
+            models.When(priority='Medium', then=models.Value(1)),
+            models.When(priority='High', then=models.Value(2)),
+        ),
+        output_field=models.PositiveSmallIntegerField(null=True),
+        db_persist=True,
+    )
+
+    PRIORITY_RANKS = {'Low': 0, 'Medium': 1, 'High': 2}
 
     class Meta:
         ordering = ['pk']
+        indexes = [
+            # issue list of a project, ordered by pk (page and keyset pagination)
+            models.Index(fields=['project', 'id'], name='issue_project_id_idx'),
+            # issues of a project by statue (counters, filters)
+            models.Index(fields=['project', 'statue'], name='issue_project_statue_idx'),
+            # issues of a project assigned to a user
+            models.Index(fields=['project', 'assign_to'], name='issue_project_assign_idx'),
+            # issues of a project filtered or ordered by priority
+            models.Index(fields=['project', 'priority_rank', 'id'], name='issue_project_priority_idx'),
+            # issues of a project filtered or ordered by creation date
+            models.Index(fields=['project', 'created_time', 'id'], name='issue_project_created_idx'),
+        ]
+
+    # the statue moves the project counters, the title and description are indexed for the search
+    loaded_fields = ['statue', 'title', 'description']
+
+    def save(self, *args, **kwargs):
+        """
+        move the issue between the statue counters of its project.
+        the previous statue is read with the row locked, so two concurrent
+        updates of the statue don't move the same issue twice. an unchanged
+        statue isn't written, without lock, and a concurrent change of it is kept.
+        """
+        created = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        deferred = self.get_deferred_fields()
+        if update_fields is not None:
+            writes_statue = not created and 'statue' in update_fields
+        else:
+            # the deferred fields aren't saved
+            writes_statue = not created and 'statue' not in deferred
+        if writes_statue and update_fields is None and not self.has_changed('statue'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated
+                and field.name != 'statue' and field.attname not in deferred]
+            writes_statue = False
+        # no savepoint inside the transaction of a request
+        with transaction.atomic(savepoint=False):
+            previous_statue = None
+            if writes_statue:
+                previous_statue = Issue.objects.select_for_update().filter(
+                    pk=self.pk).values_list('statue', flat=True).first()
+            super().save(*args, **kwargs)
+            deltas = {}
+            if created:
+                deltas = self.counter_deltas([self])
+            elif previous_statue is not None:
+                deltas = self.statue_deltas([previous_statue], self.statue)
+            Project.update_counters(self.project_id, **deltas)
+            if writes_statue and previous_statue is None:
+                # inserted by the save of an unknown pk, count them again
+                Project(pk=self.project_id).rebuild_counters()
+        self.keep_loaded_values()
+
+    @staticmethod
+    def counter_deltas(issues, sign=1):
+        """ return the project counters deltas for adding (or removing with sign=-1) the issues."""
+        deltas = {'issue_count': 0}
+        for issue in issues:
+            counter = Project.STATUE_COUNTERS[issue.statue]
+            deltas['issue_count'] += sign
+            deltas[counter] = deltas.get(counter, 0) + sign
+        return deltas
+
+    @staticmethod
+    def statue_deltas(old_statues, statue):
+        """ return the project counters deltas for moving issues from their old statues to the statue."""
+        deltas = {}
+        for old_statue in old_statues:
+            for counter, delta in ((Project.STATUE_COUNTERS[old_statue], -1),
+                                   (Project.STATUE_COUNTERS[statue], 1)):
+                deltas[counter] = deltas.get(counter, 0) + delta
+        return deltas
 
     def __str__(self):
         return self.title
 
 
-class Comment(models.Model):
+class Comment(LoadedValuesMixin, models.Model):
     author = models.ForeignKey(
         CustomUser,
         on_delete=models.SET_NULL,
         null=True, related_name="comment_author",
         verbose_name="Auteur du commentaire",
     )
+    # indexed by the (issue, id) index
     issue = models.ForeignKey(
-        Issue, null=False, on_delete=models.CASCADE, verbose_name="Ticket")
+        Issue, null=False, on_delete=models.CASCADE, verbose_name="Ticket", db_index=False)
     description = models.TextField(
         max_length=500, verbose_name="commentaire")
     uuid = models.UUIDField(default=uuid.uuid4, editable=False)
@@ -64,6 +178,33 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['pk']
+        indexes = [
+            # comment list of an issue, ordered by pk (page and keyset pagination)
+            models.Index(fields=['issue', 'id'], name='comment_issue_id_idx'),
+            models.Index(fields=['uuid'], name='comment_uuid_idx'),
+        ]
+
+    # indexed for the search
+    loaded_fields = ['description']
+
+    def get_project_id(self):
+        """
+        the project of the comment without loading its issue: annotated by the
+        comment views, taken from the issue if it's loaded, else read once.
+        """
+        if getattr(self, 'project_id', None) is None:
+            if Comment.issue.is_cached(self):
+                self.project_id = self.issue.project_id
+            else:
+                self.project_id = Issue.objects.filter(
+                    pk=self.issue_id).values_list('project_id', flat=True).first()
+        return self.project_id
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            Project.update_counters(self.get_project_id())
+        self.keep_loaded_values()
 
     def __str__(self):
         return 'commentaire de : ' + self.author
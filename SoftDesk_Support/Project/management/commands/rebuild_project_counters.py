@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from project.models import Project
+
+
+class Command(BaseCommand):
+    help = "Compute again the issue and contributor counters of the projects."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'project_ids', nargs='*', type=int,
+            help="IDs of the projects to rebuild, all the projects if empty.")
+
+    def handle(self, *args, **options):
+        projects = Project.objects.all()
+        if options['project_ids']:
+            projects = projects.filter(id__in=options['project_ids'])
+
+        count = 0
+        for project in projects.only('id').iterator():
+            project.rebuild_counters()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"{count} projet(s) mis à jour."))
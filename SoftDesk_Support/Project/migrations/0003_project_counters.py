@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+STATUE_COUNTERS = {
+    'Todo': 'todo_count',
+    'InProgress': 'in_progress_count',
+    'Finished': 'finished_count',
+}
+
+
+def rebuild_counters(apps, schema_editor):
+    Project = apps.get_model('project', 'Project')
+    Issue = apps.get_model('issue', 'Issue')
+    Contributor = apps.get_model('project', 'Contributor')
+
+    for project in Project.objects.all():
+        statues = dict(Issue.objects.filter(project=project).values_list(
+            'statue').annotate(count=Count('id')).order_by())
+        values = {counter: statues.get(statue, 0)
+                  for statue, counter in STATUE_COUNTERS.items()}
+        values['issue_count'] = sum(statues.values())
+        values['contributor_count'] = Contributor.objects.filter(project=project).count()
+        Project.objects.filter(pk=project.pk).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0002_alter_contributor_unique_together'),
+        ('issue', '0003_comment'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='contributor',
+            options={'ordering': ['pk']},
+        ),
+        migrations.AlterModelOptions(
+            name='project',
+            options={'ordering': ['pk']},
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='contributor_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='nombre de contributeurs'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='finished_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='tickets terminés'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='in_progress_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='tickets en cours'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='issue_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='nombre de tickets'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='last_activity',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='dernière activité'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='todo_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='tickets à faire'),
+        ),
+        migrations.RunPython(rebuild_counters, migrations.RunPython.noop),
+    ]
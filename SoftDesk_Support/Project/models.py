@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F
+from django.utils import timezone
 
 from accounts.models import CustomUser
 
@@ -22,13 +24,80 @@ class Project(models.Model):
         max_length=10, choices=TYPE_CHOICES, verbose_name="type de projet")
     created_time = models.DateField(auto_now_add=True)
 
+    # counters maintained by the Issue and Contributor save and delete
+    issue_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="nombre de tickets")
+    todo_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="tickets à faire")
+    in_progress_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="tickets en cours")
+    finished_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="tickets terminés")
+    contributor_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="nombre de contributeurs")
+    last_activity = models.DateTimeField(
+        null=True, editable=False, verbose_name="dernière activité")
+    # incremented on every change of the project, its issues, comments or contributors
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    # counter of each Issue statue
+    STATUE_COUNTERS = {
+        'Todo': 'todo_count',
+        'InProgress': 'in_progress_count',
+        'Finished': 'finished_count',
+    }
+    COUNTER_FIELDS = ['issue_count', 'contributor_count',
+                      *STATUE_COUNTERS.values(), 'last_activity', 'version']
+
     class Meta:
         ordering = ['pk']
 
     # Add the author as a contributor
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        Contributor.objects.get_or_create(user=self.author, project=self)
+        # the counters are only changed by update_counters,
+        # don't overwrite them with the values loaded with the instance
+        adding = self._state.adding
+        if not adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            contributor, created = Contributor.objects.get_or_create(
+                user=self.author, project=self)
+            if created:
+                self.contributor_count += 1
+            elif not adding:
+                # new version of the project
+                Project.update_counters(self.pk)
+
+    @classmethod
+    def update_counters(cls, project_id, **deltas):
+        """
+        Add the deltas to the counters of the project, set its last activity and increment its version.
+        exemple: Project.update_counters(1, issue_count=1, todo_count=1)
+        """
+        values = {counter: F(counter) + delta for counter, delta in deltas.items() if delta}
+        cls.objects.filter(pk=project_id).update(
+            last_activity=timezone.now(), version=F('version') + 1, **values)
+
+    @classmethod
+    def touch(cls, project_ids):
+        """ new version and last activity of the projects, for a change shown by their responses (a username)."""
+        cls.objects.filter(pk__in=project_ids).update(
+            last_activity=timezone.now(), version=F('version') + 1)
+
+    def rebuild_counters(self):
+        """ compute again all the counters of the project from the issues and contributors."""
+        statues = dict(self.issue_set.values_list(
+            'statue').annotate(count=Count('id')).order_by())
+        values = {counter: statues.get(statue, 0)
+                  for statue, counter in self.STATUE_COUNTERS.items()}
+        values['issue_count'] = sum(statues.values())
+        values['contributor_count'] = self.contributor_set.count()
+        Project.objects.filter(pk=self.pk).update(**values)
+        for counter, value in values.items():
+            setattr(self, counter, value)
 
     def __str__(self):
         return self.name
@@ -42,3 +111,10 @@ class Contributor(models.Model):
     class Meta:
         ordering = ['pk']
         unique_together = ('user', 'project')
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            created = self._state.adding
+            super().save(*args, **kwargs)
+            if created:
+                Project.update_counters(self.project_id, contributor_count=1)
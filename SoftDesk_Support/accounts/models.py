@@ -12,6 +12,14 @@ class CustomUser(AbstractUser):
     class Meta:
         ordering = ['pk']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # the username is shown by the responses of the projects, a change
+        # give them a new version (see api/signals.py)
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_username = instance.__dict__.get('username')
+        return instance
+
     def clean(self):
         if self.age < 16:
             raise ValidationError(
@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication, serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+# fields of the user kept in the cache, without the password hash
+CACHED_USER_FIELDS = ['username', 'is_staff', 'is_active']
+
+
+def user_cache_key(user_id):
+    """ key used to store the user of the tokens in the shared cache."""
+    return f'jwt-user:{user_id}'
+
+
+def invalidate_user(user_id):
+    """ remove the cached user, called when the user is saved or deleted."""
+    cache.delete(user_cache_key(user_id))
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    """ add the username and staff flag of the user to the tokens with JWT_USER_FROM_CLAIMS."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        if getattr(settings, 'JWT_USER_FROM_CLAIMS', False):
+            token['username'] = user.username
+            token['is_staff'] = user.is_staff
+        return token
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    JWT authentication with a cached user, and an async version for the async
+    read actions (see mixins.AsyncReadMixin).
+
+    the fields of the user of the token (CACHED_USER_FIELDS) are kept
+    JWT_USER_CACHE_TIMEOUT seconds in the django cache, and invalidated when
+    the user is saved or deleted (see signals.py). not with CHECK_REVOKE_TOKEN,
+    which needs the password of the user.
+    with JWT_USER_FROM_CLAIMS, the user is built from the claims of the token
+    (ID, username and staff flag) without any query, unless CHECK_REVOKE_TOKEN
+    needs the password of the user.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def deferred_user(self, user_id, fields, values):
+        """ the user with only the ID and fields loaded, the other fields are loaded if they are read."""
+        # the ID claim is a string
+        id_field = self.user_model._meta.get_field(api_settings.USER_ID_FIELD)
+        return self.user_model.from_db(
+            'default', [id_field.attname, *fields], [id_field.to_python(user_id), *values])
+
+    def get_claims_user(self, user_id, validated_token):
+        """
+        return the user of the claims of the token, None if the token has no claims
+        or if the token must be checked against the password (CHECK_REVOKE_TOKEN).
+        """
+        if (not getattr(settings, 'JWT_USER_FROM_CLAIMS', False) or api_settings.CHECK_REVOKE_TOKEN
+                or 'is_staff' not in validated_token):
+            return None
+        return self.deferred_user(
+            user_id, ['username', 'is_staff', 'is_active'],
+            [validated_token.get('username', ''), validated_token['is_staff'], True])
+
+    def get_cache_timeout(self):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return None
+        return getattr(settings, 'JWT_USER_CACHE_TIMEOUT', None)
+
+    def get_user(self, validated_token):
+        """ same checks as simplejwt, the user is read from the cache first."""
+        user_id = self.get_user_id(validated_token)
+        user = self.get_claims_user(user_id, validated_token)
+        if user is not None:
+            return user
+
+        timeout = self.get_cache_timeout()
+        values = cache.get(user_cache_key(user_id)) if timeout else None
+        if values is not None:
+            user = self.deferred_user(user_id, CACHED_USER_FIELDS, values)
+        else:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            if timeout:
+                cache.set(user_cache_key(user_id), [getattr(user, field) for field in CACHED_USER_FIELDS],
+                          timeout)
+        return self.check_user(user, validated_token)
+
+    async def aget_user(self, validated_token):
+        """ get_user with the async ORM and cache."""
+        user_id = self.get_user_id(validated_token)
+        user = self.get_claims_user(user_id, validated_token)
+        if user is not None:
+            return user
+
+        timeout = self.get_cache_timeout()
+        values = await cache.aget(user_cache_key(user_id)) if timeout else None
+        if values is not None:
+            user = self.deferred_user(user_id, CACHED_USER_FIELDS, values)
+        else:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            if timeout:
+                await cache.aset(
+                    user_cache_key(user_id), [getattr(user, field) for field in CACHED_USER_FIELDS], timeout)
+        return self.check_user(user, validated_token)
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                    api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed")
+
+        return user
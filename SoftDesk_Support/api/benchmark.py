@@ -0,0 +1,114 @@
+"""
+Helpers shared by the benchmark commands.
+
+The benchmarks run in a throwaway test database seeded with a large dataset,
+the real database is never touched.
+"""
+import importlib
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import clear_url_caches
+
+from accounts.models import CustomUser
+from project.models import Project, Contributor
+from issue.models import Issue, Comment
+
+
+@contextmanager
+def benchmark_database():
+    """ create a test database for the benchmark and destroy it after."""
+    # no debug, the queries log would fill up during the seed
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextmanager
+def read_views(async_reads):
+    """ route the reads to the async or sync views (the views are chosen when the urls are loaded)."""
+    try:
+        with override_settings(ASYNC_READ_VIEWS=async_reads):
+            reload_urls()
+            yield
+    finally:
+        reload_urls()
+
+
+def reload_urls():
+    importlib.reload(importlib.import_module('api.urls'))
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+def seed(projects=5, issues=2000, comments=5, contributors=20, batch_size=1000):
+    """
+    Fill the database with bulk inserts.
+
+    return the author of all the projects, the other users are contributors.
+    """
+    password = make_password(None)
+    users = CustomUser.objects.bulk_create([
+        CustomUser(username=f'user{i}', password=password, age=20)
+        for i in range(contributors + 1)])
+    author = users[0]
+
+    statues = [statue for statue, label in Issue.STATUE_CHOICES]
+    priorities = [priority for priority, label in Issue.PRIORITY_CHOICES]
+    tags = [tag for tag, label in Issue.TAG_CHOICES]
+
+    for p in range(projects):
+        project = Project.objects.create(
+            author=author, name=f'Projet {p}', description='description', type='Back-end')
+        Contributor.objects.bulk_create(
+            [Contributor(user=user, project=project) for user in users[1:]])
+
+        project_issues = Issue.objects.bulk_create([
+            Issue(
+                author=users[i % len(users)],
+                assign_to=users[(i * 7) % len(users)],
+                project=project,
+                title=f'ticket {i}',
+                description='description ' * 20,
+                statue=statues[i % len(statues)],
+                priority=priorities[i % len(priorities)],
+                tag=tags[i % len(tags)],
+            ) for i in range(issues)], batch_size=batch_size)
+
+        Comment.objects.bulk_create([
+            Comment(author=users[(i + c) % len(users)], issue=issue, description='commentaire ' * 10)
+            for i, issue in enumerate(project_issues) for c in range(comments)],
+            batch_size=batch_size)
+        project.rebuild_counters()
+
+    return author
+
+
+def measure(func, repeat=20, setup=None):
+    """ call func repeat times, return the median and max duration in ms (setup is called before, untimed)."""
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations), max(durations)
+
+
+def explain(sql):
+    """ return the query plan of an executed query."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
@@ -0,0 +1,129 @@
+"""
+Cache of the serialized read responses.
+
+The entries are grouped by project: a key contains the project version, and
+the Issue, Comment, Contributor and Project signals drop the entries of the
+project when it change (see signals.py).
+The backend is chosen with the RESPONSE_CACHE setting.
+"""
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+class ResponseCache:
+    """
+    Interface of the response cache backends.
+
+    a value is the (content, content_type) of a rendered response, and the
+    permission attributes of its object (see mixins.ResponseCacheMixin).
+    """
+
+    def get(self, project_id, key):
+        """ return the value stored for the key, None if missing."""
+        raise NotImplementedError
+
+    def set(self, project_id, key, value):
+        raise NotImplementedError
+
+    def invalidate(self, project_id):
+        """ drop all the entries of the project."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LRUResponseCache(ResponseCache):
+    """
+    In-process cache, the least recently used entries are dropped after max_entries.
+    each process has its own cache.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # keys of the entries of each project
+        self.projects = {}
+        self.lock = Lock()
+
+    def get(self, project_id, key):
+        with self.lock:
+            value = self.entries.get((project_id, key))
+            if value is not None:
+                self.entries.move_to_end((project_id, key))
+            return value
+
+    def set(self, project_id, key, value):
+        with self.lock:
+            self.entries[(project_id, key)] = value
+            self.entries.move_to_end((project_id, key))
+            self.projects.setdefault(project_id, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                (old_project_id, old_key), _ = self.entries.popitem(last=False)
+                self.projects[old_project_id].discard(old_key)
+
+    def invalidate(self, project_id):
+        with self.lock:
+            for key in self.projects.pop(project_id, ()):
+                self.entries.pop((project_id, key), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.projects.clear()
+
+
+class SharedResponseCache(ResponseCache):
+    """
+    Cache shared by the processes, stored in a django cache (redis, memcached...).
+
+    a project has a generation token in its keys, a new token invalidate all its entries,
+    the old ones expire after the timeout.
+    """
+
+    def __init__(self, alias='default', timeout=300):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def generation(self, project_id):
+        generation_key = f'response:{project_id}'
+        generation = self.cache.get(generation_key)
+        if generation is None:
+            generation = uuid4().hex
+            self.cache.set(generation_key, generation, None)
+        return generation
+
+    def entry_key(self, project_id, key):
+        # the key contains the path, hashed for the cache backends with key restrictions
+        key = hashlib.md5(key.encode()).hexdigest()
+        return f'response:{project_id}:{self.generation(project_id)}:{key}'
+
+    def get(self, project_id, key):
+        return self.cache.get(self.entry_key(project_id, key))
+
+    def set(self, project_id, key, value):
+        self.cache.set(self.entry_key(project_id, key), value, self.timeout)
+
+    def invalidate(self, project_id):
+        self.cache.set(f'response:{project_id}', uuid4().hex, None)
+
+    def clear(self):
+        self.cache.clear()
+
+
+@lru_cache(maxsize=None)
+def get_response_cache():
+    config = getattr(settings, 'RESPONSE_CACHE', {})
+    backend = import_string(config.get('BACKEND', 'api.cache.LRUResponseCache'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+def invalidate_project_responses(project_id):
+    get_response_cache().invalidate(int(project_id))
@@ -0,0 +1,43 @@
+"""
+Log of the changes read by the change feed (see feed.py).
+
+Each save and delete add a Change (signals.py, and the bulk paths that bypass the signals),
+published to the event streams after the commit (see events.py).
+"""
+from project.models import Project, Contributor
+from issue.models import Comment
+from .models import Change
+from .events import publish_changes
+
+
+def model_name(instance):
+    return instance._meta.model_name
+
+
+def project_id_of(instance):
+    if isinstance(instance, Project):
+        return instance.id
+    if isinstance(instance, Comment):
+        # without loading the issue, see Comment.get_project_id
+        return instance.get_project_id()
+    return instance.project_id
+
+
+def record_changes(instances, action):
+    """
+    add a change for each instance, with a single insert.
+    the counters and last activity of their projects changed, the projects are updated too.
+    """
+    changes = [
+        Change(
+            model=model_name(instance),
+            object_id=instance.id,
+            action=action,
+            project_id=project_id_of(instance),
+            user_id=instance.user_id if isinstance(instance, Contributor) else None,
+        ) for instance in instances]
+    project_ids = {change.project_id for change in changes if change.model != 'project'}
+    changes += [Change(model='project', object_id=project_id, action='updated', project_id=project_id)
+                for project_id in sorted(project_ids)]
+    Change.objects.bulk_create(changes)
+    publish_changes(changes)
@@ -0,0 +1,249 @@
+"""
+Push of the changes of a project to its contributors (Server-Sent Events).
+
+record_changes publish the changes of the issues, comments and contributors
+to the broker after the commit, the event stream of a project subscribe to it.
+the id of an event is the cursor of its change (see models.Change), a client
+that reconnect with Last-Event-ID get the events it missed from the change log.
+The broker is chosen with the EVENT_BROKER setting.
+"""
+import asyncio
+import json
+from contextlib import aclosing
+from functools import lru_cache
+from threading import Lock
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from rest_framework import renderers, status
+from rest_framework.exceptions import APIException
+
+from .models import Change
+
+
+# the changes pushed to the event streams, the project updates only follow them
+EVENT_MODELS = ('issue', 'comment', 'contributor')
+
+
+def change_event(change):
+    event = {
+        'cursor': change.id,
+        'model': change.model,
+        'action': change.action,
+        'id': change.object_id,
+        'project': change.project_id,
+    }
+    if change.model == 'contributor':
+        event['user'] = change.user_id
+    return event
+
+
+def is_event(change):
+    # the deletion of the project end its streams
+    return change.model in EVENT_MODELS or (change.model == 'project' and change.action == 'deleted')
+
+
+EVENT_CHANGES = Q(model__in=EVENT_MODELS) | Q(model='project', action='deleted')
+
+
+class EventBroker:
+    """
+    Interface of the event brokers.
+
+    an event is the dict of a change (see change_event).
+    """
+
+    def publish(self, events):
+        """ send the events to the subscribers of their project, called after the commit."""
+        raise NotImplementedError
+
+    def subscribe(self, project_id, since=None, timeout=None):
+        """
+        async generator of the events of the project, after the cursor since if given.
+        None is yielded after timeout seconds without event (heartbeat).
+        """
+        raise NotImplementedError
+
+    async def replay(self, project_id, since, limit):
+        """ the first events of the project after the cursor, read from the change log."""
+        changes = Change.objects.filter(
+            EVENT_CHANGES, project_id=project_id, id__gt=since).order_by('id')[:limit]
+        return [change_event(change) async for change in changes]
+
+
+class Subscription:
+    """ queue of the events of a stream, filled from any thread."""
+
+    def __init__(self, max_size):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.max_size = max_size
+
+    def put(self, events):
+        # in the loop of the stream
+        if self.queue.qsize() + len(events) > self.max_size:
+            # too slow: end the stream, the client reconnect with Last-Event-ID
+            self.queue.put_nowait(None)
+            return
+        for event in events:
+            self.queue.put_nowait(event)
+
+    def send(self, events):
+        self.loop.call_soon_threadsafe(self.put, events)
+
+
+class LocalEventBroker(EventBroker):
+    """
+    In-process broker, the events are only sent to the streams of the process.
+    with many processes or nodes, use ChangeLogEventBroker.
+    """
+
+    def __init__(self, max_queue_size=1000):
+        self.max_queue_size = max_queue_size
+        # subscriptions of each project
+        self.projects = {}
+        self.lock = Lock()
+
+    def publish(self, events):
+        by_project = {}
+        for event in events:
+            by_project.setdefault(event['project'], []).append(event)
+        with self.lock:
+            sends = [(subscription, project_events)
+                     for project_id, project_events in by_project.items()
+                     for subscription in self.projects.get(project_id, ())]
+        for subscription, project_events in sends:
+            subscription.send(project_events)
+
+    async def subscribe(self, project_id, since=None, timeout=None):
+        subscription = Subscription(self.max_queue_size)
+        with self.lock:
+            self.projects.setdefault(project_id, set()).add(subscription)
+        try:
+            # subscribed before the replay, the events committed meanwhile are in both
+            replayed = since or 0
+            while since is not None:
+                events = await self.replay(project_id, replayed, self.max_queue_size)
+                for event in events:
+                    replayed = event['cursor']
+                    yield event
+                if len(events) < self.max_queue_size:
+                    break
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                if event['cursor'] > replayed:
+                    yield event
+        finally:
+            with self.lock:
+                self.projects[project_id].discard(subscription)
+                if not self.projects[project_id]:
+                    del self.projects[project_id]
+
+
+class ChangeLogEventBroker(EventBroker):
+    """
+    Broker shared by all the processes and nodes: the streams read the change log
+    of the database every poll_interval seconds, nothing is published.
+    """
+
+    def __init__(self, poll_interval=1.0, batch_size=500):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+
+    def publish(self, events):
+        pass
+
+    async def subscribe(self, project_id, since=None, timeout=None):
+        if since is None:
+            since = await acurrent_cursor()
+        idle = 0
+        while True:
+            events = await self.replay(project_id, since, self.batch_size)
+            for event in events:
+                since = event['cursor']
+                yield event
+            if events:
+                idle = 0
+                continue
+            await asyncio.sleep(self.poll_interval)
+            idle += self.poll_interval
+            if timeout is not None and idle >= timeout:
+                idle = 0
+                yield None
+
+
+async def acurrent_cursor():
+    return await Change.objects.order_by('-id').values_list('id', flat=True).afirst() or 0
+
+
+@lru_cache(maxsize=None)
+def get_event_broker():
+    config = getattr(settings, 'EVENT_BROKER', {})
+    backend = import_string(config.get('BACKEND', 'api.events.LocalEventBroker'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+def publish_changes(changes):
+    """ publish the events of the changes after the commit of the transaction."""
+    events = [change_event(change) for change in changes if is_event(change)]
+    if events:
+        transaction.on_commit(lambda: get_event_broker().publish(events))
+
+
+def format_event(event):
+    return f"id: {event['cursor']}\nevent: {event['model']}\ndata: {json.dumps(event)}\n\n"
+
+
+def ends_stream(event, user):
+    """ the stream stop when the project is deleted or the user removed from it."""
+    if event['model'] == 'project':
+        return True
+    return (event['model'] == 'contributor' and event['action'] == 'deleted'
+            and event['user'] == user.id and not user.is_staff)
+
+
+async def event_stream(user, project_id, since=None):
+    """ the text of the Server-Sent Events of the project for the user."""
+    heartbeat = getattr(settings, 'EVENT_STREAM_HEARTBEAT', 15)
+    if since is None:
+        # the subscription start with the first read of the stream,
+        # the events committed before are read from the change log
+        since = await acurrent_cursor()
+    # delay before the client reconnect (ms)
+    yield "retry: 3000\n\n"
+    async with aclosing(get_event_broker().subscribe(project_id, since, timeout=heartbeat)) as events:
+        async for event in events:
+            if event is None:
+                # comment line, keeps the connection open through the proxies
+                yield ": ping\n\n"
+                continue
+            yield format_event(event)
+            if ends_stream(event, user):
+                return
+
+
+class EventStreamUnavailable(APIException):
+    """ a sync server (WSGI, runserver) read the whole stream before sending it, it never end."""
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = "Le flux d'événements n'est disponible qu'avec un serveur ASGI (Config.asgi)."
+    default_code = 'event_stream_unavailable'
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """ the events are streamed, only the errors are rendered (as an error event)."""
+
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        data = json.dumps(data, cls=renderers.JSONRenderer.encoder_class)
+        return f"event: error\ndata: {data}\n\n".encode()
@@ -0,0 +1,153 @@
+"""
+Streamed export of all the issues of a project with their comments.
+
+The issues and comments are read with two server-side iterators ordered by issue,
+and merged while they are written, so the memory stays flat whatever the size of the project.
+under ASGI the streams are async (andjson_stream, acsv_stream, with the async ORM):
+django would read a sync stream whole in a thread before sending it.
+"""
+import csv
+import json
+
+from django.conf import settings
+from rest_framework import renderers
+
+from issue.models import Issue, Comment
+from .serializers import IssueValuesSerializer, CommentValuesSerializer
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """ one JSON document by line, the export is streamed, only the errors are rendered."""
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data, cls=renderers.JSONRenderer.encoder_class) + '\n').encode()
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    """ CSV rows, the export is streamed, only the errors are rendered (one line by field)."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        lines = [csv_line(['field', 'error'])]
+        for field, error in (data or {}).items():
+            lines.append(csv_line([field, error]))
+        return ''.join(lines).encode()
+
+
+class Echo:
+    """ file-like object that return what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_line(values):
+    return csv.writer(Echo()).writerow(values)
+
+
+def export_querysets(project_id):
+    """ the issues and the comments of the project, both ordered by issue."""
+    issues = Issue.objects.filter(project_id=project_id).order_by('id').values(
+        *IssueValuesSerializer.columns)
+    comments = Comment.objects.filter(issue__project_id=project_id).order_by('issue_id', 'id').values(
+        'issue_id', *CommentValuesSerializer.columns)
+    return issues, comments
+
+
+def get_chunk_size(chunk_size=None):
+    return chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def iter_issues(project_id, chunk_size=None):
+    """
+    Yield the dict of each issue of the project (like the issue list) with its comments.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    issue_serializer = IssueValuesSerializer()
+    comment_serializer = CommentValuesSerializer()
+    issues, comments = export_querysets(project_id)
+    comments = comments.iterator(chunk_size=chunk_size)
+
+    comment = next(comments, None)
+    for row in issues.iterator(chunk_size=chunk_size):
+        issue = issue_serializer.to_representation(row)
+        issue['comments'] = []
+        # both iterators are ordered by issue
+        while comment is not None and comment['issue_id'] <= row['pk']:
+            if comment['issue_id'] == row['pk']:
+                issue['comments'].append(comment_serializer.to_representation(comment))
+            comment = next(comments, None)
+        yield issue
+
+
+async def aiter_issues(project_id, chunk_size=None):
+    """ iter_issues with the async ORM."""
+    chunk_size = get_chunk_size(chunk_size)
+    issue_serializer = IssueValuesSerializer()
+    comment_serializer = CommentValuesSerializer()
+    issues, comments = export_querysets(project_id)
+    comments = comments.aiterator(chunk_size=chunk_size)
+
+    comment = await anext(comments, None)
+    async for row in issues.aiterator(chunk_size=chunk_size):
+        issue = issue_serializer.to_representation(row)
+        issue['comments'] = []
+        while comment is not None and comment['issue_id'] <= row['pk']:
+            if comment['issue_id'] == row['pk']:
+                issue['comments'].append(comment_serializer.to_representation(comment))
+            comment = await anext(comments, None)
+        yield issue
+
+
+def ndjson_line(issue):
+    return json.dumps(issue, cls=renderers.JSONRenderer.encoder_class, ensure_ascii=False) + '\n'
+
+
+def ndjson_stream(project_id):
+    for issue in iter_issues(project_id):
+        yield ndjson_line(issue)
+
+
+async def andjson_stream(project_id):
+    async for issue in aiter_issues(project_id):
+        yield ndjson_line(issue)
+
+
+CSV_COLUMNS = [
+    'type', 'issue_id', 'comment_id', 'author', 'assign_to', 'title',
+    'description', 'statue', 'priority', 'tag', 'created_time',
+]
+
+
+def csv_rows(issue):
+    """ one row by issue, followed by one row by comment of the issue."""
+    yield csv_line([
+        'issue', issue['id'], '', issue['author'], issue['assign_to'], issue['title'],
+        issue['description'], issue['statue'], issue['priority'], issue['tag'],
+        issue['created_time'],
+    ])
+    for comment in issue['comments']:
+        yield csv_line([
+            'comment', issue['id'], comment['id'], comment['author'], '', '',
+            comment['description'], '', '', '', comment['created_time'],
+        ])
+
+
+def csv_stream(project_id):
+    yield csv_line(CSV_COLUMNS)
+    for issue in iter_issues(project_id):
+        yield from csv_rows(issue)
+
+
+async def acsv_stream(project_id):
+    yield csv_line(CSV_COLUMNS)
+    async for issue in aiter_issues(project_id):
+        for row in csv_rows(issue):
+            yield row
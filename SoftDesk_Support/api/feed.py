@@ -0,0 +1,101 @@
+"""
+Change feed of the projects, contributors, issues and comments.
+
+a client keeps the cursor of the last change it read, and ask the changes after it:
+the created and updated objects are sent with their current data, the deleted ones as
+tombstones (data is null).
+the projects the user joined after the cursor are listed in resync: their issues
+and comments older than the membership aren't in the feed, the client reload them.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from project.models import Project, Contributor
+from issue.models import Issue, Comment
+from .models import Change
+from .serializers import (
+    ProjectValuesSerializer,
+    ContributorValuesSerializer,
+    IssueValuesSerializer,
+    CommentValuesSerializer,
+)
+
+
+# model -> (queryset, values serializer, extra columns added to the data)
+FEED_MODELS = {
+    'project': (Project.objects.all(), ProjectValuesSerializer, []),
+    'contributor': (Contributor.objects.all(), ContributorValuesSerializer, ['user_id']),
+    'issue': (Issue.objects.all(), IssueValuesSerializer, []),
+    'comment': (Comment.objects.all(), CommentValuesSerializer, ['issue_id']),
+}
+
+
+def load_data(model, object_ids):
+    """ return the current data of the objects, by id (the deleted ones are missing)."""
+    queryset, serializer_class, extra = FEED_MODELS[model]
+    serializer = serializer_class()
+    data = {}
+    for row in queryset.filter(pk__in=object_ids).values(*serializer_class.columns, *extra):
+        data[row['pk']] = serializer.to_representation(row)
+        data[row['pk']].update((column, row[column]) for column in extra)
+    return data
+
+
+def get_changes(user, project_ids, since, limit=None):
+    """
+    Return the changes after the cursor since, of the projects of the user
+    and of his own memberships (to see his removal from a project).
+
+    only the last change of each object is returned, with its current data.
+    with autoincrement ids, a transaction that commit after a later one can give
+    a change behind the cursor of a client: the writes of sqlite are serialized.
+    """
+    limit = min(limit or settings.CHANGE_FEED_PAGE_SIZE, settings.CHANGE_FEED_PAGE_SIZE)
+    changes = list(Change.objects.filter(
+        Q(project_id__in=project_ids) | Q(user_id=user.id), id__gt=since,
+    ).order_by('id')[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    last_changes = {}
+    for change in changes:
+        last_changes.pop((change.model, change.object_id), None)
+        last_changes[(change.model, change.object_id)] = change
+
+    ids_by_model = {}
+    for model, object_id in last_changes:
+        if last_changes[(model, object_id)].action != 'deleted':
+            ids_by_model.setdefault(model, []).append(object_id)
+    data = {model: load_data(model, object_ids) for model, object_ids in ids_by_model.items()}
+
+    results = []
+    for change in last_changes.values():
+        if change.action == 'deleted':
+            item = None
+        else:
+            item = data[change.model].get(change.object_id)
+            if item is None:
+                # deleted since, by a next change or with its parent
+                continue
+        results.append({
+            'cursor': change.id,
+            'model': change.model,
+            'action': change.action,
+            'id': change.object_id,
+            'project': change.project_id,
+            'data': item,
+        })
+    # the projects the user joined in these changes, and is still a member of
+    joined = {change.project_id for change in changes
+              if change.model == 'contributor' and change.action == 'created' and change.user_id == user.id}
+    return {
+        'cursor': changes[-1].id if changes else since,
+        'has_more': has_more,
+        'changes': results,
+        'resync': sorted(project_id for project_id in joined if project_id in project_ids),
+    }
+
+
+def current_cursor():
+    """ cursor of the last change, where a client that just loaded everything start."""
+    return Change.objects.order_by('-id').values_list('id', flat=True).first() or 0
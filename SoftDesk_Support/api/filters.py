@@ -0,0 +1,101 @@
+import datetime
+
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from issue.models import Issue
+from .membership import get_assignable_users, find_assignable_user
+
+
+class IssueFilterBackend(filters.BaseFilterBackend):
+    """
+    Filter and order the issue list with the query parameters.
+
+    Parameters:
+    - statue, priority, tag: one or many values separated by a comma.
+    - assign_to: username or ID of a contributor, 'none' for the issues not assigned.
+    - created_after, created_before: date (YYYY-MM-DD) of creation, included.
+    - ordering: priority, created_time or id, with a '-' for the descending order.
+
+    each filter and ordering use one of the (project, ...) indexes of Issue.
+    the keyset pagination stay ordered by id.
+    """
+
+    choice_filters = {
+        'statue': Issue.STATUE_CHOICES,
+        'priority': Issue.PRIORITY_CHOICES,
+        'tag': Issue.TAG_CHOICES,
+    }
+    date_filters = {
+        'created_after': 'created_time__gte',
+        'created_before': 'created_time__lte',
+    }
+    ordering_fields = {
+        'priority': 'priority_rank',
+        'created_time': 'created_time',
+        'id': 'id',
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        if view.action != 'list':
+            return queryset
+        params = request.query_params
+
+        for param, choices in self.choice_filters.items():
+            if params.get(param):
+                values = self.get_choices(param, params[param], choices)
+                if param == 'priority':
+                    # filter on the rank to use the priority index
+                    queryset = queryset.filter(
+                        priority_rank__in=[Issue.PRIORITY_RANKS[value] for value in values])
+                else:
+                    queryset = queryset.filter(**{f'{param}__in': values})
+
+        if params.get('assign_to'):
+            queryset = self.filter_assign_to(request, queryset, view, params['assign_to'])
+
+        for param, lookup in self.date_filters.items():
+            if params.get(param):
+                queryset = queryset.filter(**{lookup: self.get_date(param, params[param])})
+
+        if params.get('ordering'):
+            queryset = queryset.order_by(*self.parse_ordering(params['ordering']))
+        return queryset
+
+    def get_choices(self, param, value, choices):
+        values = value.split(',')
+        available = [choice for choice, label in choices]
+        for value in values:
+            if value not in available:
+                raise ValidationError({param: f" '{value}' n'est pas un choix valide. "
+                                       + f"Les choix disponible sont : {', '.join(available)}"})
+        return values
+
+    def filter_assign_to(self, request, queryset, view, value):
+        if value.lower() == 'none':
+            return queryset.filter(assign_to__isnull=True)
+        # the assigned users are the contributors of the project
+        users = get_assignable_users(request, view.kwargs['project_pk'])
+        user = find_assignable_user(users, value)
+        if user is None:
+            return queryset.none()
+        return queryset.filter(assign_to_id=user.id)
+
+    def get_date(self, param, value):
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({param: f" '{value}' n'est pas une date valide (AAAA-MM-JJ)."})
+
+    def parse_ordering(self, value):
+        descending = value.startswith('-')
+        field = self.ordering_fields.get(value.lstrip('-'))
+        if field is None:
+            raise ValidationError({'ordering': f" '{value}' n'est pas un choix valide. "
+                                   + f"Les choix disponible sont : {', '.join(self.ordering_fields)}"})
+        if field == 'id':
+            return [value]
+        # the id keep the same order between the pages
+        if descending:
+            return [f'-{field}', '-id']
+        return [field, 'id']
@@ -0,0 +1,81 @@
+"""
+Cost of the password hashes of the logins.
+
+PBKDF2PasswordHasher take its number of iterations from the settings: a hash of
+an other number of iterations is still checked, and a hash of fewer iterations
+is hashed again with the new number at the next login of the user (check_password
+update the hashes when must_update is true), so the cost can be raised without
+resetting the passwords. a hash of more iterations is kept: lowering the setting
+only applies to the new passwords, the existing hashes are never weakened.
+
+hashing_slot bound the number of logins that hash at the same time in a process,
+the other logins wait for a slot, so a spike of logins doesn't take all the CPU
+from the other requests.
+"""
+import math
+from contextlib import contextmanager
+from functools import lru_cache
+from threading import BoundedSemaphore
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """ PBKDF2 SHA256 with PASSWORD_HASH_ITERATIONS iterations (django's default if None)."""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or super().iterations
+
+    def must_update(self, encoded):
+        # same algorithm as django's hasher: only hash again upward
+        decoded = self.decode(encoded)
+        return (decoded['iterations'] < self.iterations
+                or hashers.must_update_salt(decoded['salt'], self.salt_entropy))
+
+
+class LoginUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Trop de connexions en cours, réessayez dans quelques secondes."
+    default_code = 'login_unavailable'
+
+    def __init__(self, wait):
+        super().__init__()
+        # sent in the Retry-After header (whole seconds)
+        self.wait = math.ceil(wait)
+
+
+@lru_cache(maxsize=None)
+def get_hashing_slots():
+    workers = getattr(settings, 'LOGIN_HASH_WORKERS', None)
+    return BoundedSemaphore(workers) if workers else None
+
+
+@receiver(setting_changed)
+def reset_hashing_slots(setting, **kwargs):
+    if setting == 'LOGIN_HASH_WORKERS':
+        get_hashing_slots.cache_clear()
+
+
+@contextmanager
+def hashing_slot():
+    """
+    wait for a free slot to hash a password, LoginUnavailable after
+    LOGIN_HASH_TIMEOUT seconds. no limit without LOGIN_HASH_WORKERS.
+    """
+    slots = get_hashing_slots()
+    if slots is None:
+        yield
+        return
+    timeout = getattr(settings, 'LOGIN_HASH_TIMEOUT', 5)
+    if not slots.acquire(timeout=timeout):
+        raise LoginUnavailable(wait=timeout)
+    try:
+        yield
+    finally:
+        slots.release()
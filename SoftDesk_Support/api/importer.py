@@ -0,0 +1,310 @@
+"""
+Bulk import of users, projects, issues and comments from NDJSON.
+
+One record by line, the parents must come before their children:
+
+    {"model": "user", "username": "bob", "age": 30, "email": "bob@exemple.fr"}
+    {"model": "project", "ref": "p1", "author": "bob", "name": "Projet", "description": "...",
+     "type": "Back-end", "contributors": ["alice"]}
+    {"model": "issue", "ref": "i1", "project": "p1", "author": "bob", "assign_to": "alice",
+     "title": "...", "description": "...", "statue": "Todo", "priority": "Low", "tag": "Bug"}
+    {"model": "comment", "issue": "i1", "author": "alice", "description": "..."}
+
+The users are given by username, the projects and issues by the ref of their
+record in the same import. The lines are read in batches: each batch is inserted
+with bulk_create in one transaction, and an invalid record is reported and skipped.
+bulk_create doesn't call save nor send the signals, so the counters, the search
+index, the membership, the response cache and the change feed are updated here.
+"""
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from project.models import Project, Contributor
+from issue.models import Issue, Comment
+from .cache import invalidate_project_responses
+from .membership import invalidate_membership
+from .search import get_search_backend
+from .changes import record_changes
+
+
+class RecordError(Exception):
+    pass
+
+
+class NDJSONImporter:
+    """
+    Import the NDJSON lines given to run, and return the report:
+    the number of lines read, of rows created for each model and the errors (line, error).
+    progress is called with the report after each batch.
+    """
+
+    max_reported_errors = 1000
+
+    def __init__(self, batch_size=None, progress=None):
+        self.batch_size = batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+        self.progress = progress
+        self.password = make_password(None)
+        # username -> id, loaded by batch
+        self.user_ids = {}
+        # ref -> id of the projects and (id, project id) of the issues of the import
+        self.project_refs = {}
+        self.issue_refs = {}
+        # user ids of the contributors of the imported projects
+        self.project_members = {}
+        self.report = {
+            'lines': 0, 'users': 0, 'projects': 0, 'issues': 0, 'comments': 0,
+            'error_count': 0, 'errors': [],
+        }
+
+    @property
+    def created(self):
+        return sum(self.report[model] for model in ('users', 'projects', 'issues', 'comments'))
+
+    def error(self, line, message):
+        self.report['error_count'] += 1
+        if len(self.report['errors']) < self.max_reported_errors:
+            self.report['errors'].append({'line': line, 'error': message})
+
+    def run(self, lines):
+        batch = []
+        for number, line in enumerate(lines, 1):
+            self.report['lines'] = number
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.error(number, "JSON invalide.")
+                continue
+            if not isinstance(record, dict) or record.get('model') not in self.importers:
+                self.error(number, "le champ model doit être user, project, issue ou comment.")
+                continue
+            batch.append((number, record))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.report
+
+    def import_batch(self, batch):
+        records = defaultdict(list)
+        for number, record in batch:
+            records[record['model']].append((number, record))
+        self.load_users([record for number, record in batch])
+
+        with transaction.atomic():
+            for model, importer in self.importers.items():
+                if records[model]:
+                    importer(self, records[model])
+        if self.progress:
+            self.progress(self.report)
+
+    def load_users(self, records):
+        """ load the ids of the users of the batch with a single query."""
+        usernames = set()
+        for record in records:
+            for field in ('author', 'assign_to', 'username'):
+                if isinstance(record.get(field), str):
+                    usernames.add(record[field])
+            if isinstance(record.get('contributors'), list):
+                usernames.update(name for name in record['contributors'] if isinstance(name, str))
+        usernames -= self.user_ids.keys()
+        if usernames:
+            self.user_ids.update(CustomUser.objects.filter(
+                username__in=usernames).values_list('username', 'id'))
+
+    # validation
+
+    def text(self, record, model, field, required=True):
+        value = record.get(field, '')
+        if not isinstance(value, str) or (required and not value):
+            raise RecordError(f"le champ {field} est obligatoire (texte).")
+        model_field = model._meta.get_field(field)
+        if model_field.max_length and len(value) > model_field.max_length:
+            raise RecordError(f"le champ {field} dépasse {model_field.max_length} caractères.")
+        if model_field.choices and value not in dict(model_field.choices):
+            choices = ', '.join(dict(model_field.choices))
+            raise RecordError(f"'{value}' n'est pas un choix valide pour {field} : {choices}")
+        return value
+
+    def user_id(self, username):
+        if not isinstance(username, str) or username not in self.user_ids:
+            raise RecordError(f"l'utilisateur {username} n'existe pas.")
+        return self.user_ids[username]
+
+    def user(self, record, field, required=True):
+        if record.get(field) is None and not required:
+            return None
+        return self.user_id(record.get(field))
+
+    def ref(self, record, refs, field):
+        ref = record.get(field)
+        if ref is None or str(ref) not in refs:
+            raise RecordError(f"{field} {ref} inconnu dans cet import.")
+        return refs[str(ref)]
+
+    def new_ref(self, record, refs, batch_refs):
+        """ return the ref of a new record, refs are the ones of the previous batches."""
+        ref = record.get('ref')
+        if ref is None:
+            return None
+        ref = str(ref)
+        if ref in refs or ref in batch_refs:
+            raise RecordError(f"la référence {ref} est déjà utilisée.")
+        return ref
+
+    def member(self, project_id, user_id, field):
+        if user_id is not None and user_id not in self.project_members[project_id]:
+            raise RecordError(f"{field} doit être un contributeur du projet.")
+        return user_id
+
+    def validate(self, rows, build):
+        """ build the object of each row, report the invalid rows."""
+        objects = []
+        for number, record in rows:
+            try:
+                objects.append(build(record))
+            except RecordError as error:
+                self.error(number, str(error))
+        return objects
+
+    # import of each model
+
+    def import_users(self, rows):
+        new_usernames = set()
+
+        def build(record):
+            username = self.text(record, CustomUser, 'username')
+            if username in self.user_ids or username in new_usernames:
+                raise RecordError(f"l'utilisateur {username} existe déjà.")
+            age = record.get('age')
+            if not isinstance(age, int) or age < 16:
+                # same rule as CustomUser.clean
+                raise RecordError("les Utilisateur de moin de 16 ans ne sont pas accepter")
+            new_usernames.add(username)
+            return CustomUser(
+                username=username, age=age, password=self.password,
+                email=self.text(record, CustomUser, 'email', required=False),
+                can_be_contacted=record.get('can_be_contacted') is True,
+                can_data_be_shared=record.get('can_data_be_shared') is True,
+            )
+
+        users = CustomUser.objects.bulk_create(self.validate(rows, build))
+        self.user_ids.update((user.username, user.id) for user in users)
+        self.report['users'] += len(users)
+
+    def import_projects(self, rows):
+        refs = {}
+        batch_refs = set()
+        members = []
+        now = timezone.now()
+
+        def build(record):
+            ref = self.new_ref(record, self.project_refs, batch_refs)
+            author_id = self.user(record, 'author')
+            contributors = record.get('contributors', [])
+            if not isinstance(contributors, list):
+                raise RecordError("le champ contributors doit être une liste.")
+            # the author is always a contributor
+            user_ids = list(dict.fromkeys(
+                [author_id] + [self.user_id(username) for username in contributors]))
+            project = Project(
+                author_id=author_id,
+                name=self.text(record, Project, 'name'),
+                description=self.text(record, Project, 'description', required=False),
+                type=self.text(record, Project, 'type'),
+                contributor_count=len(user_ids),
+                last_activity=now,
+            )
+            refs[id(project)] = ref
+            batch_refs.add(ref)
+            members.append(user_ids)
+            return project
+
+        projects = Project.objects.bulk_create(self.validate(rows, build))
+        contributors = Contributor.objects.bulk_create([
+            Contributor(project_id=project.id, user_id=user_id)
+            for project, user_ids in zip(projects, members) for user_id in user_ids])
+        record_changes(projects, 'created')
+        record_changes(contributors, 'created')
+        for project, user_ids in zip(projects, members):
+            if refs[id(project)] is not None:
+                self.project_refs[refs[id(project)]] = project.id
+            self.project_members[project.id] = set(user_ids)
+        for user_id in {user_id for user_ids in members for user_id in user_ids}:
+            invalidate_membership(user_id)
+        self.report['projects'] += len(projects)
+
+    def import_issues(self, rows):
+        refs = {}
+        batch_refs = set()
+
+        def build(record):
+            ref = self.new_ref(record, self.issue_refs, batch_refs)
+            project_id = self.ref(record, self.project_refs, 'project')
+            issue = Issue(
+                project_id=project_id,
+                author_id=self.member(project_id, self.user(record, 'author'), 'author'),
+                assign_to_id=self.member(
+                    project_id, self.user(record, 'assign_to', required=False), 'assign_to'),
+                title=self.text(record, Issue, 'title'),
+                description=self.text(record, Issue, 'description', required=False),
+                statue=self.text(record, Issue, 'statue'),
+                priority=self.text(record, Issue, 'priority'),
+                tag=self.text(record, Issue, 'tag'),
+            )
+            refs[id(issue)] = ref
+            batch_refs.add(ref)
+            return issue
+
+        issues = Issue.objects.bulk_create(self.validate(rows, build))
+        by_project = defaultdict(list)
+        for issue in issues:
+            by_project[issue.project_id].append(issue)
+            if refs[id(issue)] is not None:
+                self.issue_refs[refs[id(issue)]] = (issue.id, issue.project_id)
+        for project_id, project_issues in by_project.items():
+            Project.update_counters(project_id, **Issue.counter_deltas(project_issues))
+            invalidate_project_responses(project_id)
+        get_search_backend().index_issues(issues, created=True)
+        record_changes(issues, 'created')
+        self.report['issues'] += len(issues)
+
+    def import_comments(self, rows):
+        def build(record):
+            issue_id, project_id = self.ref(record, self.issue_refs, 'issue')
+            return Comment(
+                issue_id=issue_id,
+                author_id=self.member(project_id, self.user(record, 'author'), 'author'),
+                description=self.text(record, Comment, 'description'),
+            )
+
+        comments = Comment.objects.bulk_create(self.validate(rows, build))
+        # the search index needs the title and project of the issues
+        issues = Issue.objects.only('id', 'project_id', 'title').in_bulk(
+            {comment.issue_id for comment in comments})
+        for comment in comments:
+            comment.issue = issues[comment.issue_id]
+        for project_id in {issue.project_id for issue in issues.values()}:
+            Project.update_counters(project_id)
+            invalidate_project_responses(project_id)
+        get_search_backend().index_comments(comments, created=True)
+        record_changes(comments, 'created')
+        self.report['comments'] += len(comments)
+
+    # in the order of the dependencies
+    importers = {
+        'user': import_users,
+        'project': import_projects,
+        'issue': import_issues,
+        'comment': import_comments,
+    }
@@ -0,0 +1,135 @@
+import asyncio
+import statistics
+import time
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from rest_framework_simplejwt.tokens import AccessToken
+
+from project.models import Project
+from issue.models import Issue
+from api.benchmark import benchmark_database, read_views, seed
+from api.cache import get_response_cache
+
+
+async def asgi_get(application, path, headers):
+    """ send a GET request to the ASGI application like a server, return the status."""
+    path, _, query_string = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': query_string.encode(), 'root_path': '', 'headers': headers,
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    body_sent = False
+    status = None
+
+    async def receive():
+        nonlocal body_sent
+        if body_sent:
+            # no disconnect, the handler cancel this wait after the response
+            await asyncio.Future()
+        body_sent = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    help = ("Load test of the read endpoints through the ASGI handler in a throwaway database, "
+            "with the async read views and with the sync views, in the same process.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projects', type=int, default=5)
+        parser.add_argument('--issues', type=int, default=2000, help="issues per project")
+        parser.add_argument('--comments', type=int, default=5, help="comments per issue")
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=str, default='1,10,50',
+                            help="numbers of requests in flight, separated by a comma")
+        parser.add_argument('--latency', type=float, default=0,
+                            help="round trip (ms) added to each query, like a database server")
+
+    def get_paths(self, count):
+        """ a mix of list and detail reads, the pages change so they aren't all cached."""
+        issues = {
+            project_id: list(Issue.objects.filter(project_id=project_id).values_list('id', flat=True)[:50])
+            for project_id in Project.objects.values_list('id', flat=True)}
+        projects = list(issues)
+        pages = max(1, min(200, Issue.objects.filter(project_id=projects[0]).count() // 5))
+        paths = []
+        for index in range(count):
+            project_id = projects[index % len(projects)]
+            issue_id = issues[project_id][index % len(issues[project_id])]
+            paths.append([
+                f'/api/projects/{project_id}/',
+                f'/api/projects/{project_id}/issues/?page={index % pages + 1}',
+                f'/api/projects/{project_id}/issues/{issue_id}/',
+                f'/api/projects/{project_id}/issues/{issue_id}/comments/',
+            ][index % 4])
+        return paths
+
+    async def load(self, application, paths, headers, concurrency):
+        """ send the requests with concurrency requests in flight, return the latencies (ms)."""
+        queue = list(reversed(paths))
+        latencies = []
+        errors = []
+
+        async def worker():
+            while queue:
+                path = queue.pop()
+                start = time.perf_counter()
+                status = await asgi_get(application, path, headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    errors.append((path, status))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return time.perf_counter() - start, latencies, errors
+
+    def run(self, name, paths, headers, concurrency):
+        get_response_cache().clear()
+        duration, latencies, errors = asyncio.run(
+            self.load(ASGIHandler(), paths, headers, concurrency))
+        latencies.sort()
+        self.stdout.write(
+            f"{name:<8}{concurrency:>10}{len(paths) / duration:>14.0f}"
+            f"{statistics.median(latencies):>12.1f}{latencies[int(len(latencies) * 0.95)]:>12.1f}")
+        if errors:
+            self.stderr.write(f"{len(errors)} erreurs : {errors[:3]}")
+
+    def handle(self, *args, **options):
+        if options['latency']:
+            delay = options['latency'] / 1000
+
+            def add_latency(execute, sql, params, many, context):
+                # sleep release the GIL like the wait of a database server
+                time.sleep(delay)
+                return execute(sql, params, many, context)
+
+            # the requests run their queries on the connections of their threads
+            def connection_created_latency(sender, connection, **kwargs):
+                connection.execute_wrappers.append(add_latency)
+            connection_created.connect(connection_created_latency, weak=False)
+
+        with benchmark_database():
+            self.stdout.write("création des données...")
+            author = seed(options['projects'], options['issues'], options['comments'])
+            token = str(AccessToken.for_user(author))
+            headers = [(b'authorization', f'Bearer {token}'.encode()),
+                       (b'accept', b'application/json')]
+            paths = self.get_paths(options['requests'])
+
+            self.stdout.write(
+                f"{'vues':<8}{'parallèle':>10}{'requêtes/s':>14}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+            for concurrency in [int(value) for value in options['concurrency'].split(',')]:
+                for name, async_reads in (('sync', False), ('async', True)):
+                    with read_views(async_reads):
+                        self.run(name, paths, headers, concurrency)
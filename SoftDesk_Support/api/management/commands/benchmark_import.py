@@ -0,0 +1,100 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import CustomUser
+from project.models import Project, Contributor
+from issue.models import Issue, Comment
+from api.benchmark import benchmark_database
+from api.importer import NDJSONImporter
+
+
+def generate(prefix, users, projects, issues, comments):
+    """ yield the NDJSON lines of a dataset, issues per project and comments per issue."""
+    usernames = [f'{prefix}user{u}' for u in range(users)]
+    for username in usernames:
+        yield json.dumps({'model': 'user', 'username': username, 'age': 30})
+    for p in range(projects):
+        yield json.dumps({
+            'model': 'project', 'ref': f'p{p}', 'author': usernames[0], 'name': f'Projet {p}',
+            'description': 'description', 'type': 'Back-end', 'contributors': usernames[1:]})
+        for i in range(issues):
+            yield json.dumps({
+                'model': 'issue', 'ref': f'p{p}i{i}', 'project': f'p{p}',
+                'author': usernames[i % users], 'assign_to': usernames[(i * 7) % users],
+                'title': f'ticket {i}', 'description': 'description ' * 20,
+                'statue': 'Todo', 'priority': 'Low', 'tag': 'Bug'})
+            for c in range(comments):
+                yield json.dumps({
+                    'model': 'comment', 'issue': f'p{p}i{i}',
+                    'author': usernames[(i + c) % users], 'description': 'commentaire ' * 10})
+
+
+def save_per_object(lines):
+    """ insert the records one by one with the models save, like the per-object API."""
+    users, projects, issues = {}, {}, {}
+    for line in lines:
+        record = json.loads(line)
+        model = record.pop('model')
+        if model == 'user':
+            user = CustomUser(**record)
+            user.set_unusable_password()
+            user.save()
+            users[user.username] = user
+        elif model == 'project':
+            contributors = record.pop('contributors')
+            ref = record.pop('ref')
+            record['author'] = users[record['author']]
+            projects[ref] = Project.objects.create(**record)
+            for username in contributors:
+                Contributor.objects.create(user=users[username], project=projects[ref])
+        elif model == 'issue':
+            ref = record.pop('ref')
+            record['project'] = projects[record['project']]
+            record['author'] = users[record['author']]
+            record['assign_to'] = users[record['assign_to']]
+            issues[ref] = Issue.objects.create(**record)
+        else:
+            record['issue'] = issues[record['issue']]
+            record['author'] = users[record['author']]
+            Comment.objects.create(**record)
+
+
+class Command(BaseCommand):
+    help = ("Measure the throughput of the NDJSON bulk import in a throwaway database, "
+            "compared to the insertion of the same records one by one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--projects', type=int, default=5)
+        parser.add_argument('--issues', type=int, default=2000, help="issues per project")
+        parser.add_argument('--comments', type=int, default=5, help="comments per issue")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--per-object-issues', type=int, default=200,
+                            help="issues per project of the one by one insertion (slower)")
+
+    def run(self, name, func, lines):
+        start = time.perf_counter()
+        func(lines)
+        duration = time.perf_counter() - start
+        self.stdout.write(
+            f"{name:<16}{len(lines):>10}{duration:>12.2f}{len(lines) / duration:>14.0f}")
+
+    def handle(self, *args, **options):
+        bulk_lines = list(generate(
+            'bulk', options['users'], options['projects'], options['issues'], options['comments']))
+        object_lines = list(generate(
+            'object', options['users'], options['projects'], options['per_object_issues'],
+            options['comments']))
+
+        with benchmark_database():
+            self.stdout.write(f"{'':<16}{'lignes':>10}{'durée (s)':>12}{'lignes / s':>14}")
+
+            def bulk_import(lines):
+                report = NDJSONImporter(batch_size=options['batch_size']).run(lines)
+                if report['error_count']:
+                    self.stderr.write(f"{report['error_count']} erreurs : {report['errors'][:3]}")
+
+            self.run('import NDJSON', bulk_import, bulk_lines)
+            self.run('un par un', save_per_object, object_lines)
@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, reset_queries
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from project.models import Project
+from issue.models import Issue, Comment
+from api.benchmark import benchmark_database, seed, measure, explain
+from api.cache import get_response_cache
+
+
+@contextmanager
+def without_indexes():
+    """
+    Put the database back to the indexes it had before the composite indexes:
+    only the single column foreign key indexes.
+    """
+    old_indexes = [
+        (Issue, models.Index(fields=['project'], name='bench_issue_project_idx')),
+        (Comment, models.Index(fields=['issue'], name='bench_comment_issue_idx')),
+    ]
+    new_indexes = [(model, index) for model in (Issue, Comment) for index in model._meta.indexes]
+
+    with connection.schema_editor() as schema_editor:
+        for model, index in old_indexes:
+            schema_editor.add_index(model, index)
+        for model, index in new_indexes:
+            schema_editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as schema_editor:
+            for model, index in new_indexes:
+                schema_editor.add_index(model, index)
+            for model, index in old_indexes:
+                schema_editor.remove_index(model, index)
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway database and compare the query plans and latency "
+            "of the list and detail endpoints without and with the indexes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projects', type=int, default=5)
+        parser.add_argument('--issues', type=int, default=2000, help="issues per project")
+        parser.add_argument('--comments', type=int, default=5, help="comments per issue")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--explain', action='store_true', help="show the query plans")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self.stdout.write("création des données...")
+            author = seed(options['projects'], options['issues'], options['comments'])
+            project = Project.objects.last()
+            issue = project.issue_set.last()
+            comment = issue.comment_set.last()
+            assignee = issue.assign_to
+
+            client = APIClient()
+            client.force_authenticate(author)
+            project_url = f'/api/projects/{project.id}/'
+            issue_url = f'{project_url}issues/{issue.id}/'
+            last_page = (project.issue_count + 4) // 5
+
+            def get(url):
+                return lambda: client.get(url)
+
+            benchmarks = [
+                ('projects', get('/api/projects/')),
+                ('project detail', get(project_url)),
+                ('contributors', get(f'{project_url}contributors/')),
+                ('issues', get(f'{project_url}issues/')),
+                ('issues last page', get(f'{project_url}issues/?page={last_page}')),
+                ('issues cursor', get(f'{project_url}issues/?pagination=cursor')),
+                ('issues statue', get(f'{project_url}issues/?statue=Todo')),
+                ('issues priority', get(f'{project_url}issues/?priority=High')),
+                ('issues assign_to', get(f'{project_url}issues/?assign_to={assignee.id}')),
+                ('issues by priority', get(f'{project_url}issues/?ordering=-priority')),
+                ('issues by date', get(f'{project_url}issues/?ordering=-created_time')),
+                ('issue detail', get(issue_url)),
+                ('comments', get(f'{issue_url}comments/')),
+                ('comment detail', get(f'{issue_url}comments/{comment.id}/')),
+                ('ORM issues by statue', lambda: Issue.objects.filter(
+                    project=project, statue='Todo').count()),
+                ('ORM issues by assign_to', lambda: list(Issue.objects.filter(
+                    project=project, assign_to=assignee)[:5])),
+                ('ORM comment by uuid', lambda: Comment.objects.get(uuid=comment.uuid)),
+            ]
+
+            results = {}
+            with without_indexes():
+                results['sans index'] = self.run_benchmarks(benchmarks, options)
+            results['avec index'] = self.run_benchmarks(benchmarks, options)
+
+        self.stdout.write(f"\n{'':<26}{'sans index (ms)':>20}{'avec index (ms)':>20}")
+        for name, _ in benchmarks:
+            before = results['sans index'][name]
+            after = results['avec index'][name]
+            self.stdout.write(
+                f"{name:<26}{before[0]:>11.2f} / {before[1]:>6.2f}{after[0]:>11.2f} / {after[1]:>6.2f}")
+        self.stdout.write("(médiane / max)")
+
+    def run_benchmarks(self, benchmarks, options):
+        results = {}
+        for name, func in benchmarks:
+            # each request reset the queries log, start from an empty one
+            reset_queries()
+            # the cached responses would skip the queries of the indexes
+            get_response_cache().clear()
+            with CaptureQueriesContext(connection) as queries:
+                func()
+            sqls = [query['sql'] for query in queries.captured_queries]
+            results[name] = measure(func, options['repeat'], setup=get_response_cache().clear)
+            if options['explain']:
+                self.stdout.write(f"\n{name} :")
+                for sql in sqls:
+                    self.stdout.write(f"  {sql[:150]}")
+                    for line in explain(sql):
+                        self.stdout.write(f"    -> {line}")
+        return results
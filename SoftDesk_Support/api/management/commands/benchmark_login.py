@@ -0,0 +1,106 @@
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import CustomUser
+from api.benchmark import benchmark_database, seed
+from api.cache import get_response_cache
+
+PASSWORD = 'benchmark-password'
+
+
+def percentile(latencies, fraction):
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ("Load test of the login (/api/token/) in a throwaway database, with the django "
+            "password hasher and without limit (actuel), then with the settings of the "
+            "project (proposé): PASSWORD_HASH_ITERATIONS and LOGIN_HASH_WORKERS. "
+            "A client reads the projects during the logins, to see the effect on the other requests.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=100)
+        parser.add_argument('--concurrency', type=str, default='1,4,16',
+                            help="numbers of logins in flight, separated by a comma")
+
+    def configurations(self):
+        # the throttles would reject most of the logins
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+        yield 'actuel', override_settings(
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher'],
+            LOGIN_HASH_WORKERS=None, REST_FRAMEWORK=rest_framework)
+        yield 'proposé', override_settings(REST_FRAMEWORK=rest_framework)
+
+    def login(self, usernames, latencies, errors):
+        client = Client()
+        while usernames:
+            try:
+                username = usernames.pop()
+            except IndexError:
+                break
+            start = time.perf_counter()
+            response = client.post('/api/token/', {'username': username, 'password': PASSWORD})
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        connection.close()
+
+    def read(self, token, done, latencies):
+        """ read the project list until the logins are done."""
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+        while not done.is_set():
+            get_response_cache().clear()
+            start = time.perf_counter()
+            client.get('/api/projects/')
+            latencies.append((time.perf_counter() - start) * 1000)
+        connection.close()
+
+    def run(self, name, users, token, logins, concurrency):
+        usernames = [users[index % len(users)] for index in range(logins)]
+        login_latencies, read_latencies, errors = [], [], []
+        done = threading.Event()
+        reader = threading.Thread(target=self.read, args=(token, done, read_latencies))
+        workers = [threading.Thread(target=self.login, args=(usernames, login_latencies, errors))
+                   for _ in range(concurrency)]
+
+        start = time.perf_counter()
+        reader.start()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        duration = time.perf_counter() - start
+        done.set()
+        reader.join()
+
+        self.stdout.write(
+            f"{name:<9}{concurrency:>10}{logins / duration:>12.1f}"
+            f"{statistics.median(login_latencies):>12.0f}{percentile(login_latencies, 0.99):>12.0f}"
+            f"{percentile(read_latencies, 0.99):>16.0f}")
+        if errors:
+            self.stderr.write(f"{len(errors)} erreurs : {errors[:5]}")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            author = seed(projects=2, issues=50, comments=1, contributors=20)
+            token = str(AccessToken.for_user(author))
+            users = list(CustomUser.objects.values_list('username', flat=True))
+
+            self.stdout.write(
+                f"{'réglages':<9}{'parallèle':>10}{'logins/s':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}"
+                f"{'lecture p99':>16}")
+            for concurrency in [int(value) for value in options['concurrency'].split(',')]:
+                for name, configuration in self.configurations():
+                    with configuration:
+                        # hashed like the users of these settings, no update at the login
+                        CustomUser.objects.update(password=make_password(PASSWORD))
+                        self.run(name, users, token, options['logins'], concurrency)
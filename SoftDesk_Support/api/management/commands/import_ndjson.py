@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api.importer import NDJSONImporter
+
+
+class Command(BaseCommand):
+    help = "Import users, projects, issues and comments from a NDJSON file (see api/importer.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file, - for the standard input.")
+        parser.add_argument('--batch-size', type=int, help="lines inserted together (IMPORT_BATCH_SIZE).")
+
+    def progress(self, report):
+        self.stdout.write(
+            f"{report['lines']} lignes : {report['users']} utilisateurs, {report['projects']} projets, "
+            f"{report['issues']} tickets, {report['comments']} commentaires, "
+            f"{report['error_count']} erreurs")
+
+    def handle(self, *args, **options):
+        importer = NDJSONImporter(batch_size=options['batch_size'], progress=self.progress)
+        if options['path'] == '-':
+            report = importer.run(sys.stdin)
+        else:
+            with open(options['path'], encoding='utf-8') as file:
+                report = importer.run(file)
+
+        for error in report['errors']:
+            self.stderr.write(f"ligne {error['line']} : {error['error']}")
+        if report['error_count'] > len(report['errors']):
+            self.stderr.write(f"... {report['error_count'] - len(report['errors'])} autres erreurs")
+        self.stdout.write(self.style.SUCCESS(
+            f"Import terminé : {importer.created} lignes créées, {report['error_count']} erreurs."))
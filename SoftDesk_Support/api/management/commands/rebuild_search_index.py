@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Index again all the issues and comments for the full-text search."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Index de recherche reconstruit ({type(backend).__name__})."))
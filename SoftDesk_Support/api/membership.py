@@ -0,0 +1,183 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+
+from accounts.models import CustomUser
+from project.models import Contributor
+
+
+def membership_cache_key(user_id):
+    """ key used to store the project IDs of a user in the shared cache."""
+    return f'membership:{user_id}'
+
+
+def get_project_ids(request):
+    """
+    Return the set of project IDs the user of the request contributes to.
+
+    The set is loaded once per request and stored on it, so every permission
+    class of the request use the same result.
+    if MEMBERSHIP_CACHE_TIMEOUT is set, the set is also shared between requests
+    through the django cache, and invalidated when a Contributor is saved or deleted.
+    """
+    project_ids = getattr(request, '_contributor_project_ids', None)
+    if project_ids is not None:
+        return project_ids
+
+    user = request.user
+    if not user.is_authenticated:
+        project_ids = frozenset()
+    else:
+        timeout = getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', None)
+        key = membership_cache_key(user.id)
+        project_ids = cache.get(key) if timeout else None
+        if project_ids is None:
+            project_ids = frozenset(Contributor.objects.filter(
+                user_id=user.id).values_list('project_id', flat=True))
+            if timeout:
+                cache.set(key, project_ids, timeout)
+
+    request._contributor_project_ids = project_ids
+    return project_ids
+
+
+async def aget_project_ids(request):
+    """
+    get_project_ids with the async ORM and cache, for the async read actions.
+
+    the set is stored on the request the same way, so the permission
+    classes called after it don't query the database.
+    """
+    project_ids = getattr(request, '_contributor_project_ids', None)
+    if project_ids is not None:
+        return project_ids
+
+    user = request.user
+    if not user.is_authenticated:
+        project_ids = frozenset()
+    else:
+        timeout = getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', None)
+        key = membership_cache_key(user.id)
+        project_ids = await cache.aget(key) if timeout else None
+        if project_ids is None:
+            project_ids = frozenset([project_id async for project_id in Contributor.objects.filter(
+                user_id=user.id).values_list('project_id', flat=True)])
+            if timeout:
+                await cache.aset(key, project_ids, timeout)
+
+    request._contributor_project_ids = project_ids
+    return project_ids
+
+
+def is_contributor(request, project_id):
+    """
+    check if the user of the request is a contributor of the project.
+    the contributors of the project already loaded for an assign_to
+    (get_assignable_users) answer without loading the membership.
+    """
+    if project_id is None:
+        return False
+    try:
+        project_id = int(project_id)
+    except (TypeError, ValueError):
+        return False
+    assignable_users = request.__dict__.get('_assignable_users', {}).get(project_id)
+    if assignable_users is not None and getattr(request, '_contributor_project_ids', None) is None:
+        return any(user.id == request.user.id for user in assignable_users)
+    return project_id in get_project_ids(request)
+
+
+def contributed_projects(queryset, user):
+    """
+    Filter the projects of the queryset to the ones the user contributes to, all of them for the staff.
+
+    the author is always a contributor (Project.save), so a single join on
+    the (user, project) index of the contributors is enough.
+    """
+    if user.is_staff:
+        return queryset
+    return queryset.filter(contributor__user_id=user.id)
+
+
+def annotate_is_contributor(queryset, user, project_field='project_id'):
+    """
+    Annotate is_contributor on the objects of the queryset: the user contributes
+    to their project (project_field), read by the permissions instead of the membership.
+    """
+    return queryset.annotate(is_contributor=Exists(Contributor.objects.filter(
+        project_id=OuterRef(project_field), user_id=user.id)))
+
+
+def invalidate_membership(user_id):
+    """ remove the cached project IDs of a user from the shared cache."""
+    cache.delete(membership_cache_key(user_id))
+
+
+def get_assignable_users(request, project_id):
+    """
+    Return the users that can be assigned to an issue of the project (its contributors).
+
+    the list is loaded once per project and stored on the request.
+    """
+    assignable_users = request.__dict__.setdefault('_assignable_users', {})
+    project_id = int(project_id)
+    if project_id not in assignable_users:
+        assignable_users[project_id] = list(assignable_users_queryset(project_id))
+    return assignable_users[project_id]
+
+
+async def aget_assignable_users(request, project_id):
+    """ get_assignable_users with the async ORM, stored on the request the same way."""
+    assignable_users = request.__dict__.setdefault('_assignable_users', {})
+    project_id = int(project_id)
+    if project_id not in assignable_users:
+        assignable_users[project_id] = [user async for user in assignable_users_queryset(project_id)]
+    return assignable_users[project_id]
+
+
+def assignable_users_queryset(project_id):
+    return CustomUser.objects.filter(contributor__project_id=project_id).only('id', 'username')
+
+
+def find_assignable_user(users, value):
+    """ find a user by his username, or by his id if no username match."""
+    value = str(value)
+    for user in users:
+        if user.username == value:
+            return user
+    if value.isdigit():
+        for user in users:
+            if user.id == int(value):
+                return user
+    return None
+
+
+def format_user_list(users):
+    return ', '.join([f'{user.username} (ID: {user.id})' for user in users])
+
+
+def resolve_users(values):
+    """
+    Find the users of a list of usernames or IDs with a single query.
+
+    return the users found in the order of the values, and the unknown values.
+    like for the contributors, a value is a username first, else an ID.
+    """
+    values = [str(value) for value in values]
+    ids = [int(value) for value in values if value.isdigit()]
+    users = CustomUser.objects.filter(
+        Q(username__in=values) | Q(id__in=ids)).only('id', 'username')
+    by_username = {user.username: user for user in users}
+    by_id = {user.id: user for user in by_username.values()}
+
+    found = {}
+    unknown = []
+    for value in values:
+        user = by_username.get(value)
+        if user is None and value.isdigit():
+            user = by_id.get(int(value))
+        if user is None:
+            unknown.append(value)
+        else:
+            found[user.id] = user
+    return list(found.values()), unknown
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# same table and columns as api.search.SQLiteFTSBackend, copied: the
+# migration must not change with the code of the app
+TABLE = 'api_search_index'
+COLUMNS = '(type, object_id, project_id, issue_id, issue_title, title, body)'
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is only available on sqlite, the other databases use DatabaseSearchBackend
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE {TABLE} USING fts5('
+        'title, body, type UNINDEXED, object_id UNINDEXED, project_id UNINDEXED, '
+        "issue_id UNINDEXED, issue_title UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')")
+
+    # index the existing issues and comments, with the models of this migration
+    Issue = apps.get_model('issue', 'Issue')
+    Comment = apps.get_model('issue', 'Comment')
+    issues = (
+        ('issue', issue_id, project_id, issue_id, title, title, description)
+        for issue_id, project_id, title, description in Issue.objects.values_list(
+            'id', 'project_id', 'title', 'description'))
+    comments = (
+        ('comment', comment_id, project_id, issue_id, title, '', description)
+        for comment_id, project_id, issue_id, title, description in Comment.objects.values_list(
+            'id', 'issue__project_id', 'issue_id', 'issue__title', 'description'))
+    with schema_editor.connection.cursor() as cursor:
+        for rows in (issues, comments):
+            cursor.executemany(
+                f'INSERT INTO {TABLE} {COLUMNS} VALUES (%s, %s, %s, %s, %s, %s, %s)', list(rows))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issue', '0005_issue_priority_rank'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
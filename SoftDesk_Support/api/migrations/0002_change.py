@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('project', 'project'), ('contributor', 'contributor'), ('issue', 'issue'), ('comment', 'comment')], max_length=12)),
+                ('object_id', models.PositiveIntegerField()),
+                ('action', models.CharField(choices=[('created', 'created'), ('updated', 'updated'), ('deleted', 'deleted')], max_length=8)),
+                ('project_id', models.PositiveIntegerField(verbose_name='projet')),
+                ('user_id', models.PositiveIntegerField(null=True, verbose_name='utilisateur')),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['pk'],
+                'indexes': [models.Index(fields=['project_id', 'id'], name='change_project_id_idx'), models.Index(fields=['user_id', 'id'], name='change_user_id_idx')],
+            },
+        ),
+    ]
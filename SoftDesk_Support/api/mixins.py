@@ -0,0 +1,504 @@
+import functools
+import hashlib
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import exceptions
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .cache import get_response_cache
+from .membership import aget_project_ids, annotate_is_contributor
+from .serializers import ValuesSerializer
+
+
+class QueryPlanMixin:
+    """
+    Apply the query plan declared for the current action to the queryset.
+
+    query_plans is a dict of action name -> plan, the 'default' plan is used
+    for the actions without their own plan. A plan can contain:
+    - select_related: list of foreign keys to join in the same query.
+    - prefetch_related: list of relations to load in one extra query.
+    - only: list of the columns to fetch.
+    """
+
+    query_plans = {}
+
+    def get_query_plan(self):
+        return self.query_plans.get(self.action, self.query_plans.get('default', {}))
+
+    def apply_query_plan(self, queryset):
+        plan = self.get_query_plan()
+        if plan.get('select_related'):
+            queryset = queryset.select_related(*plan['select_related'])
+        if plan.get('prefetch_related'):
+            queryset = queryset.prefetch_related(*plan['prefetch_related'])
+        if plan.get('only'):
+            queryset = queryset.only(*plan['only'])
+        return queryset
+
+    def filter_queryset(self, queryset):
+        # called by the list and get_object, so every action use its plan
+        return self.apply_query_plan(super().filter_queryset(queryset))
+
+
+class ContributorAnnotationMixin:
+    """
+    Annotate is_contributor on the object of the detail actions (see membership.annotate_is_contributor),
+    so its object permissions only compare IDs, without query.
+    contributor_project_field is the field of the project ID of the objects.
+    """
+
+    contributor_project_field = 'project_id'
+    annotated_actions = ['retrieve', 'update', 'partial_update', 'destroy']
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.annotated_actions:
+            queryset = annotate_is_contributor(
+                queryset, self.request.user, self.contributor_project_field)
+        return queryset
+
+
+class ValuesListMixin:
+    """
+    Serve the list action with values_serializer_class (see serializers.ValuesSerializer):
+    only its columns are loaded with values(), no model instances are built.
+    the browsable api forms still use the model serializer.
+    """
+
+    values_serializer_class = None
+
+    def use_values(self):
+        return (self.values_serializer_class is not None and self.action == 'list'
+                and self.request.method in ('GET', 'HEAD'))
+
+    def get_values_fields(self):
+        """ the fields of the values serializer, None for all of them."""
+        return None
+
+    def get_serializer_class(self):
+        if self.use_values():
+            return self.values_serializer_class
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.use_values():
+            kwargs['only'] = self.get_values_fields()
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.use_values():
+            # the relations are joined by the columns, nothing to prefetch
+            queryset = queryset.prefetch_related(None).values(
+                *self.values_serializer_class.get_columns(self.get_values_fields()))
+        return queryset
+
+
+class ExpandMixin:
+    """
+    Embed related resources in the list and retrieve responses with ?expand= (or ?include=),
+    a comma separated list of the names of expandable.
+
+    expandable is a dict of name -> query plan (see QueryPlanMixin), the plans
+    of the expanded names are added to the plan of the action (their only columns
+    are only added to a plan with only, see SparseFieldsMixin), so the embedded
+    resources cost a fixed number of queries. the names are given to the
+    serializer in the 'expand' context, it render the embedded resources.
+    """
+
+    expandable = {}
+    expand_actions = ['list', 'retrieve']
+
+    def get_expand(self):
+        if not hasattr(self, '_expand'):
+            self._expand = ()
+            value = self.request.query_params.get('expand', self.request.query_params.get('include'))
+            if value and self.action in self.expand_actions:
+                names = [name.strip() for name in value.split(',') if name.strip()]
+                unknown = [name for name in names if name not in self.expandable]
+                if unknown:
+                    raise exceptions.ValidationError({'expand': (
+                        f"'{', '.join(unknown)}' n'est pas un choix valide. "
+                        f"Les choix disponible sont : {', '.join(self.expandable)}")})
+                self._expand = tuple(dict.fromkeys(names))
+        return self._expand
+
+    def get_query_plan(self):
+        plan = super().get_query_plan()
+        expand = self.get_expand()
+        if not expand:
+            return plan
+        plan = {key: list(values) for key, values in plan.items()}
+        for name in expand:
+            for key, values in self.expandable[name].items():
+                if key == 'only' and 'only' not in plan:
+                    # the columns read by the embedded resources, already loaded without only
+                    continue
+                plan[key] = list(dict.fromkeys(plan.get(key, []) + list(values)))
+        return plan
+
+    def use_values(self):
+        # the embedded resources need the model instances
+        return super().use_values() and not self.get_expand()
+
+    def get_serializer(self, *args, **kwargs):
+        # also in the context given by the retrieve actions
+        context = kwargs.get('context') or self.get_serializer_context()
+        kwargs['context'] = {**context, 'expand': self.get_expand()}
+        return super().get_serializer(*args, **kwargs)
+
+
+class SparseFieldsMixin:
+    """
+    Limit the list and retrieve responses to the fields of ?fields= (comma separated).
+
+    the other fields are removed from the serializer, and the query plan of the
+    action is replaced by the plans of the fields: sparse_plans give the plan of
+    the fields that aren't a column of the model (relations), the other fields
+    only load their column. the primary and foreign keys are always loaded,
+    the permissions and the expanded resources read them.
+    the lists of a values serializer (see ValuesListMixin) only read the
+    columns of the fields with values().
+    """
+
+    sparse_plans = {}
+    sparse_actions = ['list', 'retrieve']
+
+    def get_sparse_fields(self):
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = ()
+            value = self.request.query_params.get('fields')
+            if value and self.action in self.sparse_actions and self.request.method in ('GET', 'HEAD'):
+                names = [name.strip() for name in value.split(',') if name.strip()]
+                # the fields the model serializer render for the action (detail_fields
+                # only in the detail view, or expanded), not the values serializer of the list
+                hidden = set() if self.action == 'retrieve' else (
+                    set(getattr(self.serializer_class, 'detail_fields', ()))
+                    - set(getattr(self, 'get_expand', tuple)()))
+                readable = [name for name, field in self.serializer_class().fields.items()
+                            if not field.write_only and name not in hidden]
+                unknown = [name for name in names if name not in readable]
+                if unknown:
+                    raise exceptions.ValidationError({'fields': (
+                        f"'{', '.join(unknown)}' n'est pas un champ valide. "
+                        f"Les choix disponible sont : {', '.join(readable)}")})
+                self._sparse_fields = tuple(dict.fromkeys(names))
+        return self._sparse_fields
+
+    def get_query_plan(self):
+        fields = self.get_sparse_fields()
+        if not fields:
+            return super().get_query_plan()
+        model = self.get_queryset().model
+        plan = {'only': [model._meta.pk.name] + [
+            field.name for field in model._meta.concrete_fields if field.many_to_one]}
+        for name in fields:
+            if name in self.sparse_plans:
+                field_plan = self.sparse_plans[name]
+            elif any(field.name == name for field in model._meta.concrete_fields):
+                field_plan = {'only': [name]}
+            else:
+                field_plan = {}
+            for key, values in field_plan.items():
+                plan[key] = list(dict.fromkeys(plan.get(key, []) + list(values)))
+        return plan
+
+    def get_values_fields(self):
+        # only the columns of the fields are read with values()
+        return self.get_sparse_fields() or None
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_sparse_fields()
+        # the values serializer already only render the fields (get_values_fields)
+        if fields and not isinstance(serializer, ValuesSerializer):
+            child = getattr(serializer, 'child', serializer)
+            for name in list(child.fields):
+                if name not in fields:
+                    child.fields.pop(name)
+        return serializer
+
+
+class EarlyResponse(APIException):
+    """ response returned by initial, before the handler of the action (304, cached response)."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalRequestMixin:
+    """
+    ETag and Last-Modified headers on the list and retrieve responses,
+    and 304 responses to the If-None-Match and If-Modified-Since requests.
+
+    The ETag is computed from the version stamp returned by get_version_stamp
+    (before loading and serializing the data), so a 304 only costs the
+    permission checks and the stamp query.
+    get_version_stamp return (version, last_modified), or None to skip.
+    """
+
+    conditional_actions = ['list', 'retrieve']
+
+    def get_version_stamp(self):
+        raise NotImplementedError
+
+    async def aget_version_stamp(self):
+        """ get_version_stamp of the async read actions."""
+        raise NotImplementedError
+
+    def is_conditional(self, request):
+        return request.method in ('GET', 'HEAD') and self.action in self.conditional_actions
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = self.last_modified = self.version_stamp = None
+        if self.is_conditional(request):
+            self.check_version_stamp(request, self.get_version_stamp())
+
+    async def ainitial(self, request, *args, **kwargs):
+        await super().ainitial(request, *args, **kwargs)
+        self.etag = self.last_modified = self.version_stamp = None
+        if self.is_conditional(request):
+            self.check_version_stamp(request, await self.aget_version_stamp())
+
+    def check_version_stamp(self, request, stamp):
+        """ set the ETag and Last-Modified of the stamp, and answer 304 if the client is up to date."""
+        if stamp is None:
+            return
+        self.version_stamp = stamp
+
+        version, last_modified = stamp
+        # the same resource can be rendered in different formats and pages
+        key = f'{version}:{request.get_full_path()}:{request.headers.get("Accept", "")}'
+        self.etag = '"%s"' % hashlib.md5(key.encode()).hexdigest()
+        # the dates of the HTTP headers have no fraction of second
+        self.last_modified = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(
+            request._request, etag=self.etag, last_modified=self.last_modified)
+        if response is not None:
+            raise EarlyResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, EarlyResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            if self.last_modified is not None:
+                response['Last-Modified'] = http_date(self.last_modified)
+        return response
+
+
+class ResponseCacheMixin(ConditionalRequestMixin):
+    """
+    Cache the rendered JSON responses of the cached_actions of a project resource.
+
+    The key contains the project version stamp, the path, and the visibility class
+    of the user, so the entries of an old version are never used.
+    project_url_kwarg is the url kwarg with the ID of the project.
+    a cached object (retrieve) is stored with the IDs read by its permissions
+    (permission_attributes), they are checked for the user before the cached
+    response is returned, without loading the object.
+    """
+
+    cached_actions = ['list', 'retrieve']
+    project_url_kwarg = 'project_pk'
+    permission_attributes = ['author_id', 'assign_to_id', 'project_id']
+
+    def get_visibility_class(self):
+        """
+        the users of a class get the same response.
+        the cached responses only show the usernames, a view that use
+        UserSerializer (email and age hidden for the others) must return the user ID.
+        """
+        return 'staff' if self.request.user.is_staff else 'member'
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.check_response_cache(request)
+
+    async def ainitial(self, request, *args, **kwargs):
+        await super().ainitial(request, *args, **kwargs)
+        self.check_response_cache(request)
+
+    def check_response_cache(self, request):
+        """ answer with the cached response of the request if any (after the version stamp)."""
+        self.cache_key = None
+        if (self.version_stamp is None or self.action not in self.cached_actions
+                or request.accepted_renderer.format != 'json'):
+            return
+
+        version = self.version_stamp[0]
+        self.cache_project_id = int(self.kwargs[self.project_url_kwarg])
+        self.cache_key = f'{version}:{self.get_visibility_class()}:{request.get_full_path()}'
+        cached = get_response_cache().get(self.cache_project_id, self.cache_key)
+        if cached is not None:
+            content, content_type, attributes = cached
+            if attributes is not None:
+                # the object permissions of the user, like get_object
+                self.check_object_permissions(request, SimpleNamespace(**attributes))
+            raise EarlyResponse(HttpResponse(content, content_type=content_type))
+
+    def check_object_permissions(self, request, obj):
+        super().check_object_permissions(request, obj)
+        # the object of the response, stored with it
+        self.cached_object_attributes = {'pk': obj.pk, **{
+            name: obj.__dict__[name] for name in self.permission_attributes if name in obj.__dict__}}
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'cache_key', None) and response.status_code == 200 \
+                and hasattr(response, 'add_post_render_callback'):
+            project_id, key = self.cache_project_id, self.cache_key
+            attributes = getattr(self, 'cached_object_attributes', None)
+            response.add_post_render_callback(lambda rendered: get_response_cache().set(
+                project_id, key, (rendered.content, rendered['Content-Type'], attributes)))
+        return response
+
+
+class AsyncReadMixin:
+    """
+    Serve the async_actions of a viewset (list and retrieve) with the async ORM.
+
+    Under ASGI a sync view hold a thread for the whole request, the async
+    actions only use the thread of the ORM while a query run.
+    only the JSON GET and HEAD requests are served async, the other requests
+    (writes, browsable api, other formats) go to the sync view.
+    the authentication, membership, permission checks, version stamp and page
+    are read with the async ORM (aperform_authentication, aget_version_stamp,
+    apaginate_queryset, aget_object), the rest is the code of the sync view.
+    the async views are only used with ASYNC_READ_VIEWS (Config.settings_asgi),
+    otherwise the sync view serve all the requests (WSGI), except for the
+    views with async_required (the event streams).
+    """
+
+    async_actions = ['list', 'retrieve']
+    # formats of the renderers served async
+    async_formats = ['json']
+    async_required = False
+    # the actions whose permission checks read the membership of the user
+    membership_actions = ['list', 'retrieve']
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not ((cls.async_required or getattr(settings, 'ASYNC_READ_VIEWS', False))
+                and set(actions.values()) & set(cls.async_actions)):
+            return view
+        sync_view = sync_to_async(view)
+        actions = dict(actions)
+        if 'get' in actions and 'head' not in actions:
+            actions['head'] = actions['get']
+
+        async def async_view(request, *args, **kwargs):
+            self = cls(**initkwargs)
+            self.action_map = actions
+            response = await self.adispatch(request, *args, **kwargs)
+            if response is None:
+                return await sync_view(request, *args, **kwargs)
+            return response
+
+        # cls, initkwargs, actions and csrf_exempt are used by the router and the schemas
+        return functools.update_wrapper(async_view, view)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """ dispatch of the async actions, return None to fall back on the sync view."""
+        if self.action_map.get(request.method.lower()) not in self.async_actions:
+            return None
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        try:
+            request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        except exceptions.NotAcceptable:
+            return None
+        if request.accepted_renderer.format not in self.async_formats:
+            return None
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            handler = getattr(self, f'a{self.action}')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        """ initial of the async actions, the content negotiation is already done."""
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        await self.aperform_authentication(request)
+        if self.action in self.membership_actions:
+            # the permission classes read the membership stored on the request
+            await aget_project_ids(request)
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        """
+        authenticate the request like request.user, with the aauthenticate
+        of the authentication classes that have one.
+        """
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, 'aauthenticate', None)
+            try:
+                if authenticate is not None:
+                    user_auth_tuple = await authenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer([item async for item in queryset], many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        # same response as the retrieve of the views
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance, context={'detail_view': True})
+        return Response(serializer.data)
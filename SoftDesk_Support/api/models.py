@@ -1,3 +1,39 @@
 from django.db import models
 
-# Create your models here.
+
+class Change(models.Model):
+    """
+    Log of the created, updated and deleted projects, contributors, issues and comments,
+    read by the change feed (see changes.py). the id is the cursor of the clients.
+
+    no foreign keys, the changes of the deleted objects are kept as tombstones.
+    """
+    MODEL_CHOICES = [
+        ('project', 'project'),
+        ('contributor', 'contributor'),
+        ('issue', 'issue'),
+        ('comment', 'comment'),
+    ]
+    ACTION_CHOICES = [
+        ('created', 'created'),
+        ('updated', 'updated'),
+        ('deleted', 'deleted'),
+    ]
+    model = models.CharField(max_length=12, choices=MODEL_CHOICES)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=8, choices=ACTION_CHOICES)
+    project_id = models.PositiveIntegerField(verbose_name="projet")
+    # user of a contributor, he still see the removal of his membership
+    user_id = models.PositiveIntegerField(null=True, verbose_name="utilisateur")
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['pk']
+        indexes = [
+            # changes of the user projects after a cursor
+            models.Index(fields=['project_id', 'id'], name='change_project_id_idx'),
+            models.Index(fields=['user_id', 'id'], name='change_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id} {self.action}'
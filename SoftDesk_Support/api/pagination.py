@@ -0,0 +1,97 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    """
+    Page number pagination with an async version for the async read actions.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """ paginate_queryset with the count and the page read by the async ORM."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # the count is a cached property, set it before the paginator use it
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        self.page.object_list = [item async for item in self.page.object_list]
+        return self.page.object_list
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """
+    Cursor pagination ordered on the primary key.
+
+    No COUNT(*) nor OFFSET scan, the next page start after the last pk seen.
+    the client can choose the page size with ?page_size= (up to KEYSET_MAX_PAGE_SIZE).
+    """
+
+    ordering = 'pk'
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 100)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # the page and its positions are read in one go, in the thread of the ORM
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+
+class PageNumberOrKeysetPagination(pagination.BasePagination):
+    """
+    Page number pagination by default, the client can opt into the
+    keyset pagination with ?pagination=cursor.
+    """
+
+    def __init__(self):
+        self.page_number = PageNumberPagination()
+        self.keyset = KeysetPagination()
+        self.current = self.page_number
+
+    def use_keyset(self, request):
+        return (request.query_params.get('pagination') == 'cursor'
+                or self.keyset.cursor_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.current = self.keyset
+        return self.current.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.current = self.keyset
+        return await self.current.apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.current.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.current.get_paginated_response_schema(schema)
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.current, 'display_page_controls', False)
+
+    def to_html(self):
+        return self.current.to_html()
+
+    def get_schema_operation_parameters(self, view):
+        return (self.page_number.get_schema_operation_parameters(view)
+                + self.keyset.get_schema_operation_parameters(view))
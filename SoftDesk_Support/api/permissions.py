@@ -1,223 +1,172 @@
 from rest_framework import permissions
-from project.models import Project
-from issue.models import Issue
 
-
-class CustomUserPermissions(permissions.BasePermission):
+from .roles import (
+    Roles,
+    allowed,
+    ANYONE,
+    AUTHENTICATED,
+    STAFF,
+    CONTRIBUTOR,
+    AUTHOR,
+    ASSIGNEE,
+    SELF,
+    PROJECT_AUTHOR,
+)
+
+
+class RolePermissions(permissions.BasePermission):
     """
-    CustomUser model permissions for admin, authenticated users and guests.
+    Permissions declared as tables of the roles allowed for each action (see roles.py).
+
+    - view_rules: the roles allowed to call each action (has_permission),
+    default_view_rule for the other actions.
+    - object_rules: the roles allowed on the object for each action, with the
+    attributes of request.data they can change, default_object_rule for the
+    other actions. no object_rules allow all the actions.
+    the OPTIONS requests are always allowed.
     """
 
-    # the list view
-    def has_permission(self, request, view):
+    view_rules = {}
+    default_view_rule = (STAFF,)
+    object_rules = None
+    default_object_rule = ()
 
-        # Allow OPTIONS requests
-        if request.method == 'OPTIONS':
-            return True
+    def get_project_id(self, view, obj=None):
+        """ the project of the object, or of the view."""
+        if obj is None:
+            return view.kwargs.get('project_pk')
+        return obj.project_id
 
-        # Allow guest users to create a new user
-        if view.action == 'create':
+    def has_permission(self, request, view):
+        if request.method == 'OPTIONS':
             return True
+        rule = self.view_rules.get(view.action, self.default_view_rule)
+        return allowed(rule, Roles(request, project_id=self.get_project_id(view)))
 
-        # allow authenticated users to Read the user list
-        # and give other permissions that are needed for the object permission
-        elif view.action in ['retrieve', 'list', 'update', 'partial_update', 'destroy']:
-            return request.user.is_authenticated
-
-        # Only allow admins to perform CRUD operations
-        else:
-            return request.user.is_staff
-
-    # the object instance view
     def has_object_permission(self, request, view, obj):
-
-        # Allow OPTIONS requests
-        if request.method == 'OPTIONS':
+        if request.method == 'OPTIONS' or self.object_rules is None:
             return True
+        return self.check_object(request, view.action, obj, request.data.keys())
 
-        # Allow users to update or delete their own instance
-        if view.action in ['update', 'partial_update', 'destroy']:
-            return obj == request.user or request.user.is_staff
+    def check_object(self, request, action, obj, attributes=()):
+        rule = self.object_rules.get(action, self.default_object_rule)
+        return allowed(rule, Roles(request, obj, self.get_project_id(None, obj)), attributes)
 
-        # Allow users to read their own instance
-        elif view.action == 'retrieve':
-            return request.user.is_authenticated
-
-        # Only allow admins to perform CRUD operations
-        else:
-            return request.user.is_staff
 
+class CustomUserPermissions(RolePermissions):
+    """
+    CustomUser model permissions for admin, authenticated users and guests.
+    """
 
-class ProjectPermissions(permissions.BasePermission):
+    view_rules = {
+        # guest users can create a new user
+        'create': (ANYONE,),
+        # authenticated users can read the user list,
+        # the other actions are checked on the user
+        'retrieve': (AUTHENTICATED,),
+        'list': (AUTHENTICATED,),
+        'update': (AUTHENTICATED,),
+        'partial_update': (AUTHENTICATED,),
+        'destroy': (AUTHENTICATED,),
+    }
+    object_rules = {
+        # users can update or delete their own instance
+        'update': (SELF, STAFF),
+        'partial_update': (SELF, STAFF),
+        'destroy': (SELF, STAFF),
+        'retrieve': (AUTHENTICATED,),
+    }
+    # the other actions are only allowed to the admins
+    default_object_rule = (STAFF,)
+
+    def get_project_id(self, view, obj=None):
+        return None
+
+
+# attributes of a project its author can change
+PROJECT_ATTRIBUTES = ['contributors', 'name', 'description', 'type']
+
+
+class ProjectPermissions(RolePermissions):
     """
     Custom permissions for Project
     """
 
-    def has_permission(self, request, view):
-
-        # Allow OPTIONS requests
-        if request.method == 'OPTIONS':
-            return True
-
-        # Allow any authenticated user to create a new project
-        if view.action == 'create':
-            return request.user.is_authenticated
-
-        # allow authenticated users to Read the project list
-        # and give other permissions that are needed for the object permission
-        elif view.action in ['retrieve', 'list', 'update', 'partial_update', 'destroy']:
-            return request.user.is_authenticated
-
-        # Only allow admins to perform CRUD operations
-        else:
-            return request.user.is_staff
-
-    def has_object_permission(self, request, view, obj):
-
-        # Allow OPTIONS requests
-        if request.method == 'OPTIONS':
-            return True
-
-        # Check if the user is a contributor of the project
-        is_contributor = obj.contributors.filter(
-            id=request.user.id).exists()
-
-        # Allow the author of the project to delete the project
-        if view.action == 'destroy':
-            return obj.author == request.user or request.user.is_staff
+    view_rules = {
+        'create': (AUTHENTICATED,),
+        'retrieve': (AUTHENTICATED,),
+        'list': (AUTHENTICATED,),
+        'update': (AUTHENTICATED,),
+        'partial_update': (AUTHENTICATED,),
+        'destroy': (AUTHENTICATED,),
+    }
+    object_rules = {
+        # the author of the project can delete it
+        'destroy': (AUTHOR, STAFF),
+        # and update some attributes
+        'update': {AUTHOR: PROJECT_ATTRIBUTES, STAFF: PROJECT_ATTRIBUTES},
+        'partial_update': {AUTHOR: PROJECT_ATTRIBUTES, STAFF: PROJECT_ATTRIBUTES},
+        # the contributors and the author can read it
+        'retrieve': (STAFF, AUTHOR, CONTRIBUTOR),
+    }
+
+    def get_project_id(self, view, obj=None):
+        return None if obj is None else obj.pk
+
+
+class ContributorPermissions(RolePermissions):
+    """
+    Custom permissions for Contributor
+    """
 
-        # Allow the author of the project to update certain attributes
-        elif view.action in ['update', 'partial_update']:
-            if obj.author == request.user or request.user.is_staff:
-                # Check if the attribute being updated is allowed
-                allowed_attributes = ['contributors',
-                                      'name', 'description', 'type']
-                return all(attribute in allowed_attributes for attribute in request.data.keys())
+    view_rules = {
+        # only the author of the project can add or remove many contributors
+        'bulk': (STAFF, PROJECT_AUTHOR),
+        # the members of the project are only shown to its contributors
+        'list': (STAFF, CONTRIBUTOR),
+        'retrieve': (STAFF, CONTRIBUTOR),
+    }
+    default_view_rule = (AUTHENTICATED,)
 
-        # Allow contributors and the author of the project to read the project
-        elif view.action == 'retrieve':
-            return is_contributor or obj.author == request.user or request.user.is_staff
 
-        return False
+# attributes of an issue its author can change, its assignee can only change the statue
+ISSUE_ATTRIBUTES = ['assign_to', 'title', 'description', 'statue', 'priority', 'tag']
 
 
-class IssuePermissions(permissions.BasePermission):
+class IssuePermissions(RolePermissions):
     """
     Custom permissions for Issue
     """
 
-    def has_permission(self, request, view):
-        # Allow OPTIONS requests
-        if request.method == 'OPTIONS':
-            return True
-
-        # get the project and look if user is a contributor
-        project_id = view.kwargs.get('project_pk')
-        if project_id is not None:
-            project = Project.objects.get(id=project_id)
-            is_contributor = project.contributors.filter(
-                id=request.user.id).exists()
-
-        # Only allow authenticated users who are contributors to the project to create a new issue
-        if view.action == 'create':
-            return is_contributor or request.user.is_staff
-
-        # allow project contributor to Read the issue list
-        # and give other permissions that are needed for the object permission
-        elif view.action in ['retrieve', 'list', 'update', 'partial_update', 'destroy']:
-            return is_contributor or request.user.is_staff
-
-        # Only allow admins to perform CRUD operations
-        else:
-            return request.user.is_staff
+    # the contributors of the project can create, read, and call the
+    # other actions that are checked on the issue
+    view_rules = dict.fromkeys(
+        ['create', 'retrieve', 'list', 'update', 'partial_update', 'destroy', 'bulk', 'export'],
+        (STAFF, CONTRIBUTOR))
+    object_rules = {
+        'destroy': (AUTHOR, STAFF),
+        'update': {AUTHOR: ISSUE_ATTRIBUTES, STAFF: ISSUE_ATTRIBUTES, ASSIGNEE: ['statue']},
+        'partial_update': {AUTHOR: ISSUE_ATTRIBUTES, STAFF: ISSUE_ATTRIBUTES, ASSIGNEE: ['statue']},
+        'retrieve': (STAFF, AUTHOR, CONTRIBUTOR),
+    }
 
-    def has_object_permission(self, request, view, obj):
-
-        # Allow OPTIONS requests
-        if request.method == 'OPTIONS':
-            return True
+    def can_update(self, request, obj, attributes):
+        """ check if the user can update the given attributes of the issue."""
+        return self.check_object(request, 'partial_update', obj, attributes)
 
-        # Check if the user is a contributor of the project
-        is_contributor = obj.project.contributors.filter(
-            id=request.user.id).exists()
 
-        # Allow the author of the issue to delete the issue
-        if view.action == 'destroy':
-            return obj.author == request.user or request.user.is_staff
-
-        # Allow the author of the issue to update certain attributes
-        elif view.action in ['update', 'partial_update']:
-            if obj.author == request.user or request.user.is_staff:
-                # Check if the attribute being updated is allowed
-                allowed_attributes = ['assign_to', 'title',
-                                      'description', 'statue', 'priority', 'tag']
-                return all(attribute in allowed_attributes for attribute in request.data.keys())
-
-            elif obj.assign_to == request.user:
-                # Check if the attribute being updated is 'statue'
-                return all(attribute == 'statue' for attribute in request.data.keys())
-
-        # Allow contributors and the author of the issue to read the issue
-        elif view.action == 'retrieve':
-            return is_contributor or obj.author == request.user or request.user.is_staff
-
-        return False
-
-
-class CommentPermissions(permissions.BasePermission):
+class CommentPermissions(RolePermissions):
     """
     Custom permissions for comment
     """
 
-    def has_permission(self, request, view):
-
-        # Allow OPTIONS requests
-        if request.method == 'OPTIONS':
-            return True
-
-        # get the project and look if user is a contributor
-        project_id = view.kwargs.get('project_pk')
-        if project_id is not None:
-            project = Project.objects.get(id=project_id)
-            is_contributor = project.contributors.filter(
-                id=request.user.id).exists()
-
-        # Only allow authenticated users who are contributors to the project to create a new comment
-        if view.action == 'create':
-            return is_contributor or request.user.is_staff
-
-        # allow project contributor to Read the comment list
-        # and give other permissions that are needed for the object permission
-        elif view.action in ['retrieve', 'list', 'update', 'partial_update', 'destroy']:
-            return is_contributor or request.user.is_staff
-
-        # Only allow admins to perform CRUD operations
-        else:
-            return request.user.is_staff
-
-    def has_object_permission(self, request, view, obj):
-
-        # Allow OPTIONS requests
-        if request.method == 'OPTIONS':
-            return True
-
-        # Check if the user is a contributor of the project
-        is_contributor = obj.issue.project.contributors.filter(
-            id=request.user.id).exists()
-
-        # Allow the author of the comment to delete the comment
-        if view.action == 'destroy':
-            return obj.author == request.user
-
-        # Allow the author of the comment to update certain attributes
-        elif view.action in ['update', 'partial_update']:
-            if obj.author == request.user:
-                # Check if the attribute being updated is allowed
-                allowed_attributes = ['description']
-                return all(attribute in allowed_attributes for attribute in request.data.keys())
-
-        # Allow contributors and the author of the comment to read the comment
-        elif view.action == 'retrieve':
-            return is_contributor or obj.author == request.user
-
-        return False
+    view_rules = dict.fromkeys(
+        ['create', 'retrieve', 'list', 'update', 'partial_update', 'destroy'],
+        (STAFF, CONTRIBUTOR))
+    # only the author, not the admins
+    object_rules = {
+        'destroy': (AUTHOR,),
+        'update': {AUTHOR: ['description']},
+        'partial_update': {AUTHOR: ['description']},
+        'retrieve': (AUTHOR, CONTRIBUTOR),
+    }
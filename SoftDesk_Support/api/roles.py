@@ -0,0 +1,82 @@
+"""
+Roles of the user of a request, for the permission tables of permissions.py.
+
+A rule of a table is the tuple of the roles allowed, or a dict of role -> the
+attributes of the request the role can change (ALL for any). The roles are
+resolved when a rule first need them, in the order of the rule, from:
+- the IDs of the object (author_id, assign_to_id, project_id): no related object is loaded.
+- the is_contributor annotation of the object if any (the detail actions of the
+  views annotate it, see mixins.ContributorAnnotationMixin), else the membership
+  of the request (one query shared by all the checks of the request, see membership.py).
+"""
+from project.models import Project
+
+from .membership import is_contributor
+
+ANYONE = 'anyone'
+AUTHENTICATED = 'authenticated'
+STAFF = 'staff'
+# contributor of the project of the object or of the view
+CONTRIBUTOR = 'contributor'
+# author of the object
+AUTHOR = 'author'
+# user assigned to the issue
+ASSIGNEE = 'assignee'
+# the object is the user of the request
+SELF = 'self'
+# author of the project of the view
+PROJECT_AUTHOR = 'project_author'
+
+# any attribute can be changed
+ALL = None
+
+
+class Roles:
+    """ the roles of the user of the request on an object, or on the project of the view."""
+
+    def __init__(self, request, obj=None, project_id=None):
+        self.request = request
+        self.user = request.user
+        self.obj = obj
+        self.project_id = project_id
+        self.resolved = {}
+
+    def __contains__(self, role):
+        if role not in self.resolved:
+            self.resolved[role] = getattr(self, f'is_{role}')()
+        return self.resolved[role]
+
+    def is_anyone(self):
+        return True
+
+    def is_authenticated(self):
+        return self.user.is_authenticated
+
+    def is_staff(self):
+        return self.user.is_staff
+
+    def is_author(self):
+        return self.user.is_authenticated and getattr(self.obj, 'author_id', None) == self.user.id
+
+    def is_assignee(self):
+        return self.user.is_authenticated and getattr(self.obj, 'assign_to_id', None) == self.user.id
+
+    def is_self(self):
+        return self.user.is_authenticated and self.obj.pk == self.user.pk
+
+    def is_contributor(self):
+        annotated = getattr(self.obj, 'is_contributor', None)
+        if annotated is not None:
+            return annotated
+        return is_contributor(self.request, self.project_id)
+
+    def is_project_author(self):
+        return Project.objects.filter(id=self.project_id, author_id=self.user.id).exists()
+
+
+def allowed(rule, roles, attributes=()):
+    """ check if one of the roles of the rule allow the user to change the attributes."""
+    if isinstance(rule, dict):
+        return any(role in roles and (changeable is ALL or set(attributes) <= set(changeable))
+                   for role, changeable in rule.items())
+    return any(role in roles for role in rule)
@@ -0,0 +1,244 @@
+"""
+Full-text search over the issues and comments.
+
+The backend is chosen with the SEARCH_BACKEND setting, it's kept in sync
+by the Issue and Comment signals (see signals.py).
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, Value, F, CharField
+from django.utils.module_loading import import_string
+
+from issue.models import Issue, Comment
+
+
+class SearchBackend:
+    """
+    Interface of the search backends.
+
+    a hit is a dict with: type ('issue' or 'comment'), id, project_id, issue_id, title, snippet.
+    """
+
+    def index_issues(self, issues, created=False):
+        """ add or replace the issues in the index (created: not indexed yet)."""
+        raise NotImplementedError
+
+    def index_comments(self, comments, created=False):
+        """ add or replace the comments in the index (created: not indexed yet)."""
+        raise NotImplementedError
+
+    def remove_issue(self, issue_id):
+        """ remove the issue and its comments from the index."""
+        raise NotImplementedError
+
+    def remove_comment(self, comment_id):
+        raise NotImplementedError
+
+    def remove_project(self, project_id):
+        """ remove all the issues and comments of the project from the index."""
+        raise NotImplementedError
+
+    def rebuild(self):
+        """ index again all the issues and comments."""
+        raise NotImplementedError
+
+    def count(self, query, project_ids):
+        raise NotImplementedError
+
+    def search(self, query, project_ids, offset, limit):
+        """ return the hits of the projects ordered by relevance."""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    Inverted index in a FTS5 virtual table of the sqlite database
+    (created by the api migrations), ranked with bm25.
+    """
+
+    table = 'api_search_index'
+
+    def match(self, query):
+        # each word is quoted, so the FTS5 syntax in the user query is ignored
+        words = query.split()
+        return ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+
+    columns = '(type, object_id, project_id, issue_id, issue_title, title, body)'
+
+    def insert(self, rows, created=False):
+        with connection.cursor() as cursor:
+            if not created:
+                cursor.executemany(
+                    f'DELETE FROM {self.table} WHERE type = %s AND object_id = %s',
+                    [(row[0], row[1]) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} {self.columns} VALUES (%s, %s, %s, %s, %s, %s, %s)', rows)
+
+    def index_issues(self, issues, created=False):
+        self.insert([('issue', issue.id, issue.project_id, issue.id, issue.title, issue.title,
+                      issue.description) for issue in issues], created)
+        if not created:
+            # the comments are shown with the title of their issue
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"UPDATE {self.table} SET issue_title = %s WHERE type = 'comment' AND issue_id = %s",
+                    [(issue.title, issue.id) for issue in issues])
+
+    def index_comments(self, comments, created=False):
+        if not created:
+            # only the text of a comment change, its issue and project are already indexed
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"UPDATE {self.table} SET body = %s WHERE type = 'comment' AND object_id = %s",
+                    [(comment.description, comment.id) for comment in comments])
+            return
+        # the issue title is only stored to be displayed, a comment is found by its text
+        self.insert([('comment', comment.id, comment.get_project_id(), comment.issue_id,
+                      comment.issue.title, '', comment.description) for comment in comments], created)
+
+    def delete(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE {where}', params)
+
+    def remove_issue(self, issue_id):
+        self.delete('issue_id = %s', [issue_id])
+
+    def remove_comment(self, comment_id):
+        self.delete("type = 'comment' AND object_id = %s", [comment_id])
+
+    def remove_project(self, project_id):
+        self.delete('project_id = %s', [project_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} {self.columns} '
+                + "SELECT 'issue', id, project_id, id, title, title, description FROM issue_issue")
+            cursor.execute(
+                f'INSERT INTO {self.table} {self.columns} '
+                + "SELECT 'comment', c.id, i.project_id, i.id, i.title, '', c.description "
+                + 'FROM issue_comment c JOIN issue_issue i ON c.issue_id = i.id')
+
+    def where(self, query, project_ids):
+        placeholders = ', '.join(['%s'] * len(project_ids))
+        return (f'{self.table} MATCH %s AND project_id IN ({placeholders})',
+                [self.match(query), *project_ids])
+
+    def count(self, query, project_ids):
+        if not project_ids or not query.split():
+            return 0
+        where, params = self.where(query, project_ids)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {self.table} WHERE {where}', params)
+            return cursor.fetchone()[0]
+
+    def search(self, query, project_ids, offset, limit):
+        if not project_ids or not query.split():
+            return []
+        where, params = self.where(query, project_ids)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT type, object_id, project_id, issue_id, issue_title, '
+                + f"snippet({self.table}, 1, '[', ']', '...', 16) FROM {self.table} "
+                # a word in the title weighs more than in the text
+                + f'WHERE {where} ORDER BY bm25({self.table}, 10.0, 1.0) LIMIT %s OFFSET %s',
+                [*params, limit, offset])
+            columns = ['type', 'id', 'project_id', 'issue_id', 'title', 'snippet']
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """
+    Search with icontains on the issue and comment tables, for the databases without FTS.
+    nothing to index, the results are not ranked (issues first, then comments).
+    """
+
+    def index_issues(self, issues, created=False):
+        pass
+
+    def index_comments(self, comments, created=False):
+        pass
+
+    def remove_issue(self, issue_id):
+        pass
+
+    def remove_comment(self, comment_id):
+        pass
+
+    def remove_project(self, project_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def queryset(self, query, project_ids):
+        issue_filter = Q()
+        comment_filter = Q()
+        for word in query.split():
+            issue_filter &= Q(title__icontains=word) | Q(description__icontains=word)
+            comment_filter &= Q(description__icontains=word)
+
+        # same columns names in both querysets for the union
+        issues = Issue.objects.filter(issue_filter, project_id__in=project_ids).annotate(
+            hit_type=Value('issue', output_field=CharField()),
+            hit_id=F('id'),
+            hit_project=F('project_id'),
+            hit_issue=F('id'),
+            hit_title=F('title'),
+            hit_text=F('description'),
+        )
+        comments = Comment.objects.filter(comment_filter, issue__project_id__in=project_ids).annotate(
+            hit_type=Value('comment', output_field=CharField()),
+            hit_id=F('id'),
+            hit_project=F('issue__project_id'),
+            hit_issue=F('issue_id'),
+            hit_title=F('issue__title'),
+            hit_text=F('description'),
+        )
+        columns = ['hit_type', 'hit_id', 'hit_project', 'hit_issue', 'hit_title', 'hit_text']
+        # no default ordering in the parts of the union
+        return issues.order_by().values_list(*columns).union(
+            comments.order_by().values_list(*columns), all=True).order_by('-hit_type', 'hit_id')
+
+    def count(self, query, project_ids):
+        if not project_ids or not query.split():
+            return 0
+        return self.queryset(query, project_ids).count()
+
+    def search(self, query, project_ids, offset, limit):
+        if not project_ids or not query.split():
+            return []
+        columns = ['type', 'id', 'project_id', 'issue_id', 'title', 'snippet']
+        rows = self.queryset(query, project_ids)[offset:offset + limit]
+        return [dict(zip(columns, row)) for row in rows]
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    return import_string(getattr(settings, 'SEARCH_BACKEND', 'api.search.SQLiteFTSBackend'))()
+
+
+class SearchResults:
+    """
+    Lazy results of a search, sliced by the paginator (count, then one page).
+    """
+
+    def __init__(self, query, project_ids):
+        self.query = query
+        self.project_ids = list(project_ids)
+        self.backend = get_search_backend()
+
+    def count(self):
+        return self.backend.count(self.query, self.project_ids)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.backend.search(
+                self.query, self.project_ids, index.start or 0, index.stop - (index.start or 0))
+        return self.backend.search(self.query, self.project_ids, index, 1)[0]
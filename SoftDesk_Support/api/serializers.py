@@ -1,29 +1,39 @@
-from django.core.exceptions import ObjectDoesNotExist
+from django.conf import settings
+from django.db import transaction
+from django.shortcuts import get_object_or_404
 from rest_framework import serializers
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
 
 from accounts.models import CustomUser
 from project.models import Project, Contributor
 from issue.models import Issue, Comment
+from .membership import get_assignable_users, find_assignable_user, format_user_list
+from .search import get_search_backend
+from .cache import invalidate_project_responses
+from .changes import record_changes
 
 
-class CustomSlugRelatedField(serializers.SlugRelatedField):
+class AssignableUserField(serializers.SlugRelatedField):
     """
-        CustomSlug relatedField that return a list of available user with the error
+        assign_to field that only accept the contributors of the project (username or ID),
+        and return a list of available user with the error.
+        the contributors are only loaded when a value is written, once per project for the request.
     """
 
-    def to_internal_value(self, data):
-        try:
-            value = self.get_queryset().get(**{self.slug_field: data})
-            return value
-        except ObjectDoesNotExist:
-            available_users = self.get_queryset().values_list('id', 'username')
-            user_list = ', '.join(
-                [f'{username} (ID: {id})' for id, username in available_users])
+    def get_queryset(self):
+        return CustomUser.objects.filter(
+            contributor__project_id=self.context.get('project'))
 
+    def to_internal_value(self, data):
+        users = get_assignable_users(
+            self.context['request'], self.context['project'])
+        user = find_assignable_user(users, data)
+        if user is None:
             raise serializers.ValidationError(
-                f"L'utilisateur {
-                    data} n'existe pas. Les choix disponible sont : {user_list}"
+                f"L'utilisateur {data} n'existe pas. "
+                + f"Les choix disponible sont : {format_user_list(users)}"
             )
+        return user
 
 
 class ChoiceFieldWithCustomErrorMessage(serializers.ChoiceField):
@@ -38,6 +48,70 @@ class ChoiceFieldWithCustomErrorMessage(serializers.ChoiceField):
                 f" '{data}' n'est pas un choix valide. Les choix disponible sont : {choices}")
 
 
+def user_summary(user):
+    """ embedded user (?expand=author), without the personal data of UserSerializer."""
+    return None if user is None else {'id': user.id, 'username': user.username}
+
+
+class ValuesSerializer:
+    """
+    Read-only serializer of the rows of a values() queryset, for the list views.
+
+    field_columns is the dict of the output fields -> their values() column, in
+    the order of the model serializer, columns the list of all the columns.
+    the date_fields and datetime_fields are formatted like the model serializer.
+    to_representation build the dict of a row without model instance nor
+    serializer fields. the output must be the same as the model serializer of
+    the view (see the parity tests).
+    only limit the output to some fields (?fields=), get_columns give their columns.
+    """
+
+    field_columns = {}
+    columns = []
+    date_fields = []
+    datetime_fields = []
+    date_field = serializers.DateField()
+    datetime_field = serializers.DateTimeField()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.columns = list(cls.field_columns.values())
+
+    def __init__(self, instance=None, many=False, context=None, only=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        # (field, column, format) of the fields of the output
+        self.renderers = [
+            (name, column, self.date if name in self.date_fields
+             else self.datetime if name in self.datetime_fields else None)
+            for name, column in self.field_columns.items() if only is None or name in only]
+
+    @classmethod
+    def get_columns(cls, only=None):
+        """ the columns of the fields, and the primary key (the position of the keyset pagination)."""
+        if only is None:
+            return cls.columns
+        return list(dict.fromkeys(
+            ['pk'] + [column for name, column in cls.field_columns.items() if name in only]))
+
+    def date(self, value):
+        return None if value is None else self.date_field.to_representation(value)
+
+    def datetime(self, value):
+        return None if value is None else self.datetime_field.to_representation(value)
+
+    def to_representation(self, row):
+        return {name: row[column] if format is None else format(row[column])
+                for name, column, format in self.renderers}
+
+    @property
+    def data(self):
+        if self.many:
+            return ReturnList([self.to_representation(row) for row in self.instance], serializer=self)
+        return ReturnDict(self.to_representation(self.instance), serializer=self)
+
+
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer for the CustomUser model.
@@ -72,12 +146,17 @@ class UserSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         request = self.context.get('request')
+        # only the fields of the serializer (?fields=), can_data_be_shared
+        # isn't loaded without the age or email
+        private = [field for field in ('age', 'email') if field in self.fields]
+        if not private:
+            return representation
         if instance.can_data_be_shared or request.user == instance or request.user.is_staff:
-            representation['age'] = instance.age
-            representation['email'] = instance.email
+            for field in private:
+                representation[field] = getattr(instance, field)
         else:
-            representation.pop('age', None)
-            representation.pop('email', None)
+            for field in private:
+                representation.pop(field, None)
         return representation
 
     def validate(self, data):
@@ -135,6 +214,33 @@ class ContributorSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class ContributorValuesSerializer(ValuesSerializer):
+    """ ContributorSerializer output from values() rows."""
+
+    field_columns = {
+        'id': 'pk',
+        'user': 'user__username',
+        'project': 'project__name',
+        'created_time': 'created_time',
+    }
+    date_fields = ['created_time']
+
+
+class ContributorBulkSerializer(serializers.Serializer):
+    """
+    Serializer for the add or removal of many contributors at once.
+
+    Fields:
+    - users: The usernames or IDs of the users.
+    """
+
+    users = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_SIZE,
+    )
+
+
 class ProjectSerializer(serializers.ModelSerializer):
     """
     Serializer for the Project model.
@@ -147,6 +253,14 @@ class ProjectSerializer(serializers.ModelSerializer):
     - description: The description of the project.
     - type: The type of the project.
     - created_time: The time the project was created.
+    - issue_count: The number of issues of the project.
+    - todo_count, in_progress_count, finished_count: The number of issues by statue.
+    - contributor_count: The number of contributors of the project.
+    - last_activity: The last time an issue, comment or contributor changed.
+
+    Expand (context 'expand'):
+    - author: the id and username of the author.
+    - contributors: the contributors, also in the list.
 
     Validation:
     - create: use the authenticated user to set the author.
@@ -155,6 +269,8 @@ class ProjectSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField()
     contributors = ContributorSerializer(many=True, read_only=True)
     type = ChoiceFieldWithCustomErrorMessage(choices=Project.TYPE_CHOICES)
+    # only rendered by the detail view (or expanded)
+    detail_fields = ['contributors']
 
     class Meta:
         model = Project
@@ -166,15 +282,24 @@ class ProjectSerializer(serializers.ModelSerializer):
             'description',
             'type',
             'created_time',
+            'issue_count',
+            'todo_count',
+            'in_progress_count',
+            'finished_count',
+            'contributor_count',
+            'last_activity',
         ]
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        if self.context.get('detail_view'):
+        expand = self.context.get('expand', ())
+        if (self.context.get('detail_view') and 'contributors' in self.fields) or 'contributors' in expand:
             representation['contributors'] = ContributorSerializer(
                 instance.contributor_set.all(), many=True).data
         else:
             representation.pop('contributors', None)
+        if 'author' in expand:
+            representation['author'] = user_summary(instance.author)
         return representation
 
     def create(self, validated_data):
@@ -183,6 +308,51 @@ class ProjectSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class ProjectValuesSerializer(ValuesSerializer):
+    """ ProjectSerializer output of the project list (without the contributors)."""
+
+    field_columns = {
+        'id': 'pk',
+        'author': 'author__username',
+        'name': 'name',
+        'description': 'description',
+        'type': 'type',
+        'created_time': 'created_time',
+        'issue_count': 'issue_count',
+        'todo_count': 'todo_count',
+        'in_progress_count': 'in_progress_count',
+        'finished_count': 'finished_count',
+        'contributor_count': 'contributor_count',
+        'last_activity': 'last_activity',
+    }
+    date_fields = ['created_time']
+    datetime_fields = ['last_activity']
+
+
+class IssueListSerializer(serializers.ListSerializer):
+    """
+    List serializer used to create many issues at once.
+
+    Validation:
+    - create: insert all the issues with a single query, with the authenticated
+    user as author and the project of the view.
+    """
+
+    def create(self, validated_data):
+        author = self.context['request'].user
+        project = Project.objects.get(
+            pk=self.context['view'].kwargs['project_pk'])
+        with transaction.atomic(savepoint=False):
+            issues = Issue.objects.bulk_create(
+                [Issue(author=author, project=project, **item) for item in validated_data])
+            # bulk_create doesn't call Issue.save nor send the post_save signal
+            Project.update_counters(project.id, **Issue.counter_deltas(issues))
+            get_search_backend().index_issues(issues, created=True)
+            record_changes(issues, 'created')
+        invalidate_project_responses(project.id)
+        return issues
+
+
 class IssueSerializer(serializers.ModelSerializer):
     """
     Serializer for the Issue model.
@@ -199,14 +369,18 @@ class IssueSerializer(serializers.ModelSerializer):
     - tag: The tag of the issue.
     - created_time: The time the issue was created.
 
+    Expand (context 'expand'):
+    - author, assign_to: the id and username of the user.
+    - comments: the comments of the issue.
+    - contributors: the contributors of the project.
+
     Validation:
     - create: use the authenticate user and get the project from the view 
     to set the author and project of the issue
     """
 
     author = serializers.StringRelatedField()
-    assign_to = CustomSlugRelatedField(
-        queryset=CustomUser.objects.none(),
+    assign_to = AssignableUserField(
         slug_field='username',
         required=False,
         allow_null=True,
@@ -216,9 +390,12 @@ class IssueSerializer(serializers.ModelSerializer):
     priority = ChoiceFieldWithCustomErrorMessage(
         choices=Issue.PRIORITY_CHOICES)
     tag = ChoiceFieldWithCustomErrorMessage(choices=Issue.TAG_CHOICES)
+    # only rendered by the detail view
+    detail_fields = ['project']
 
     class Meta:
         model = Issue
+        list_serializer_class = IssueListSerializer
         fields = [
             'id',
             'author',
@@ -235,18 +412,19 @@ class IssueSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         if not self.context.get('detail_view'):
-            representation.pop('project', None)
+            for field in self.detail_fields:
+                representation.pop(field, None)
+        expand = self.context.get('expand', ())
+        for field in ('author', 'assign_to'):
+            if field in expand:
+                representation[field] = user_summary(getattr(instance, field))
+        if 'comments' in expand:
+            representation['comments'] = CommentSerializer(instance.comment_set.all(), many=True).data
+        if 'contributors' in expand:
+            representation['contributors'] = ContributorSerializer(
+                instance.project.contributor_set.all(), many=True).data
         return representation
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        if 'context' in kwargs:
-            project_id = kwargs['context'].get('project')
-            self.fields['assign_to'].queryset = CustomUser.objects.filter(
-                id__in=Contributor.objects.filter(
-                    project=project_id).values_list('user', flat=True)
-            )
-
     def create(self, validated_data):
         # Get the current authenticated user and project, then set them to their respective field.
         validated_data['author'] = self.context['request'].user
@@ -255,6 +433,59 @@ class IssueSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class IssueValuesSerializer(ValuesSerializer):
+    """ IssueSerializer output of the issue list (without the project)."""
+
+    field_columns = {
+        'id': 'pk',
+        'author': 'author__username',
+        'assign_to': 'assign_to__username',
+        'title': 'title',
+        'description': 'description',
+        'statue': 'statue',
+        'priority': 'priority',
+        'tag': 'tag',
+        'created_time': 'created_time',
+    }
+    date_fields = ['created_time']
+
+
+class IssueBulkUpdateSerializer(serializers.Serializer):
+    """
+    Serializer for the update of many issues at once.
+
+    Fields:
+    - ids: The IDs of the issues to update.
+    - assign_to: The user assigned to the issues.
+    - statue: The status of the issues.
+    - priority: The priority of the issues.
+
+    Validation:
+    - validate: Ensures at least one field to update is given.
+    """
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_SIZE,
+    )
+    assign_to = AssignableUserField(
+        slug_field='username',
+        required=False,
+        allow_null=True,
+    )
+    statue = ChoiceFieldWithCustomErrorMessage(
+        choices=Issue.STATUE_CHOICES, required=False)
+    priority = ChoiceFieldWithCustomErrorMessage(
+        choices=Issue.PRIORITY_CHOICES, required=False)
+
+    def validate(self, data):
+        if len(data) == 1:
+            raise serializers.ValidationError(
+                "aucun champ à modifier. Les choix disponible sont : assign_to, statue, priority")
+        return data
+
+
 class CommentSerializer(serializers.ModelSerializer):
     """
     Serializer for the Comment model.
@@ -274,6 +505,8 @@ class CommentSerializer(serializers.ModelSerializer):
 
     author = serializers.StringRelatedField()
     issue = serializers.SlugRelatedField(slug_field='title', read_only=True)
+    # only rendered by the detail view
+    detail_fields = ['issue', 'uuid']
 
     class Meta:
         model = Comment
@@ -289,13 +522,27 @@ class CommentSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         if not self.context.get('detail_view'):
-            representation.pop('issue', None)
-            representation.pop('uuid', None)
+            for field in self.detail_fields:
+                representation.pop(field, None)
         return representation
 
     def create(self, validated_data):
         # Get the current authenticated user and issue, then set them to their respective field.
         validated_data['author'] = self.context['request'].user
-        validated_data['issue'] = Issue.objects.get(
-            pk=self.context['view'].kwargs['issue_pk'])
+        kwargs = self.context['view'].kwargs
+        # an issue of the project of the url (checked by the permissions)
+        validated_data['issue'] = get_object_or_404(
+            Issue, pk=kwargs['issue_pk'], project_id=kwargs['project_pk'])
         return super().create(validated_data)
+
+
+class CommentValuesSerializer(ValuesSerializer):
+    """ CommentSerializer output of the comment list (without the issue and uuid)."""
+
+    field_columns = {
+        'id': 'pk',
+        'author': 'author__username',
+        'description': 'description',
+        'created_time': 'created_time',
+    }
+    date_fields = ['created_time']
@@ -0,0 +1,165 @@
+from django.db.models import Q
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from accounts.models import CustomUser
+from project.models import Project, Contributor
+from issue.models import Issue, Comment
+from .membership import invalidate_membership
+from .authentication import invalidate_user
+from .search import get_search_backend
+from .cache import invalidate_project_responses
+from .changes import record_changes
+
+
+def deleted_with(origin, *models):
+    """ check if the deletion come from the deletion of one of the models (instance or queryset)."""
+    return isinstance(origin, models) or getattr(origin, 'model', None) in models
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    # deactivated, password or staff flag changed: the next requests read the user again
+    invalidate_user(instance.id)
+
+
+def user_project_ids(user_id):
+    """ the IDs of the projects whose responses show the username of the user."""
+    return set(Contributor.objects.filter(user_id=user_id).order_by().values_list('project_id', flat=True).union(
+        Issue.objects.filter(Q(author_id=user_id) | Q(assign_to_id=user_id)).order_by().values_list('project_id'),
+        Comment.objects.filter(author_id=user_id).order_by().values_list('issue__project_id'),
+    ))
+
+
+def touch_user_projects(project_ids):
+    """ new version of the projects that show a username, their cached responses are dropped."""
+    Project.touch(project_ids)
+    for project_id in project_ids:
+        invalidate_project_responses(project_id)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # a new username: new version of his projects (ETag, cached responses), not for a login
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    if instance.username != getattr(instance, '_loaded_username', None):
+        touch_user_projects(user_project_ids(instance.id))
+    instance._loaded_username = instance.username
+
+
+@receiver(pre_delete, sender=CustomUser)
+def user_deleting(sender, instance, **kwargs):
+    # his assigned issues and comments are SET_NULL by an update, without signal
+    instance._project_ids = user_project_ids(instance.id)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    touch_user_projects(instance._project_ids)
+
+
+@receiver([post_save, post_delete], sender=Contributor)
+def contributor_changed(sender, instance, **kwargs):
+    # the user membership changed, drop his cached project IDs
+    invalidate_membership(instance.user_id)
+
+
+@receiver(post_delete, sender=Contributor)
+def contributor_deleted(sender, instance, origin=None, **kwargs):
+    # post_delete is sent inside the delete transaction
+    if not deleted_with(origin, Project):
+        Project.update_counters(instance.project_id, contributor_count=-1)
+
+
+@receiver(post_delete, sender=Issue)
+def issue_deleted(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Project):
+        Project.update_counters(
+            instance.project_id, **Issue.counter_deltas([instance], sign=-1))
+
+
+def text_changed(instance, created, update_fields, fields):
+    """ check if the save wrote a new value of the indexed fields (see LoadedValuesMixin)."""
+    if created:
+        return True
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return False
+    return instance.has_changed(*fields)
+
+
+@receiver(post_save, sender=Issue)
+def issue_saved(sender, instance, created, update_fields=None, **kwargs):
+    if text_changed(instance, created, update_fields, ['title', 'description']):
+        get_search_backend().index_issues([instance], created)
+
+
+@receiver(post_delete, sender=Issue)
+def issue_removed_from_search(sender, instance, origin=None, **kwargs):
+    # the issue comments are removed with it
+    if not deleted_with(origin, Project):
+        get_search_backend().remove_issue(instance.id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, update_fields=None, **kwargs):
+    if text_changed(instance, created, update_fields, ['description']):
+        get_search_backend().index_comments([instance], created)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Project, Issue):
+        get_search_backend().remove_comment(instance.id)
+        # a new version of the project for the conditional requests
+        Project.update_counters(instance.issue.project_id)
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted(sender, instance, **kwargs):
+    get_search_backend().remove_project(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Project)
+def project_changed(sender, instance, **kwargs):
+    invalidate_project_responses(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Contributor)
+@receiver([post_save, post_delete], sender=Issue)
+def project_resource_changed(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Project):
+        invalidate_project_responses(instance.project_id)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Project, Issue):
+        invalidate_project_responses(instance.issue.project_id)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Contributor)
+@receiver(post_save, sender=Issue)
+@receiver(post_save, sender=Comment)
+def record_saved(sender, instance, created, **kwargs):
+    record_changes([instance], 'created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Contributor)
+def record_deleted(sender, instance, **kwargs):
+    # the contributors removed with their project are kept, their users see the removal
+    record_changes([instance], 'deleted')
+
+
+@receiver(post_delete, sender=Issue)
+def record_issue_deleted(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Project):
+        record_changes([instance], 'deleted')
+
+
+@receiver(post_delete, sender=Comment)
+def record_comment_deleted(sender, instance, origin=None, **kwargs):
+    if not deleted_with(origin, Project, Issue):
+        record_changes([instance], 'deleted')
@@ -1,3 +1,1627 @@
-from django.test import TestCase
+import asyncio
+import csv
+import itertools
+import json
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.test import override_settings
+from django.urls import resolve
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import CustomUser
+from project.models import Project, Contributor
+from issue.models import Issue, Comment
+from .models import Change
+from .pagination import KeysetPagination
+from .search import get_search_backend
+from .cache import get_response_cache, LRUResponseCache, SharedResponseCache
+from .events import LocalEventBroker, ChangeLogEventBroker, get_event_broker
+from .authentication import JWTAuthentication, user_cache_key
+from .membership import annotate_is_contributor, is_contributor
+from .hashers import hashing_slot
+from .benchmark import read_views
+from .views import ProjectViewSet, IssueViewSet, CommentViewSet
+from .serializers import IssueSerializer
+from .permissions import (
+    CustomUserPermissions,
+    ProjectPermissions,
+    ContributorPermissions,
+    IssuePermissions,
+    CommentPermissions,
+)
+
+
+PAGE_SIZE = settings.REST_FRAMEWORK['PAGE_SIZE']
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ApiTestCase(APITestCase):
+    """
+    Base test case with an author, a project, an issue and a comment.
+    """
+
+    def setUp(self):
+        # the ids and versions are reused by the next tests,
+        # and the login throttles count the logins of all the tests
+        get_response_cache().clear()
+        cache.clear()
+        self.author = self.create_user('author')
+        self.project = Project.objects.create(
+            author=self.author, name='Projet', description='description', type='Back-end')
+        self.issue = self.create_issue()
+        self.comment = self.create_comment()
+        self.client.force_authenticate(self.author)
+
+    def create_user(self, username, **kwargs):
+        kwargs.setdefault('age', 20)
+        return CustomUser.objects.create_user(username=username, password='password', **kwargs)
+
+    def create_issue(self, **kwargs):
+        kwargs.setdefault('author', self.author)
+        kwargs.setdefault('assign_to', self.author)
+        kwargs.setdefault('project', self.project)
+        kwargs.setdefault('title', 'ticket')
+        kwargs.setdefault('description', 'description')
+        kwargs.setdefault('statue', 'Todo')
+        kwargs.setdefault('priority', 'Low')
+        kwargs.setdefault('tag', 'Bug')
+        return Issue.objects.create(**kwargs)
+
+    def create_comment(self, **kwargs):
+        kwargs.setdefault('author', self.author)
+        kwargs.setdefault('issue', self.issue)
+        kwargs.setdefault('description', 'commentaire')
+        return Comment.objects.create(**kwargs)
+
+    def create_contributor(self, project=None):
+        user = self.create_user(f'user{CustomUser.objects.count()}')
+        return Contributor.objects.create(user=user, project=project or self.project)
+
+    @property
+    def project_url(self):
+        return f'/api/projects/{self.project.id}/'
+
+    @property
+    def issue_url(self):
+        return f'{self.project_url}issues/{self.issue.id}/'
+
+
+class QueryCountTests(ApiTestCase):
+    """
+    Each endpoint must run the same number of queries whatever
+    the number of rows on the page.
+    the project, contributor, issue and comment endpoints read the project version for the ETag.
+    """
+
+    def assertConstantQueries(self, num, url, add_row):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        for _ in range(PAGE_SIZE):
+            add_row()
+
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_list(self):
+        self.assertConstantQueries(
+            2, '/api/users/', lambda: self.create_user(f'user{CustomUser.objects.count()}'))
+
+    def test_project_list(self):
+        self.assertConstantQueries(
+            3, '/api/projects/',
+            lambda: Contributor.objects.create(user=self.author, project=Project.objects.create(
+                author=self.create_user(f'user{CustomUser.objects.count()}'),
+                name='Projet', description='description', type='iOS')))
+
+    def test_project_detail(self):
+        self.assertConstantQueries(5, self.project_url, self.create_contributor)
+
+    def test_contributor_list(self):
+        # membership, version, count and page
+        self.assertConstantQueries(
+            4, f'{self.project_url}contributors/', self.create_contributor)
+
+    def test_issue_list(self):
+        self.assertConstantQueries(
+            4, f'{self.project_url}issues/',
+            lambda: self.create_issue(assign_to=self.create_contributor().user))
+
+    def test_issue_detail(self):
+        self.assertConstantQueries(3, self.issue_url, self.create_comment)
+
+    def test_comment_list(self):
+        self.assertConstantQueries(
+            4, f'{self.issue_url}comments/',
+            lambda: self.create_comment(author=self.create_contributor().user))
+
+    def test_comment_detail(self):
+        self.assertConstantQueries(
+            3, f'{self.issue_url}comments/{self.comment.id}/', self.create_comment)
+
+    def add_comment_and_contributor(self):
+        self.create_comment(author=self.create_contributor().user)
+
+    def test_expanded_issue_list(self):
+        # comments and contributors prefetched
+        self.assertConstantQueries(
+            6, f'{self.project_url}issues/?expand=author,assign_to,comments,contributors',
+            lambda: self.create_issue(assign_to=self.create_contributor().user))
+
+    def test_expanded_issue_detail(self):
+        self.assertConstantQueries(
+            5, f'{self.issue_url}?expand=comments,contributors', self.add_comment_and_contributor)
+
+    def test_expanded_project_list(self):
+        self.assertConstantQueries(
+            5, '/api/projects/?expand=author,contributors',
+            lambda: Project.objects.create(
+                author=self.author, name='Projet', description='description', type='iOS'))
+
+
+class KeysetPaginationTests(ApiTestCase):
+
+    def test_page_number_by_default(self):
+        response = self.client.get(f'{self.project_url}issues/')
+        self.assertIn('count', response.data)
+
+    def test_cursor_without_count_query(self):
+        for _ in range(PAGE_SIZE):
+            self.create_issue()
+        url = f'{self.project_url}issues/?pagination=cursor'
+
+        # membership, project version and page, no COUNT(*)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), PAGE_SIZE)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_page_size_is_capped(self):
+        for _ in range(3):
+            self.create_comment()
+        url = f'{self.issue_url}comments/?pagination=cursor'
+
+        response = self.client.get(f'{url}&page_size=2')
+        self.assertEqual(len(response.data['results']), 2)
+
+        with mock.patch.object(KeysetPagination, 'max_page_size', 3):
+            response = self.client.get(f'{url}&page_size=1000')
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class AssignToTests(ApiTestCase):
+
+    def test_assign_by_username_or_id(self):
+        user = self.create_contributor().user
+
+        response = self.client.patch(self.issue_url, {'assign_to': user.username})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assign_to'], user.username)
+
+        response = self.client.patch(self.issue_url, {'assign_to': str(self.author.id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assign_to'], self.author.username)
+
+    def test_only_contributors_can_be_assigned(self):
+        outsider = self.create_user('outsider')
+        response = self.client.patch(self.issue_url, {'assign_to': outsider.username})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'{self.author.username} (ID: {self.author.id})', response.data['error'])
+
+        response = self.client.post(f'{self.project_url}issues/', {
+            'title': 'ticket', 'description': 'description', 'statue': 'Todo',
+            'priority': 'Low', 'tag': 'Bug', 'assign_to': outsider.username})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('assign_to', response.data)
+
+    def test_contributors_loaded_once_per_request(self):
+        user = self.create_contributor().user
+        # contributors (also the membership), issue,
+        # then save, change log and project activity,
+        # the search index is kept (same title and description)
+        with self.assertNumQueries(5):
+            self.client.patch(self.issue_url, {'assign_to': user.username})
+
+
+class CommentWriteTests(ApiTestCase):
+
+    def test_comment_update_does_not_load_its_issue(self):
+        # membership, comment (with the project of its issue),
+        # then save, change log, project activity and search index
+        with self.assertNumQueries(6):
+            response = self.client.patch(
+                f'{self.issue_url}comments/{self.comment.id}/', {'description': 'modifié'})
+        self.assertEqual(response.status_code, 200)
+
+
+class IssueBulkTests(ApiTestCase):
+
+    def issue_data(self, **kwargs):
+        data = {'title': 'ticket', 'description': 'description',
+                'statue': 'Todo', 'priority': 'Low', 'tag': 'Bug'}
+        data.update(kwargs)
+        return data
+
+    @property
+    def bulk_url(self):
+        return f'{self.project_url}issues/bulk/'
+
+    def test_bulk_create(self):
+        user = self.create_contributor().user
+        data = [self.issue_data(title=f'ticket {i}', assign_to=user.username) for i in range(10)]
+
+        # contributors (also the membership), project,
+        # then insert, counters, search index and change log
+        with self.assertNumQueries(6):
+            response = self.client.post(self.bulk_url, data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(Issue.objects.filter(project=self.project, assign_to=user).count(), 10)
+
+    def test_bulk_create_is_all_or_nothing(self):
+        data = [self.issue_data(), self.issue_data(statue='Unknown')]
+        response = self.client.post(self.bulk_url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('statue', response.data[1])
+        self.assertEqual(Issue.objects.count(), 1)
+
+    def test_bulk_update(self):
+        other = self.create_contributor().user
+        assigned = self.create_issue(author=other, assign_to=self.author)
+        foreign = self.create_issue(author=other, assign_to=other)
+        ids = [self.issue.id, assigned.id, foreign.id, 999]
+
+        response = self.client.patch(
+            self.bulk_url, {'ids': ids, 'statue': 'Finished'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [self.issue.id, assigned.id])
+        self.assertEqual(set(response.data['errors']), {foreign.id, 999})
+        self.assertEqual(
+            list(Issue.objects.order_by('pk').values_list('statue', flat=True)),
+            ['Finished', 'Finished', 'Todo'])
+
+        # the assigned user can only change the statue
+        response = self.client.patch(
+            self.bulk_url, {'ids': [assigned.id], 'priority': 'High'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_update_needs_a_value(self):
+        response = self.client.patch(self.bulk_url, {'ids': [self.issue.id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ContributorBulkTests(ApiTestCase):
+
+    @property
+    def bulk_url(self):
+        return f'{self.project_url}contributors/bulk/'
+
+    def test_bulk_add(self):
+        users = [self.create_user(f'new{i}') for i in range(5)]
+        values = [user.username for user in users[:3]] + [str(users[3].id), 'unknown']
+
+        # permission, users, project, existing contributors,
+        # then insert, counters and change log (added contributors, insert)
+        with self.assertNumQueries(8):
+            response = self.client.post(self.bulk_url, {'users': values}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['added'], [user.username for user in users[:4]])
+        self.assertEqual(response.data['unknown'], ['unknown'])
+        self.assertEqual(self.project.contributors.count(), 5)
+
+        # already contributors
+        response = self.client.post(self.bulk_url, {'users': values[:2]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['added'], [])
+
+    def test_bulk_remove_keeps_the_author(self):
+        contributors = [self.create_contributor() for _ in range(3)]
+        values = [c.user.username for c in contributors] + [self.author.username]
+
+        response = self.client.delete(self.bulk_url, {'users': values}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['removed']), 3)
+        self.assertEqual(list(self.project.contributors.all()), [self.author])
+
+    def test_bulk_remove_queries(self):
+        for count in [2, 6]:
+            contributors = [self.create_contributor() for _ in range(count)]
+            # permission, users, project, contributors, then delete, counters and change log
+            with self.assertNumQueries(7):
+                response = self.client.delete(
+                    self.bulk_url, {'users': [c.user.username for c in contributors]}, format='json')
+            self.assertEqual(len(response.data['removed']), count)
+        self.assertEqual(list(self.project.contributors.all()), [self.author])
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.contributor_count, 1)
+        self.assertEqual(Change.objects.filter(model='contributor', action='deleted').count(), 8)
+
+    def test_only_the_project_author(self):
+        contributor = self.create_contributor()
+        self.client.force_authenticate(contributor.user)
+        response = self.client.post(self.bulk_url, {'users': ['author']}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class ProjectCounterTests(ApiTestCase):
+
+    def assertCounters(self, **expected):
+        self.project.refresh_from_db()
+        for counter, value in expected.items():
+            self.assertEqual(getattr(self.project, counter), value, counter)
+
+    def test_counters_follow_the_issues(self):
+        self.assertCounters(issue_count=1, todo_count=1, contributor_count=1)
+
+        self.client.patch(self.issue_url, {'statue': 'InProgress'})
+        self.assertCounters(issue_count=1, todo_count=0, in_progress_count=1)
+
+        self.client.post(f'{self.project_url}issues/bulk/', [
+            {'title': 'ticket', 'description': 'description', 'statue': 'Todo',
+             'priority': 'Low', 'tag': 'Bug'}] * 3, format='json')
+        self.assertCounters(issue_count=4, todo_count=3, in_progress_count=1)
+
+        ids = list(self.project.issue_set.values_list('id', flat=True))
+        self.client.patch(f'{self.project_url}issues/bulk/',
+                          {'ids': ids, 'statue': 'Finished'}, format='json')
+        self.assertCounters(issue_count=4, todo_count=0, in_progress_count=0, finished_count=4)
+
+        self.client.delete(self.issue_url)
+        self.assertCounters(issue_count=3, finished_count=3)
+        self.assertIsNotNone(self.project.last_activity)
+
+    def test_concurrent_statue_updates(self):
+        # both loaded as Todo, the issue is only moved once
+        first, second = Issue.objects.get(pk=self.issue.pk), Issue.objects.get(pk=self.issue.pk)
+        first.statue = second.statue = 'Finished'
+        first.save()
+        second.save()
+        self.assertCounters(issue_count=1, todo_count=0, finished_count=1)
+
+        # an unchanged statue isn't written over a concurrent change
+        stale = Issue.objects.get(pk=self.issue.pk)
+        current = Issue.objects.get(pk=self.issue.pk)
+        current.statue = 'InProgress'
+        current.save()
+        stale.title = 'nouveau titre'
+        stale.save()
+        self.issue.refresh_from_db()
+        self.assertEqual((self.issue.statue, self.issue.title), ('InProgress', 'nouveau titre'))
+        self.assertCounters(issue_count=1, finished_count=0, in_progress_count=1)
+
+    def test_counters_follow_the_contributors(self):
+        users = [self.create_user(f'new{i}').username for i in range(3)]
+        self.client.post(f'{self.project_url}contributors/bulk/', {'users': users}, format='json')
+        self.assertCounters(contributor_count=4)
+
+        self.client.delete(f'{self.project_url}contributors/bulk/', {'users': users[:2]}, format='json')
+        self.assertCounters(contributor_count=2)
+
+    def test_project_update_keeps_the_counters(self):
+        self.create_issue()
+        self.client.patch(self.project_url, {'name': 'nouveau nom'})
+        self.assertCounters(name='nouveau nom', issue_count=2)
+
+    def test_rebuild_command(self):
+        Project.objects.update(issue_count=0, todo_count=0, contributor_count=0)
+        call_command('rebuild_project_counters', stdout=StringIO())
+        self.assertCounters(issue_count=1, todo_count=1, contributor_count=1)
+
+        response = self.client.get(self.project_url)
+        self.assertEqual(response.data['issue_count'], 1)
+
+
+class IssueFilterTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_contributor().user
+        self.high = self.create_issue(priority='High', statue='Finished', tag='Feature')
+        self.medium = self.create_issue(priority='Medium', assign_to=self.user)
+        self.unassigned = self.create_issue(assign_to=None, tag='Task')
+
+    def get_ids(self, query):
+        response = self.client.get(f'{self.project_url}issues/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [issue['id'] for issue in response.data['results']]
+
+    def test_choice_filters(self):
+        self.assertEqual(self.get_ids('statue=Finished'), [self.high.id])
+        self.assertEqual(self.get_ids('priority=High,Medium'), [self.high.id, self.medium.id])
+        self.assertEqual(self.get_ids('tag=Task'), [self.unassigned.id])
+        self.assertEqual(self.get_ids('statue=Todo&tag=Bug'), [self.issue.id, self.medium.id])
+
+    def test_assign_to(self):
+        self.assertEqual(self.get_ids(f'assign_to={self.user.username}'), [self.medium.id])
+        self.assertEqual(self.get_ids(f'assign_to={self.user.id}'), [self.medium.id])
+        self.assertEqual(self.get_ids('assign_to=none'), [self.unassigned.id])
+        self.assertEqual(self.get_ids('assign_to=unknown'), [])
+
+    def test_created_time_range(self):
+        Issue.objects.filter(pk=self.high.pk).update(created_time='2024-01-15')
+        self.assertEqual(self.get_ids('created_before=2024-01-31'), [self.high.id])
+        self.assertNotIn(self.high.id, self.get_ids('created_after=2024-02-01'))
+
+    def test_ordering(self):
+        self.assertEqual(self.get_ids('ordering=-priority')[:2], [self.high.id, self.medium.id])
+        self.assertEqual(self.get_ids('ordering=priority')[-2:], [self.medium.id, self.high.id])
+        self.assertEqual(self.get_ids('ordering=-id')[0], self.unassigned.id)
+
+    def test_invalid_values(self):
+        for query in ['statue=Unknown', 'created_after=hier', 'ordering=title']:
+            response = self.client.get(f'{self.project_url}issues/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_cursor_pagination_keeps_the_filters(self):
+        response = self.client.get(f'{self.project_url}issues/?pagination=cursor&statue=Todo')
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class SearchTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.bug = self.create_issue(title='Erreur de connexion', description='la page de connexion plante')
+        self.other = self.create_issue(title='lenteur', description='connexion lente')
+        self.create_comment(issue=self.other, description='toujours lent')
+        other_author = self.create_user('other')
+        self.hidden = Project.objects.create(
+            author=other_author, name='Privé', description='description', type='Back-end')
+        self.create_issue(project=self.hidden, author=other_author, title='connexion privée')
+
+    def search(self, query):
+        response = self.client.get(f'/api/search/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [(hit['type'], hit['id']) for hit in response.data['results']]
+
+    def test_ranked_results_of_the_user_projects(self):
+        self.assertEqual(self.search('q=connexion'), [('issue', self.bug.id), ('issue', self.other.id)])
+        self.assertEqual(self.search('q=lent'), [('comment', self.other.comment_set.get().id)])
+        self.assertEqual(self.search(f'q=connexion&project={self.hidden.id}'), [])
+
+    def test_index_follows_the_changes(self):
+        self.client.patch(f'{self.project_url}issues/{self.other.id}/', {'description': 'délai'})
+        self.assertEqual(self.search('q=connexion'), [('issue', self.bug.id)])
+        self.bug.delete()
+        self.other.delete()
+        self.assertEqual(self.search('q=connexion'), [])
+        self.assertEqual(self.search('q=lent'), [])
+
+    def test_comment_text_follows_the_changes(self):
+        comment = self.other.comment_set.get()
+        self.client.patch(f'{self.project_url}issues/{self.other.id}/comments/{comment.id}/',
+                          {'description': 'résolu'})
+        self.assertEqual(self.search('q=lent'), [])
+        self.assertEqual(self.search('q=résolu'), [('comment', comment.id)])
+
+    def test_unchanged_text_is_not_indexed_again(self):
+        backend = get_search_backend()
+        with mock.patch.object(backend, 'index_issues') as index_issues, \
+                mock.patch.object(backend, 'index_comments') as index_comments:
+            self.client.patch(f'{self.project_url}issues/{self.other.id}/', {'statue': 'Finished'})
+            comment = self.other.comment_set.get()
+            comment.save()
+        index_issues.assert_not_called()
+        index_comments.assert_not_called()
+
+        with mock.patch.object(backend, 'index_issues') as index_issues:
+            self.client.patch(f'{self.project_url}issues/{self.other.id}/', {'title': 'lenteur'})
+            self.client.patch(f'{self.project_url}issues/{self.other.id}/', {'title': 'délai'})
+        index_issues.assert_called_once()
+
+    def test_bulk_created_issues_are_indexed(self):
+        data = [{'title': 'import massif', 'description': 'description', 'statue': 'Todo',
+                 'priority': 'Low', 'tag': 'Bug'}]
+        self.client.post(f'{self.project_url}issues/bulk/', data, format='json')
+        self.assertEqual(len(self.search('q=massif')), 1)
+
+    def test_rebuild_command(self):
+        get_search_backend().remove_project(self.project.id)
+        self.assertEqual(self.search('q=connexion'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('q=connexion')), 2)
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/search/?q=').status_code, 400)
+
+    @override_settings(SEARCH_BACKEND='api.search.DatabaseSearchBackend')
+    def test_database_backend(self):
+        get_search_backend.cache_clear()
+        self.addCleanup(get_search_backend.cache_clear)
+        self.assertEqual(sorted(self.search('q=connexion')), [('issue', self.bug.id), ('issue', self.other.id)])
+
+
+class ConditionalRequestTests(ApiTestCase):
+
+    def get(self, url, **headers):
+        return self.client.get(url, headers=headers)
+
+    def test_not_modified_issue_list(self):
+        url = f'{self.project_url}issues/'
+        etag = self.get(url)['ETag']
+        # membership and project version, no issue query
+        with self.assertNumQueries(2):
+            response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        self.create_comment()
+        response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_the_query(self):
+        url = f'{self.project_url}issues/'
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(f'{url}?statue=Todo', if_none_match=etag).status_code, 200)
+
+    def test_comment_deletion_change_the_etag(self):
+        url = f'{self.issue_url}comments/'
+        etag = self.get(url)['ETag']
+        self.comment.delete()
+        self.assertEqual(self.get(url, if_none_match=etag).status_code, 200)
+
+    def test_if_modified_since(self):
+        response = self.get(self.project_url)
+        self.assertEqual(
+            self.get(self.project_url, if_modified_since=response['Last-Modified']).status_code, 304)
+
+    def test_project_list_follows_the_projects(self):
+        etag = self.get('/api/projects/')['ETag']
+        self.client.patch(self.project_url, {'name': 'Nouveau nom'})
+        self.assertEqual(self.get('/api/projects/', if_none_match=etag).status_code, 200)
+
+    def test_renamed_user_change_the_etag(self):
+        user = self.create_contributor().user
+        self.create_comment(author=user)
+        url = f'{self.issue_url}comments/'
+        etag = self.get(url)['ETag']
+
+        self.author.save(update_fields=['last_login'])
+        self.assertEqual(self.get(url, if_none_match=etag).status_code, 304)
+
+        user.username = 'nouveau'
+        user.save()
+        response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][1]['author'], 'nouveau')
+
+        # no longer a contributor: his comment is SET_NULL without signal
+        Contributor.objects.filter(user=user).delete()
+        etag = self.get(url)['ETag']
+        user.delete()
+        response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['results'][1]['author'])
+
+    def test_project_list_without_last_modified(self):
+        # a deleted project doesn't change the last activity of the others
+        response = self.get('/api/projects/')
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_no_304_without_permission(self):
+        etag = self.get(self.project_url)['ETag']
+        self.client.force_authenticate(self.create_user('other'))
+        self.assertEqual(self.get(self.project_url, if_none_match=etag).status_code, 403)
+        self.assertEqual(self.get(f'{self.project_url}issues/', if_none_match=etag).status_code, 403)
+
+
+class ResponseCacheTests(ApiTestCase):
+
+    def test_cached_issue_list(self):
+        url = f'{self.project_url}issues/'
+        data = self.client.get(url).json()
+        # membership and project version, no issue query nor serialization
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.json(), data)
+
+        self.create_issue(title='nouveau')
+        self.assertEqual(self.client.get(url).json()['count'], 2)
+
+    def test_bulk_changes_invalidate_the_cache(self):
+        url = f'{self.project_url}issues/'
+        self.client.get(url)
+        self.client.patch(f'{url}bulk/', {'ids': [self.issue.id], 'statue': 'Finished'}, format='json')
+        self.assertEqual(self.client.get(url).json()['results'][0]['statue'], 'Finished')
+
+    def test_contributor_list_and_project_detail(self):
+        for url in [f'{self.project_url}contributors/', self.project_url]:
+            self.client.get(url)
+            self.create_contributor()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['contributors']), 3)
+
+    def test_readers_without_permission_are_not_served(self):
+        self.client.get(self.project_url)
+        self.client.force_authenticate(self.create_user('other'))
+        self.assertEqual(self.client.get(self.project_url).status_code, 403)
+
+    def test_comment_of_an_other_project(self):
+        other = Project.objects.create(
+            author=self.create_user('other'), name='Autre', description='description', type='iOS')
+        issue = self.create_issue(project=other, author=other.author, assign_to=None)
+        comment = self.create_comment(issue=issue, author=other.author)
+        url = f'{self.project_url}issues/{issue.id}/comments/{comment.id}/'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(f'{self.project_url}issues/{issue.id}/comments/').data['count'], 0)
+        response = self.client.post(f'{self.project_url}issues/{issue.id}/comments/', {'description': 'intrus'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_detail_checks_the_object_permissions(self):
+        # a staff contributor cache the comment, the comments are only read by their contributors
+        staff = self.create_user('staff', is_staff=True)
+        Contributor.objects.create(user=staff, project=self.project)
+        url = f'{self.issue_url}comments/{self.comment.id}/'
+        self.client.force_authenticate(staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.client.force_authenticate(self.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_renamed_user_invalidate_the_cache(self):
+        self.client.get(self.issue_url)
+        self.author.username = 'nouveau'
+        self.author.save()
+        self.assertEqual(self.client.get(self.issue_url).data['author'], 'nouveau')
+
+    def test_lru_backend(self):
+        cache = LRUResponseCache(max_entries=2)
+        cache.set(1, 'a', 'A')
+        cache.set(2, 'b', 'B')
+        cache.get(1, 'a')
+        cache.set(1, 'c', 'C')
+        # b was the least recently used
+        self.assertIsNone(cache.get(2, 'b'))
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1, 'a'))
+        self.assertIsNone(cache.get(1, 'c'))
+
+    def test_shared_backend(self):
+        cache = SharedResponseCache()
+        cache.set(1, 'a', 'A')
+        cache.set(2, 'a', 'B')
+        self.assertEqual(cache.get(1, 'a'), 'A')
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1, 'a'))
+        self.assertEqual(cache.get(2, 'a'), 'B')
+
+
+class ValuesSerializerParityTests(ApiTestCase):
+    """
+    The list views must give the same response with the values serializers
+    as with the model serializers.
+    """
+
+    def setUp(self):
+        super().setUp()
+        contributor = self.create_contributor().user
+        for statue, priority, tag in [('InProgress', 'High', 'Task'), ('Finished', 'Medium', 'Feature')]:
+            issue = self.create_issue(
+                title=f'ticket {statue}', statue=statue, priority=priority, tag=tag, assign_to=contributor)
+            self.create_comment(issue=issue, author=contributor)
+        self.create_issue(title='sans assignation', assign_to=None, description='')
+        # a comment without author
+        self.create_comment(author=self.create_user('removed')).author.delete()
+        for index in range(PAGE_SIZE):
+            self.create_issue(title=f'ticket {index}', priority='Medium')
+            self.create_comment(description=f'commentaire {index}')
+        Project.objects.create(author=contributor, name='Autre', description='', type='iOS')
+
+    def assertSameResponse(self, viewset, url):
+        with mock.patch.object(viewset, 'values_serializer_class', None):
+            expected = self.client.get(url)
+        get_response_cache().clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertEqual(response.content, expected.content, url)
+
+    def test_project_list(self):
+        for query in ['', '?fields=name,last_activity', '?fields=author,contributor_count']:
+            self.assertSameResponse(ProjectViewSet, f'/api/projects/{query}')
+
+    def test_issue_list(self):
+        url = f'{self.project_url}issues/'
+        for query in ['', '?page=2', '?pagination=cursor', '?ordering=-priority', '?assign_to=none',
+                      '?fields=assign_to,title', '?fields=statue&pagination=cursor&page_size=3']:
+            self.assertSameResponse(IssueViewSet, url + query)
+
+    def test_comment_list(self):
+        url = f'{self.issue_url}comments/'
+        for query in ['', '?page=2', '?pagination=cursor&page_size=3', '?fields=author,created_time']:
+            self.assertSameResponse(CommentViewSet, url + query)
+
+
+class ExportTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_issue(title='sans commentaire', assign_to=None)
+        self.create_comment(description='deuxième, "cité"')
+
+    @property
+    def export_url(self):
+        return f'{self.project_url}issues/export/'
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        response = self.client.get(self.export_url)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        # the stream reads the issues and the comments, whatever the size of the project
+        with self.assertNumQueries(2):
+            lines = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([issue['title'] for issue in lines], ['ticket', 'sans commentaire'])
+        self.assertEqual(
+            [comment['description'] for comment in lines[0]['comments']],
+            ['commentaire', 'deuxième, "cité"'])
+        self.assertEqual(lines[1]['comments'], [])
+
+    def test_csv(self):
+        response = self.client.get(f'{self.export_url}?format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual([row['type'] for row in rows], ['issue', 'comment', 'comment', 'issue'])
+        self.assertEqual(rows[2]['description'], 'deuxième, "cité"')
+        self.assertEqual(rows[3]['assign_to'], '')
+
+    def test_small_chunks(self):
+        with override_settings(EXPORT_CHUNK_SIZE=1):
+            # the rows are read while the response is streamed
+            lines = self.read(self.client.get(self.export_url)).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(len(json.loads(lines[0])['comments']), 2)
+
+    async def test_async_stream_under_asgi(self):
+        headers = {'authorization': f'Bearer {AccessToken.for_user(self.author)}'}
+        for url in (self.export_url, f'{self.export_url}?format=csv'):
+            expected = await sync_to_async(lambda: self.read(self.client.get(url)))()
+            response = await self.async_client.get(url, headers=headers)
+            # sent while the rows are read, not read whole in a thread
+            self.assertTrue(response.is_async)
+            self.assertEqual(b''.join([part async for part in response.streaming_content]).decode(), expected)
+
+    def test_only_the_contributors(self):
+        self.client.force_authenticate(self.create_user('other'))
+        self.assertEqual(self.client.get(self.export_url).status_code, 403)
+        self.assertEqual(self.client.get(f'{self.export_url}?format=csv').status_code, 403)
+
+
+@override_settings(IMPORT_BATCH_SIZE=2)
+class ImportTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = self.create_user('admin', is_staff=True)
+        self.client.force_authenticate(self.admin)
+
+    def records(self):
+        return [
+            {'model': 'user', 'username': 'bob', 'age': 30},
+            {'model': 'user', 'username': 'jeune', 'age': 12},
+            {'model': 'project', 'ref': 'p1', 'author': 'bob', 'name': 'Importé',
+             'description': 'description', 'type': 'iOS', 'contributors': ['author']},
+            {'model': 'issue', 'ref': 'i1', 'project': 'p1', 'author': 'bob', 'assign_to': 'author',
+             'title': 'ticket importé', 'description': '', 'statue': 'InProgress',
+             'priority': 'High', 'tag': 'Task'},
+            {'model': 'issue', 'ref': 'i2', 'project': 'p1', 'author': 'admin', 'title': 'refusé',
+             'statue': 'Todo', 'priority': 'Low', 'tag': 'Bug'},
+            {'model': 'issue', 'project': 'inconnu', 'author': 'bob', 'title': 'orphelin',
+             'statue': 'Todo', 'priority': 'Low', 'tag': 'Bug'},
+            {'model': 'comment', 'issue': 'i1', 'author': 'author', 'description': 'commentaire importé'},
+        ]
+
+    def post(self, lines):
+        return self.client.generic(
+            'POST', '/api/import/', '\n'.join(lines), content_type='application/x-ndjson')
+
+    def test_import(self):
+        response = self.post([json.dumps(record) for record in self.records()] + ['{pas du json'])
+        self.assertEqual(response.status_code, 201)
+        report = response.data
+        self.assertEqual(
+            [report[model] for model in ('lines', 'users', 'projects', 'issues', 'comments')],
+            [8, 1, 1, 1, 1])
+        self.assertEqual([error['line'] for error in report['errors']], [2, 5, 6, 8])
+
+        project = Project.objects.get(name='Importé')
+        self.assertEqual(project.author.username, 'bob')
+        self.assertEqual(
+            set(project.contributor_set.values_list('user__username', flat=True)), {'bob', 'author'})
+        self.assertEqual(
+            (project.issue_count, project.in_progress_count, project.contributor_count), (1, 1, 2))
+        issue = project.issue_set.get()
+        self.assertEqual(issue.assign_to, self.author)
+        self.assertEqual(issue.comment_set.get().description, 'commentaire importé')
+
+        # visible to the contributors and indexed
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(f'/api/projects/{project.id}/issues/').data['count'], 1)
+        self.assertEqual(len(self.client.get('/api/search/?q=importé').data['results']), 2)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.post([json.dumps(self.records()[0])]).status_code, 403)
+
+    def test_nothing_imported(self):
+        response = self.post(['{"model": "user", "username": "author", "age": 30}'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['line'], 1)
+
+    def test_command(self):
+        data = '\n'.join(json.dumps(record) for record in self.records()[:3])
+        stdout = StringIO()
+        with mock.patch('builtins.open', mock.mock_open(read_data=data)) as path:
+            call_command('import_ndjson', 'import.ndjson', stdout=stdout, stderr=StringIO())
+        path.assert_called_once()
+        self.assertTrue(Project.objects.filter(name='Importé').exists())
+        self.assertIn('2 lignes créées, 1 erreurs', stdout.getvalue())
+
+
+class ChangeFeedTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.comment_id = self.comment.id
+
+    def changes(self, since, **params):
+        response = self.client.get('/api/changes/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def summary(self, feed):
+        return [(change['model'], change['id'], change['action']) for change in feed['changes']]
+
+    def test_changes_since_the_cursor(self):
+        cursor = self.client.get('/api/changes/').data['cursor']
+        self.assertEqual(self.changes(cursor)['changes'], [])
+
+        issue = self.create_issue(title='nouveau')
+        self.client.patch(f'{self.project_url}issues/{issue.id}/', {'title': 'modifié'})
+        self.comment.delete()
+        feed = self.changes(cursor)
+        # only the last change of each object, with its current data
+        self.assertEqual(self.summary(feed), [
+            ('issue', issue.id, 'updated'),
+            ('comment', self.comment_id, 'deleted'),
+            ('project', self.project.id, 'updated'),
+        ])
+        self.assertEqual(feed['changes'][0]['data']['title'], 'modifié')
+        self.assertIsNone(feed['changes'][1]['data'])
+        self.assertEqual(feed['changes'][2]['data']['issue_count'], 2)
+        self.assertEqual(self.changes(feed['cursor'])['changes'], [])
+
+    def test_pages(self):
+        cursor = self.client.get('/api/changes/').data['cursor']
+        for index in range(3):
+            self.create_comment(description=f'commentaire {index}')
+        feed = self.changes(cursor, limit=2)
+        self.assertTrue(feed['has_more'])
+        feed = self.changes(feed['cursor'], limit=10)
+        self.assertFalse(feed['has_more'])
+        self.assertEqual(len(feed['changes']), 3)
+
+    def test_only_the_user_projects(self):
+        other = self.create_user('other')
+        cursor = self.client.get('/api/changes/').data['cursor']
+        Project.objects.create(author=other, name='Privé', description='description', type='iOS')
+        self.assertEqual(self.changes(cursor)['changes'], [])
+
+    def test_removed_contributor_see_the_tombstone(self):
+        contributor = self.create_contributor()
+        self.client.force_authenticate(contributor.user)
+        cursor = self.client.get('/api/changes/').data['cursor']
+        self.project.delete()
+        self.assertIn(('contributor', contributor.id, 'deleted'), self.summary(self.changes(cursor)))
+
+    def test_bulk_changes(self):
+        cursor = self.client.get('/api/changes/').data['cursor']
+        self.client.patch(f'{self.project_url}issues/bulk/', {'ids': [self.issue.id], 'statue': 'Finished'},
+                          format='json')
+        self.client.post(f'{self.project_url}contributors/bulk/', {'users': [self.create_user('bob').id]},
+                         format='json')
+        summary = self.summary(self.changes(cursor))
+        self.assertIn(('issue', self.issue.id, 'updated'), summary)
+        self.assertIn(('contributor', Contributor.objects.get(user__username='bob').id, 'created'), summary)
+
+    def test_new_contributor_resync_the_project(self):
+        user = self.create_user('bob')
+        self.client.force_authenticate(user)
+        cursor = self.client.get('/api/changes/').data['cursor']
+        self.assertEqual(self.changes(cursor)['resync'], [])
+        # the issue and comment of the project are older than the membership
+        contributor = Contributor.objects.create(user=user, project=self.project)
+        feed = self.changes(cursor)
+        self.assertEqual(feed['resync'], [self.project.id])
+        self.assertIn(('contributor', contributor.id, 'created'), self.summary(feed))
+        self.assertEqual(self.changes(feed['cursor'])['resync'], [])
+        # removed again
+        contributor.delete()
+        self.assertEqual(self.changes(cursor)['resync'], [])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/changes/?since=hier').status_code, 400)
+
+
+class AsyncReadTests(ApiTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # the settings of the ASGI deployment, the views are chosen when the urls are loaded
+        cls.enterClassContext(read_views(True))
+
+    def bearer(self, user):
+        return {'authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+    def test_read_views_are_async(self):
+        for url in ['/api/projects/', self.project_url, f'{self.project_url}issues/',
+                    self.issue_url, f'{self.issue_url}comments/']:
+            self.assertTrue(iscoroutinefunction(resolve(url).func), url)
+        self.assertFalse(iscoroutinefunction(resolve(f'{self.project_url}contributors/').func))
+        with override_settings(ASYNC_READ_VIEWS=False):
+            self.assertFalse(iscoroutinefunction(ProjectViewSet.as_view({'get': 'list'})))
+
+    def test_async_views_only_under_asgi(self):
+        self.assertFalse(import_module('Config.settings').ASYNC_READ_VIEWS)
+        self.assertTrue(import_module('Config.settings_asgi').ASYNC_READ_VIEWS)
+
+    def test_json_reads_use_the_async_actions(self):
+        with mock.patch.object(IssueViewSet, 'list', side_effect=AssertionError), \
+                mock.patch.object(IssueViewSet, 'retrieve', side_effect=AssertionError):
+            self.assertEqual(self.client.get(f'{self.project_url}issues/').status_code, 200)
+            self.assertEqual(self.client.head(f'{self.project_url}issues/').status_code, 200)
+            self.assertEqual(self.client.get(self.issue_url).data['project'], 'Projet')
+
+    def test_other_requests_use_the_sync_view(self):
+        with mock.patch.object(IssueViewSet, 'alist', side_effect=AssertionError):
+            response = self.client.get(f'{self.project_url}issues/?format=api')
+            self.assertEqual(response.status_code, 200)
+            response = self.client.post(f'{self.project_url}issues/', {
+                'title': 'nouveau', 'description': 'description',
+                'statue': 'Todo', 'priority': 'Low', 'tag': 'Bug'})
+            self.assertEqual(response.status_code, 201)
+
+    def test_same_responses_as_the_sync_views(self):
+        urls = ['/api/projects/', self.project_url, f'{self.project_url}issues/?statue=Todo',
+                f'{self.project_url}issues/?pagination=cursor', self.issue_url,
+                f'{self.issue_url}comments/', f'{self.issue_url}comments/{self.comment.id}/']
+        async_responses = [self.client.get(url).data for url in urls]
+        with mock.patch.object(IssueViewSet, 'async_actions', []), \
+                mock.patch.object(ProjectViewSet, 'async_actions', []), \
+                mock.patch.object(CommentViewSet, 'async_actions', []):
+            get_response_cache().clear()
+            self.assertEqual([self.client.get(url).data for url in urls], async_responses)
+
+    def test_permissions(self):
+        other = self.create_user('other')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.project_url).status_code, 403)
+        self.assertEqual(self.client.get(f'{self.project_url}issues/').status_code, 403)
+        self.assertEqual(self.client.get(self.issue_url).status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.issue_url).status_code, 401)
+
+    def test_errors(self):
+        self.assertEqual(self.client.get(f'{self.project_url}issues/999/').status_code, 404)
+        self.assertEqual(self.client.get(f'{self.project_url}issues/?page=9').status_code, 404)
+        self.assertEqual(self.client.get(f'{self.project_url}issues/?statue=Faux').status_code, 400)
+
+    def test_assign_to_filter(self):
+        response = self.client.get(f'{self.project_url}issues/?assign_to={self.author.username}')
+        self.assertEqual(response.data['count'], 1)
+
+    async def test_sparse_fields_and_expand(self):
+        # the plans of the fields and expands load all they read, a lazy query fails in the async views
+        await sync_to_async(lambda: self.create_issue(assign_to=self.create_contributor().user))()
+        headers = self.bearer(self.author)
+        for viewset, url, detail in [
+                (ProjectViewSet, '/api/projects/', False), (ProjectViewSet, self.project_url, True),
+                (IssueViewSet, f'{self.project_url}issues/', False), (IssueViewSet, self.issue_url, True),
+                (CommentViewSet, f'{self.issue_url}comments/', False),
+                (CommentViewSet, f'{self.issue_url}comments/{self.comment.id}/', True)]:
+            fields = [name for name, field in viewset.serializer_class().fields.items() if not field.write_only]
+            expandable = getattr(viewset, 'expandable', {})
+            detail_fields = [] if detail else getattr(viewset.serializer_class, 'detail_fields', [])
+            for field, expand in itertools.product([None, *fields], [None, *expandable]):
+                query = '&'.join(f'{name}={value}' for name, value in [('fields', field), ('expand', expand)]
+                                 if value)
+                response = await self.async_client.get(f'{url}?{query}', headers=headers)
+                # the fields of the detail view are refused by the lists
+                expected = 400 if field in detail_fields and field != expand else 200
+                self.assertEqual(response.status_code, expected, f'{url}?{query}')
+
+    async def test_jwt_authentication(self):
+        response = await self.async_client.get(self.issue_url, headers=self.bearer(self.author))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'ticket')
+
+        self.author.is_active = False
+        await self.author.asave()
+        response = await self.async_client.get(self.issue_url, headers=self.bearer(self.author))
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(self.issue_url, headers={'authorization': 'Bearer faux'})
+        self.assertEqual(response.status_code, 401)
+
+
+class EventStreamTests(ApiTestCase):
+
+    def event(self, cursor, model='issue', action='created', project=None, **kwargs):
+        return {'cursor': cursor, 'model': model, 'action': action, 'id': cursor,
+                'project': project or self.project.id, **kwargs}
+
+    async def open_stream(self, user, since=None):
+        url = f'{self.project_url}events/' + ('' if since is None else f'?since={since}')
+        response = await self.async_client.get(url, headers={
+            'authorization': f'Bearer {AccessToken.for_user(user)}', 'accept': 'text/event-stream'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        return stream
+
+    async def read(self, stream):
+        return await asyncio.wait_for(anext(stream), 1)
+
+    def test_changes_published_after_the_commit(self):
+        with mock.patch.object(get_event_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                issue = self.create_issue()
+                publish.assert_not_called()
+        events = publish.call_args[0][0]
+        # the project update is not an event
+        self.assertEqual([(event['model'], event['id'], event['action']) for event in events],
+                         [('issue', issue.id, 'created')])
+
+    async def test_local_broker(self):
+        broker = LocalEventBroker(max_queue_size=2)
+        events = broker.subscribe(self.project.id, timeout=0.05)
+        # the subscription start with the generator
+        self.assertIsNone(await anext(events))
+        # published from the thread of a request
+        await asyncio.to_thread(broker.publish, [self.event(100), self.event(101, project=999)])
+        self.assertEqual((await anext(events))['cursor'], 100)
+        # a slow stream is ended
+        broker.publish([self.event(102), self.event(103), self.event(104)])
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+        self.assertEqual(broker.projects, {})
+
+    async def test_local_broker_replay(self):
+        broker = LocalEventBroker()
+        events = broker.subscribe(self.project.id, since=0)
+        # the author, issue and comment of setUp, from the change log
+        self.assertEqual([(await anext(events))['model'] for _ in range(3)],
+                         ['contributor', 'issue', 'comment'])
+        await events.aclose()
+
+    async def test_change_log_broker(self):
+        broker = ChangeLogEventBroker(poll_interval=0.01)
+        events = broker.subscribe(self.project.id, timeout=0.05)
+        self.assertIsNone(await anext(events))
+        issue = await sync_to_async(self.create_issue)()
+        event = await anext(events)
+        self.assertEqual((event['model'], event['id'], event['action']), ('issue', issue.id, 'created'))
+        await events.aclose()
+
+    async def test_stream(self):
+        stream = await self.open_stream(self.author, since=0)
+        self.assertIn('event: contributor\n', (await self.read(stream)).decode())
+        content = (await self.read(stream)).decode()
+        self.assertTrue(content.startswith('id: '))
+        self.assertIn('event: issue\n', content)
+        self.assertEqual(json.loads(content.split('data: ')[1])['id'], self.issue.id)
+        self.assertIn('event: comment\n', (await self.read(stream)).decode())
+
+        get_event_broker().publish([self.event(10 ** 6, 'comment', 'deleted')])
+        self.assertIn('"cursor": 1000000', (await self.read(stream)).decode())
+        await stream.aclose()
+
+    async def test_removed_contributor_stream_end(self):
+        contributor = await sync_to_async(self.create_contributor)()
+        stream = await self.open_stream(contributor.user)
+        # committed after the connection, before the first read of the stream
+        await sync_to_async(contributor.delete)()
+        content = (await self.read(stream)).decode()
+        self.assertIn('event: contributor', content)
+        self.assertIn('"action": "deleted"', content)
+        with self.assertRaises(StopAsyncIteration):
+            await self.read(stream)
+
+    def test_permissions(self):
+        url = f'{self.project_url}events/'
+        self.client.force_authenticate(self.create_user('other'))
+        response = self.client.get(url, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(response.content.startswith(b'event: error\ndata: '))
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT='text/event-stream').status_code, 401)
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(f'{url}?since=abc', HTTP_ACCEPT='text/event-stream').status_code, 400)
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT='application/json').status_code, 406)
+
+    def test_only_under_asgi(self):
+        # the WSGI handler would read the endless stream before sending it
+        response = self.client.get(f'{self.project_url}events/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 501)
+        self.assertTrue(response.content.startswith(b'event: error\ndata: '))
+
+
+class JWTAuthenticationTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+
+    def obtain_token(self, username='author'):
+        response = self.client.post('/api/token/', {'username': username, 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        return response.data['access']
+
+    def get_user(self, token):
+        authentication = JWTAuthentication()
+        return authentication.get_user(authentication.get_validated_token(token))
+
+    @override_settings(JWT_USER_CACHE_TIMEOUT=60)
+    def test_user_read_from_the_cache(self):
+        token = self.obtain_token()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_user(token), self.author)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_user(token), self.author)
+        # only some fields, without the password hash
+        self.assertEqual(cache.get(user_cache_key(self.author.id)), ['author', False, True])
+
+        # one query less by request: project version, count and page
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get('/api/projects/').status_code, 200)
+
+    @override_settings(JWT_USER_CACHE_TIMEOUT=60)
+    def test_cache_invalidated_when_the_user_is_saved(self):
+        token = self.obtain_token()
+        self.get_user(token)
+        self.author.set_password('nouveau')
+        self.author.save()
+        with self.assertNumQueries(1):
+            self.get_user(token)
+
+        self.author.is_active = False
+        self.author.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(self.issue_url).status_code, 401)
+        self.assertEqual(self.client.get(f'{self.issue_url}?format=api').status_code, 401)
+
+    def test_without_cache(self):
+        token = self.obtain_token()
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.get_user(token)
+
+    @override_settings(JWT_USER_FROM_CLAIMS=True)
+    def test_user_from_the_claims(self):
+        self.author.is_staff = True
+        self.author.save()
+        token = self.obtain_token()
+        with self.assertNumQueries(0):
+            user = self.get_user(token)
+            self.assertEqual((user.id, user.username, user.is_staff), (self.author.id, 'author', True))
+        # the other fields are loaded when read
+        self.assertEqual(user.age, 20)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.post('/api/projects/', {
+            'name': 'Nouveau', 'description': 'description', 'type': 'iOS'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Project.objects.get(name='Nouveau').author, self.author)
+
+    @override_settings(JWT_USER_FROM_CLAIMS=True)
+    def test_token_without_claims(self):
+        token = str(AccessToken.for_user(self.author))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_user(token), self.author)
+
+    def test_no_claims_without_the_setting(self):
+        token = AccessToken(self.obtain_token())
+        self.assertNotIn('is_staff', token)
+        self.assertNotIn('username', token)
+
+    @override_settings(JWT_USER_FROM_CLAIMS=True)
+    def test_claims_with_revoked_tokens(self):
+        # simplejwt replace its api_settings on setting_changed, the modules keep the first one
+        with mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True):
+            token = self.obtain_token()
+            self.assertEqual(self.get_user(token), self.author)
+            self.author.set_password('nouveau')
+            self.author.save()
+            with self.assertRaises(AuthenticationFailed):
+                self.get_user(token)
+
+
+class LoginTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+
+    def login(self, username='author', password='password'):
+        return self.client.post('/api/token/', {'username': username, 'password': password})
+
+    def test_throttled_by_username(self):
+        rates = {'login': '10/min', 'login_username': '2/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            self.assertEqual(self.login(password='mauvais').status_code, 401)
+            self.assertEqual(self.login().status_code, 200)
+            response = self.login()
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response)
+            # the other users can still login from this IP
+            self.create_user('other')
+            self.assertEqual(self.login('other').status_code, 200)
+
+    def test_throttled_by_ip(self):
+        rates = {'login': '2/min', 'login_username': '10/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            self.assertEqual(self.login('inconnu').status_code, 401)
+            self.assertEqual(self.login().status_code, 200)
+            self.assertEqual(self.login('inconnu2').status_code, 429)
+            # the client can't change its IP with the header
+            response = self.client.post('/api/token/', {'username': 'inconnu3', 'password': 'password'},
+                                        HTTP_X_FORWARDED_FOR='10.0.0.3')
+            self.assertEqual(response.status_code, 429)
+
+    @override_settings(PASSWORD_HASHERS=['api.hashers.PBKDF2PasswordHasher',
+                                         'django.contrib.auth.hashers.MD5PasswordHasher'],
+                       PASSWORD_HASH_ITERATIONS=1000)
+    def test_password_hashed_again_at_login(self):
+        # MD5 hash of the test users
+        self.assertTrue(self.author.password.startswith('md5$'))
+        self.assertEqual(self.login().status_code, 200)
+        self.author.refresh_from_db()
+        self.assertTrue(self.author.password.startswith('pbkdf2_sha256$1000$'))
+
+        # the iterations changed
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+        self.author.refresh_from_db()
+        self.assertTrue(self.author.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.author.check_password('password'))
+
+        # not weakened when the iterations are lowered
+        self.assertEqual(self.login().status_code, 200)
+        self.author.refresh_from_db()
+        self.assertTrue(self.author.password.startswith('pbkdf2_sha256$2000$'))
+
+    @override_settings(LOGIN_HASH_WORKERS=1, LOGIN_HASH_TIMEOUT=0.01)
+    def test_hashing_slots(self):
+        self.assertEqual(self.login().status_code, 200)
+        # the only slot is taken by an other login
+        with hashing_slot():
+            response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.login().status_code, 200)
+
+
+class ProjectListTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = self.create_user('other')
+        self.other_project = Project.objects.create(
+            author=self.other, name='Autre', description='description', type='iOS')
+
+    def get_names(self):
+        response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, 200)
+        return [project['name'] for project in response.data['results']]
+
+    def test_only_the_projects_of_the_user(self):
+        self.assertEqual(self.get_names(), ['Projet'])
+        self.assertEqual(self.client.get('/api/projects/').data['count'], 1)
+        # contributor
+        Contributor.objects.create(user=self.author, project=self.other_project)
+        self.assertEqual(self.get_names(), ['Projet', 'Autre'])
+        # the detail of the other projects is still forbidden
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.get_names(), ['Autre'])
+        self.assertEqual(self.client.get(self.project_url).status_code, 403)
+
+    def test_staff_see_all_the_projects(self):
+        self.author.is_staff = True
+        self.author.save()
+        self.assertEqual(self.get_names(), ['Projet', 'Autre'])
+
+    def test_etag_follows_the_projects_of_the_user(self):
+        etag = self.client.get('/api/projects/')['ETag']
+        # a project of an other user
+        Project.objects.create(author=self.other, name='Encore', description='description', type='iOS')
+        self.assertEqual(self.client.get('/api/projects/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Contributor.objects.create(user=self.author, project=self.other_project)
+        self.assertEqual(self.client.get('/api/projects/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sync_view(self):
+        # the browsable API isn't served by the async views
+        response = self.client.get('/api/projects/?format=api')
+        self.assertEqual([project['name'] for project in response.data['results']], ['Projet'])
+
+
+class ExpandTests(ApiTestCase):
+
+    def test_issue_with_comments_and_contributors(self):
+        contributor = self.create_contributor()
+        self.issue.assign_to = contributor.user
+        self.issue.save()
+        data = self.client.get(f'{self.issue_url}?expand=comments,contributors,assign_to').data
+        self.assertEqual(data['assign_to'], {'id': contributor.user.id, 'username': contributor.user.username})
+        # not expanded
+        self.assertEqual(data['author'], 'author')
+        self.assertEqual([comment['id'] for comment in data['comments']], [self.comment.id])
+        self.assertEqual(data['comments'][0]['author'], 'author')
+        self.assertEqual([user['user'] for user in data['contributors']], ['author', contributor.user.username])
+
+    def test_same_as_the_separate_requests(self):
+        data = self.client.get(f'{self.project_url}issues/?include=comments').data['results'][0]
+        self.assertEqual(data['comments'], self.client.get(f'{self.issue_url}comments/').data['results'])
+        data = self.client.get('/api/projects/?expand=contributors').data['results'][0]
+        self.assertEqual(data['contributors'], self.client.get(self.project_url).data['contributors'])
+
+    def test_project_detail(self):
+        response = self.client.get(f'{self.project_url}?expand=contributors,author')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['author'], {'id': self.author.id, 'username': 'author'})
+        self.assertEqual([user['user'] for user in response.data['contributors']], ['author'])
+
+    def test_browsable_api(self):
+        response = self.client.get(f'{self.issue_url}?expand=comments&format=api')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['comments']), 1)
+
+    def test_unknown_expand(self):
+        response = self.client.get(f'{self.issue_url}?expand=comments,project')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('project', response.data['expand'])
+
+
+class SparseFieldsTests(ApiTestCase):
+
+    def test_issue_list(self):
+        url = f'{self.project_url}issues/?fields=id,title,statue'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.data['results'], [{'id': self.issue.id, 'title': 'ticket', 'statue': 'Todo'}])
+        # membership, version, count and page, without the description nor the users
+        self.assertEqual(len(queries), 4)
+        self.assertNotIn('description', queries[-1]['sql'])
+        self.assertNotIn('accounts_customuser', queries[-1]['sql'])
+
+    def test_related_fields(self):
+        contributor = self.create_contributor()
+        self.create_issue(assign_to=contributor.user)
+        url = f'{self.project_url}issues/?fields=title,assign_to'
+        with self.assertNumQueries(4):
+            data = self.client.get(url).data['results']
+        self.assertEqual(data, [{'title': 'ticket', 'assign_to': 'author'},
+                                {'title': 'ticket', 'assign_to': contributor.user.username}])
+
+    def test_detail(self):
+        data = self.client.get(f'{self.issue_url}?fields=title,project').data
+        self.assertEqual(data, {'title': 'ticket', 'project': 'Projet'})
+        data = self.client.get(f'{self.project_url}?fields=id,name').data
+        self.assertEqual(data, {'id': self.project.id, 'name': 'Projet'})
+        data = self.client.get(f'{self.issue_url}comments/?fields=description').data
+        self.assertEqual(data['results'], [{'description': self.comment.description}])
+        # the permissions read the annotated project, not the issue
+        with self.assertNumQueries(3):
+            data = self.client.get(f'{self.issue_url}comments/{self.comment.id}/?fields=description').data
+        self.assertEqual(data, {'description': self.comment.description})
+
+    def test_with_expand(self):
+        data = self.client.get(f'{self.issue_url}?fields=id&expand=comments').data
+        self.assertEqual(list(data), ['id', 'comments'])
+        self.assertEqual(data['comments'][0]['id'], self.comment.id)
+        data = self.client.get(f'{self.project_url}?fields=id&expand=contributors').data
+        self.assertEqual(data['contributors'][0]['project'], 'Projet')
+
+    def test_user_data_still_hidden(self):
+        other = self.create_user('other', email='other@exemple.fr')
+        data = self.client.get(f'/api/users/{other.id}/?fields=username,email').data
+        self.assertEqual(data, {'username': 'other'})
+        other.can_data_be_shared = True
+        other.save()
+        data = self.client.get(f'/api/users/{other.id}/?fields=username,email').data
+        self.assertEqual(data, {'username': 'other', 'email': 'other@exemple.fr'})
+
+    def test_fields_of_the_action(self):
+        # only rendered by the detail views
+        for url in ['/api/projects/?fields=contributors', f'{self.project_url}issues/?fields=project',
+                    f'{self.issue_url}comments/?fields=issue,uuid']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn('fields', response.data)
+        data = self.client.get(f'{self.issue_url}comments/{self.comment.id}/?fields=issue').data
+        self.assertEqual(data, {'issue': 'ticket'})
+        data = self.client.get('/api/projects/?fields=contributors&expand=contributors').data['results']
+        self.assertEqual([contributor['user'] for contributor in data[0]['contributors']], ['author'])
+
+    def test_user_list(self):
+        # count and page, can_data_be_shared is only read for the age and email
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/users/?fields=id,username').data
+        self.assertEqual(data['results'], [{'id': self.author.id, 'username': 'author'}])
+
+    def test_list_read_with_values(self):
+        with mock.patch.object(IssueSerializer, 'to_representation', side_effect=AssertionError), \
+                CaptureQueriesContext(connection) as queries:
+            data = self.client.get(f'{self.project_url}issues/?fields=created_time,title').data
+        self.assertEqual(data['results'], [{'title': 'ticket', 'created_time': self.issue.created_time.isoformat()}])
+        self.assertNotIn('description', queries[-1]['sql'])
+
+    def test_unknown_field(self):
+        response = self.client.get(f'{self.project_url}issues/?fields=title,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.data['fields'])
+        # write only
+        self.assertEqual(self.client.get('/api/users/?fields=password').status_code, 400)
+
+
+AUTHENTICATED_USERS = {'author', 'assignee', 'contributor', 'staff', 'outsider'}
+MEMBERS = {'author', 'assignee', 'contributor'}
+
+
+class PermissionMatrixTests(ApiTestCase):
+    """
+    The permissions of each role for each action, the same as before the role tables.
+    author: author of the project, issue and comment. assignee: contributor assigned to the issue.
+    staff: admin, not a contributor. outsider: not a contributor.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.users = {
+            'author': self.author,
+            'assignee': self.create_contributor().user,
+            'contributor': self.create_contributor().user,
+            'staff': self.create_user('staff', is_staff=True),
+            'outsider': self.create_user('outsider'),
+            'anonymous': AnonymousUser(),
+        }
+        self.issue.assign_to = self.users['assignee']
+        self.issue.save()
+
+    def check(self, permission, action, expected, obj=None, data=None):
+        for name, user in self.users.items():
+            request = SimpleNamespace(method='GET', user=user, data=data or {})
+            view = SimpleNamespace(action=action, kwargs={'project_pk': str(self.project.id)})
+            with CaptureQueriesContext(connection) as queries:
+                if obj is None:
+                    result = permission.has_permission(request, view)
+                else:
+                    result = permission.has_object_permission(request, view, obj)
+            self.assertEqual(result, name in expected, (type(permission).__name__, action, data, name))
+            # the membership or the project author
+            self.assertLessEqual(len(queries), 1, (type(permission).__name__, action, name))
+
+    def test_views(self):
+        everyone = AUTHENTICATED_USERS | {'anonymous'}
+        members = MEMBERS | {'staff'}
+        matrix = [
+            (CustomUserPermissions(), {
+                'create': everyone, 'retrieve': AUTHENTICATED_USERS, 'list': AUTHENTICATED_USERS,
+                'update': AUTHENTICATED_USERS, 'partial_update': AUTHENTICATED_USERS,
+                'destroy': AUTHENTICATED_USERS, 'other': {'staff'}}),
+            (ProjectPermissions(), {
+                'create': AUTHENTICATED_USERS, 'retrieve': AUTHENTICATED_USERS, 'list': AUTHENTICATED_USERS,
+                'update': AUTHENTICATED_USERS, 'partial_update': AUTHENTICATED_USERS,
+                'destroy': AUTHENTICATED_USERS, 'other': {'staff'}}),
+            (ContributorPermissions(), {
+                'bulk': {'author', 'staff'}, 'list': members, 'retrieve': members, 'create': AUTHENTICATED_USERS,
+                'destroy': AUTHENTICATED_USERS}),
+            (IssuePermissions(), {
+                'create': members, 'retrieve': members, 'list': members, 'update': members,
+                'partial_update': members, 'destroy': members, 'bulk': members, 'export': members,
+                'other': {'staff'}}),
+            (CommentPermissions(), {
+                'create': members, 'retrieve': members, 'list': members, 'update': members,
+                'partial_update': members, 'destroy': members, 'bulk': {'staff'}}),
+        ]
+        for permission, actions in matrix:
+            for action, expected in actions.items():
+                self.check(permission, action, expected)
+
+    def test_users(self):
+        user = self.users['assignee']
+        for action in ['update', 'partial_update', 'destroy']:
+            self.check(CustomUserPermissions(), action, {'assignee', 'staff'}, user)
+        self.check(CustomUserPermissions(), 'retrieve', AUTHENTICATED_USERS, user)
+        self.check(CustomUserPermissions(), 'other', {'staff'}, user)
+
+    def test_projects(self):
+        permission = ProjectPermissions()
+        self.check(permission, 'retrieve', MEMBERS | {'staff'}, self.project)
+        self.check(permission, 'destroy', {'author', 'staff'}, self.project)
+        for action in ['update', 'partial_update']:
+            self.check(permission, action, {'author', 'staff'}, self.project, {'name': 'nom', 'type': 'iOS'})
+            self.check(permission, action, set(), self.project, {'name': 'nom', 'author': 1})
+        self.check(permission, 'other', set(), self.project)
+
+    def test_issues(self):
+        permission = IssuePermissions()
+        self.check(permission, 'retrieve', MEMBERS | {'staff'}, self.issue)
+        self.check(permission, 'destroy', {'author', 'staff'}, self.issue)
+        for action in ['update', 'partial_update']:
+            self.check(permission, action, {'author', 'staff'}, self.issue, {'title': 'titre'})
+            self.check(permission, action, {'author', 'staff', 'assignee'}, self.issue, {'statue': 'Finished'})
+            self.check(permission, action, set(), self.issue, {'project': 2})
+        self.check(permission, 'other', set(), self.issue)
+
+    def test_contributors_hidden_from_the_outsiders(self):
+        contributor = Contributor.objects.get(user=self.users['contributor'])
+        for name, status_code in [('outsider', 403), ('contributor', 200), ('staff', 200)]:
+            self.client.force_authenticate(self.users[name])
+            for url in [f'{self.project_url}contributors/', f'{self.project_url}contributors/{contributor.id}/']:
+                self.assertEqual(self.client.get(url).status_code, status_code, (name, url))
+
+    def test_annotated_objects_without_query(self):
+        comments = Comment.objects.annotate(project_id=F('issue__project_id'))
+        cases = [
+            (ProjectPermissions(), Project.objects.all(), 'pk', self.project, MEMBERS | {'staff'}),
+            (IssuePermissions(), Issue.objects.all(), 'project_id', self.issue, MEMBERS | {'staff'}),
+            (CommentPermissions(), comments, 'project_id', self.comment, MEMBERS),
+        ]
+        for permission, queryset, project_field, obj, expected in cases:
+            for name, user in self.users.items():
+                annotated = annotate_is_contributor(queryset, user, project_field).get(pk=obj.pk)
+                request = SimpleNamespace(method='GET', user=user, data={})
+                view = SimpleNamespace(action='retrieve', kwargs={})
+                with self.assertNumQueries(0):
+                    self.assertEqual(
+                        permission.has_object_permission(request, view, annotated), name in expected,
+                        (type(permission).__name__, name))
+
+    def test_detail_views_annotate_the_objects(self):
+        self.client.force_authenticate(self.users['contributor'])
+        with mock.patch('api.roles.is_contributor', wraps=is_contributor) as membership:
+            self.assertEqual(self.client.get(self.issue_url).status_code, 200)
+            self.assertEqual(self.client.get(f'{self.issue_url}comments/{self.comment.id}/').status_code, 200)
+            self.assertEqual(self.client.get(f'{self.project_url}?format=api').status_code, 200)
+        # only the view permission of the issues and comments, the objects are annotated
+        self.assertEqual(membership.call_count, 2)
+        self.client.force_authenticate(self.users['outsider'])
+        self.assertEqual(self.client.get(f'{self.project_url}?format=api').status_code, 403)
+
+    def test_comments(self):
+        permission = CommentPermissions()
+        comment = Comment.objects.annotate(project_id=F('issue__project_id')).get(pk=self.comment.pk)
+        # the admins aren't allowed
+        self.check(permission, 'retrieve', MEMBERS, comment)
+        self.check(permission, 'destroy', {'author'}, comment)
+        for action in ['update', 'partial_update']:
+            self.check(permission, action, {'author'}, comment, {'description': 'texte'})
+            self.check(permission, action, set(), comment, {'issue': 2})
+        self.check(permission, 'other', set(), comment)
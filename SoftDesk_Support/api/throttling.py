@@ -0,0 +1,34 @@
+"""
+Throttles of the token endpoint.
+
+the rates are the 'login' (by IP) and 'login_username' (by username) entries of
+DEFAULT_THROTTLE_RATES, no limit without them.
+"""
+from rest_framework import throttling
+from rest_framework.settings import api_settings
+
+
+class LoginRateThrottle(throttling.SimpleRateThrottle):
+    """ limit the logins from an IP, authenticated or not."""
+
+    scope = 'login'
+
+    def get_rate(self):
+        # read at each request, DRF read it once at the import
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginUsernameRateThrottle(LoginRateThrottle):
+    """ limit the logins of a username from all the IPs (password guessing)."""
+
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username')
+        if not isinstance(username, str) or not username:
+            # rejected by the serializer, without hash
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': username.lower()}
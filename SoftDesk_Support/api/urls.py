@@ -7,11 +7,18 @@ from .views import (
     ContributorViewSet,
     IssueViewSet,
     CommentViewSet,
+    SearchViewSet,
+    ImportViewSet,
+    ChangeFeedViewSet,
+    ProjectEventViewSet,
 )
 # router to the root for User and Project
 router = routers.DefaultRouter()
 router.register('users', CustomUserViewSet, basename="users")
 router.register('projects', ProjectViewSet, basename="projects")
+router.register('search', SearchViewSet, basename="search")
+router.register('import', ImportViewSet, basename="import")
+router.register('changes', ChangeFeedViewSet, basename="changes")
 
 # nested router in project for Issue
 projects_router = routers.NestedDefaultRouter(
@@ -19,6 +26,7 @@ projects_router = routers.NestedDefaultRouter(
 projects_router.register(
     'contributors', ContributorViewSet, basename="project-contributors")
 projects_router.register('issues', IssueViewSet, basename="project-issues")
+projects_router.register('events', ProjectEventViewSet, basename="project-events")
 
 # nested router in issue for comment
 issues_router = routers.NestedDefaultRouter(
@@ -1,5 +1,14 @@
-from rest_framework import viewsets, status
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, F, Max, Prefetch, Sum
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import viewsets, status, permissions
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError, NotAcceptable
 from rest_framework.response import Response
+from rest_framework_simplejwt import views as jwt_views
 
 from accounts.models import CustomUser
 from project.models import Project, Contributor
@@ -8,16 +17,63 @@ from .serializers import (
     UserSerializer,
     ProjectSerializer,
     ContributorSerializer,
+    ContributorBulkSerializer,
     IssueSerializer,
+    IssueBulkUpdateSerializer,
     CommentSerializer,
+    ProjectValuesSerializer,
+    IssueValuesSerializer,
+    CommentValuesSerializer,
 )
-from .permissions import CustomUserPermissions, ProjectPermissions, IssuePermissions, CommentPermissions
+from .permissions import (
+    CustomUserPermissions,
+    ProjectPermissions,
+    ContributorPermissions,
+    IssuePermissions,
+    CommentPermissions,
+)
+from .hashers import hashing_slot
+from .throttling import LoginRateThrottle, LoginUsernameRateThrottle
+from .mixins import (
+    QueryPlanMixin,
+    ValuesListMixin,
+    ResponseCacheMixin,
+    AsyncReadMixin,
+    ExpandMixin,
+    SparseFieldsMixin,
+    ContributorAnnotationMixin,
+)
+from .pagination import PageNumberPagination, PageNumberOrKeysetPagination
+from .filters import IssueFilterBackend
+from .membership import (
+    get_assignable_users,
+    find_assignable_user,
+    format_user_list,
+    resolve_users,
+    invalidate_membership,
+    get_project_ids,
+    is_contributor,
+    contributed_projects,
+    aget_assignable_users,
+)
+from .search import SearchResults
+from .cache import invalidate_project_responses
+from .export import NDJSONRenderer, CSVRenderer, ndjson_stream, csv_stream, andjson_stream, acsv_stream
+from .importer import NDJSONImporter
+from .changes import record_changes
+from .feed import get_changes, current_cursor
+from .events import EventStreamRenderer, EventStreamUnavailable, event_stream
 
 
-class CustomUserViewSet(viewsets.ModelViewSet):
+class CustomUserViewSet(SparseFieldsMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
     permission_classes = [CustomUserPermissions]
+    # the age and email are only shown if the user share his data
+    sparse_plans = {
+        'age': {'only': ['age', 'can_data_be_shared']},
+        'email': {'only': ['email', 'can_data_be_shared']},
+    }
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -25,10 +81,95 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         return context
 
 
-class ProjectViewSet(viewsets.ModelViewSet):
+def project_version_stamp(project_id):
+    """ return the version and last activity of a project, None if it doesn't exist."""
+    try:
+        return Project.objects.filter(pk=int(project_id)).values_list(
+            'version', 'last_activity').first()
+    except (TypeError, ValueError):
+        return None
+
+
+async def aproject_version_stamp(project_id):
+    try:
+        return await Project.objects.filter(pk=int(project_id)).values_list(
+            'version', 'last_activity').afirst()
+    except (TypeError, ValueError):
+        return None
+
+
+def project_list_stamp(stamp):
+    # no Last-Modified: a project deleted or left doesn't change the last activity of the others
+    return f"{stamp['count']}.{stamp['last_id']}.{stamp['versions']}", None
+
+
+# the contributors of the projects with their user, in one query
+CONTRIBUTOR_USERS = Prefetch('contributor_set', queryset=Contributor.objects.select_related('user'))
+
+
+class ProjectViewSet(ResponseCacheMixin, ExpandMixin, SparseFieldsMixin, ValuesListMixin, QueryPlanMixin,
+                     ContributorAnnotationMixin, AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
+    values_serializer_class = ProjectValuesSerializer
     permission_classes = [ProjectPermissions]
+    pagination_class = PageNumberPagination
+    # the list depends on the user, only the detail is cached
+    cached_actions = ['retrieve']
+    membership_actions = ['retrieve']
+    project_url_kwarg = 'pk'
+    contributor_project_field = 'pk'
+    query_plans = {
+        'default': {
+            'select_related': ['author'],
+            'prefetch_related': ['contributors'],
+        },
+        'retrieve': {
+            'select_related': ['author'],
+            'prefetch_related': ['contributors', CONTRIBUTOR_USERS],
+        },
+    }
+    expandable = {
+        'author': {'select_related': ['author']},
+        # the contributors show the name of their project
+        'contributors': {'prefetch_related': [CONTRIBUTOR_USERS], 'only': ['name']},
+    }
+    sparse_plans = {
+        'author': {'select_related': ['author'], 'only': ['author__username']},
+        # the contributors show the name of their project
+        'contributors': {'prefetch_related': ['contributors', CONTRIBUTOR_USERS], 'only': ['name']},
+    }
+
+    # a project of the user added, deleted or changed change the stamp of the list
+    list_stamp = {
+        'count': Count('id'),
+        'last_id': Max('id'),
+        'versions': Sum('version'),
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # the other actions check the permissions of the project (403)
+            queryset = contributed_projects(queryset, self.request.user)
+        return queryset
+
+    def get_list_projects(self):
+        return contributed_projects(Project.objects.all(), self.request.user)
+
+    def reads_project(self):
+        # only the readers of the project get a 304, the others go through get_object
+        return is_contributor(self.request, self.kwargs['pk']) or self.request.user.is_staff
+
+    def get_version_stamp(self):
+        if self.action == 'retrieve':
+            return project_version_stamp(self.kwargs['pk']) if self.reads_project() else None
+        return project_list_stamp(self.get_list_projects().aggregate(**self.list_stamp))
+
+    async def aget_version_stamp(self):
+        if self.action == 'retrieve':
+            return await aproject_version_stamp(self.kwargs['pk']) if self.reads_project() else None
+        return project_list_stamp(await self.get_list_projects().aaggregate(**self.list_stamp))
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -81,76 +222,393 @@ class ProjectViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class ContributorViewSet(viewsets.ModelViewSet):
+class ContributorViewSet(ResponseCacheMixin, SparseFieldsMixin, QueryPlanMixin, viewsets.ModelViewSet):
     serializer_class = ContributorSerializer
+    permission_classes = [ContributorPermissions]
+    query_plans = {
+        'default': {
+            'select_related': ['user', 'project'],
+        },
+        'list': {
+            'select_related': ['user', 'project'],
+            'only': ['id', 'created_time', 'user__username', 'project__name'],
+        },
+    }
+    sparse_plans = {
+        'user': {'select_related': ['user'], 'only': ['user__username']},
+        'project': {'select_related': ['project'], 'only': ['project__name']},
+    }
 
     def get_queryset(self):
         return Contributor.objects.filter(project_id=self.kwargs['project_pk'])
 
+    def get_version_stamp(self):
+        return project_version_stamp(self.kwargs['project_pk'])
 
-class IssueViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post', 'delete'])
+    def bulk(self, request, *args, **kwargs):
+        """
+        POST: add a list of users (username or ID) to the contributors with a single insert.
+        DELETE: remove a list of users from the contributors with a single delete.
+        the counters, change log and caches are updated once, like the signals of a single row.
+        the unknown users are reported in the response.
+        """
+        serializer = ContributorBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        users, unknown = resolve_users(serializer.validated_data['users'])
+        project = get_object_or_404(Project, pk=self.kwargs['project_pk'])
+        contributors = self.get_queryset().filter(user__in=users)
+
+        if request.method == 'POST':
+            existing = set(contributors.values_list('user_id', flat=True))
+            added = [user for user in users if user.id not in existing]
+            with transaction.atomic(savepoint=False):
+                Contributor.objects.bulk_create(
+                    [Contributor(user=user, project=project) for user in added],
+                    ignore_conflicts=True)
+                # bulk_create doesn't call Contributor.save nor send the post_save signal
+                Project.update_counters(project.id, contributor_count=len(added))
+                # ignore_conflicts doesn't return the ids of the new rows
+                record_changes(self.get_queryset().filter(user__in=added), 'created')
+            for user in added:
+                invalidate_membership(user.id)
+            invalidate_project_responses(project.id)
+            return Response(
+                {"added": [user.username for user in added], "unknown": unknown},
+                status=status.HTTP_201_CREATED if added else status.HTTP_200_OK
+            )
+
+        # the author of the project always stay a contributor
+        removed = list(contributors.exclude(user_id=project.author_id).select_related('user').only(
+            'id', 'user_id', 'project_id', 'user__username'))
+        if removed:
+            with transaction.atomic(savepoint=False):
+                # a single delete, without the post_delete signals of each row
+                deleted = Contributor.objects.filter(id__in=[contributor.id for contributor in removed])
+                deleted._raw_delete(deleted.db)
+                Project.update_counters(project.id, contributor_count=-len(removed))
+                record_changes(removed, 'deleted')
+            for contributor in removed:
+                invalidate_membership(contributor.user_id)
+            invalidate_project_responses(project.id)
+        return Response({"removed": [contributor.user.username for contributor in removed], "unknown": unknown})
+
+
+class IssueViewSet(ResponseCacheMixin, ExpandMixin, SparseFieldsMixin, ValuesListMixin, QueryPlanMixin,
+                   ContributorAnnotationMixin, AsyncReadMixin, viewsets.ModelViewSet):
     serializer_class = IssueSerializer
+    values_serializer_class = IssueValuesSerializer
     permission_classes = [IssuePermissions]
+    pagination_class = PageNumberOrKeysetPagination
+    filter_backends = [IssueFilterBackend]
+    query_plans = {
+        'default': {
+            'select_related': ['author', 'assign_to', 'project'],
+        },
+    }
+    # one query by relation, whatever the number of issues
+    expandable = {
+        'author': {'select_related': ['author']},
+        'assign_to': {'select_related': ['assign_to']},
+        # the comments read the title of their issue
+        'comments': {'prefetch_related': [
+            Prefetch('comment_set', queryset=Comment.objects.select_related('author'))], 'only': ['title']},
+        'contributors': {'prefetch_related': [
+            Prefetch('project__contributor_set', queryset=Contributor.objects.select_related('user'))]},
+    }
+    sparse_plans = {
+        'author': {'select_related': ['author'], 'only': ['author__username']},
+        'assign_to': {'select_related': ['assign_to'], 'only': ['assign_to__username']},
+        'project': {'select_related': ['project'], 'only': ['project__name']},
+    }
 
     def get_queryset(self):
         return Issue.objects.filter(project_id=self.kwargs['project_pk'])
 
+    def get_version_stamp(self):
+        # the permissions already checked the user is a contributor of the project
+        return project_version_stamp(self.kwargs['project_pk'])
+
+    async def aget_version_stamp(self):
+        return await aproject_version_stamp(self.kwargs['project_pk'])
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['project'] = self.kwargs['project_pk']
         return context
 
+    def check_permissions(self, request):
+        if request.method not in permissions.SAFE_METHODS and request.user.is_authenticated \
+                and self.writes_assign_to(request.data):
+            # the contributors read to validate assign_to also tell if the user is one of them
+            get_assignable_users(request, self.kwargs['project_pk'])
+        super().check_permissions(request)
+
+    @staticmethod
+    def writes_assign_to(data):
+        items = data if isinstance(data, list) else [data]
+        return any(hasattr(item, 'get') and item.get('assign_to') is not None for item in items)
+
+    def get_object(self):
+        # partial_update check the issue before its assign_to, then update it
+        if getattr(self, '_object', None) is None:
+            self._object = super().get_object()
+        return self._object
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(
             instance, context={'detail_view': True})
         return Response(serializer.data)
 
+    async def alist(self, request, *args, **kwargs):
+        if request.query_params.get('assign_to'):
+            # the filter read the contributors stored on the request
+            await aget_assignable_users(request, self.kwargs['project_pk'])
+        return await super().alist(request, *args, **kwargs)
+
     def partial_update(self, request, *args, **kwargs):
         """
-        get the assign_to field to validate if the contributor exist an set it.
-        can take the username if unique, else it's will look for the id.
+        get the assign_to field to validate if the contributor exist.
+        can take the username, else it's will look for the id.
+        the contributors are loaded once and reused by the serializer validation.
         """
-        instance = self.get_object()
+        self.get_object()
         contributor_name = request.data.get('assign_to')
         if contributor_name is not None:
-            try:
-                if CustomUser.objects.filter(username=contributor_name).count() == 1:
-                    user = CustomUser.objects.get(username=contributor_name)
-                elif contributor_name.isdigit():
-                    user = CustomUser.objects.get(id=contributor_name)
-                else:
-                    user = None
-                instance.assign_to = user
-                instance.save()
-            except (CustomUser.DoesNotExist, ValueError):
-                project_id = self.kwargs['project_pk']
-
-                contributor = Contributor.objects.filter(
-                    project=project_id).values_list('user', flat=True)
-
-                available_users = CustomUser.objects.filter(
-                    id__in=contributor).values_list('id', 'username')
-
-                user_list = ', '.join(
-                    [f'{username} (ID: {id})' for id, username in available_users])
+            users = get_assignable_users(request, self.kwargs['project_pk'])
+            if find_assignable_user(users, contributor_name) is None:
                 return Response(
-                    {"error": f"l'utilisateur {contributor_name} n'existe pas"
-                     + f"Les choix disponible sont : {user_list}"},
+                    {"error": f"l'utilisateur {contributor_name} n'existe pas. "
+                     + f"Les choix disponible sont : {format_user_list(users)}"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
         return super().partial_update(request, *args, **kwargs)
 
+    @action(detail=False, methods=['post', 'patch'])
+    def bulk(self, request, *args, **kwargs):
+        """
+        POST: create a list of issues with a single insert.
+        PATCH: update the statue, priority or assign_to of many issues with a single update,
+        the issues the user can't update are reported in the errors.
+        """
+        if request.method == 'POST':
+            serializer = self.get_serializer(
+                data=request.data, many=True, max_length=settings.BULK_MAX_SIZE)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        serializer = IssueBulkUpdateSerializer(
+            data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        values = dict(serializer.validated_data)
+        ids = values.pop('ids')
+
+        issues = self.get_queryset().filter(id__in=ids).only(
+            'id', 'project_id', 'author_id', 'assign_to_id').in_bulk()
+        permission = IssuePermissions()
+        updated = []
+        errors = {}
+        for issue_id in dict.fromkeys(ids):
+            issue = issues.get(issue_id)
+            if issue is None:
+                errors[issue_id] = f"le ticket {issue_id} n'existe pas dans ce projet."
+            elif not permission.can_update(request, issue, values.keys()):
+                errors[issue_id] = f"vous n'avez pas la permission de modifier le ticket {issue_id}."
+            else:
+                updated.append(issue_id)
+
+        if updated:
+            with transaction.atomic(savepoint=False):
+                # update doesn't call Issue.save, move the issues to their new statue counter,
+                # from their statues read with the rows locked (see Issue.save)
+                deltas = {}
+                if 'statue' in values:
+                    deltas = Issue.statue_deltas(Issue.objects.select_for_update().filter(
+                        id__in=updated).values_list('statue', flat=True), values['statue'])
+                Issue.objects.filter(id__in=updated).update(**values)
+                Project.update_counters(self.kwargs['project_pk'], **deltas)
+                record_changes([issues[issue_id] for issue_id in updated], 'updated')
+            invalidate_project_responses(self.kwargs['project_pk'])
+        return Response(
+            {"updated": updated, "errors": errors},
+            status=status.HTTP_200_OK if updated else status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=False, renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request, *args, **kwargs):
+        """
+        stream all the issues of the project with their comments.
+        NDJSON by default (one issue by line, with its comments),
+        CSV with ?format=csv (one row by issue, followed by its comments).
+        """
+        project_id = int(self.kwargs['project_pk'])
+        # the ASGI handler read a sync stream whole before sending it
+        asgi = isinstance(request._request, ASGIRequest)
+        if request.accepted_renderer.format == 'csv':
+            content = acsv_stream(project_id) if asgi else csv_stream(project_id)
+        else:
+            content = andjson_stream(project_id) if asgi else ndjson_stream(project_id)
+        response = StreamingHttpResponse(content, content_type=request.accepted_renderer.media_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="project-{project_id}.{request.accepted_renderer.format}"')
+        return response
+
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ResponseCacheMixin, SparseFieldsMixin, ValuesListMixin, QueryPlanMixin,
+                     ContributorAnnotationMixin, AsyncReadMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
+    values_serializer_class = CommentValuesSerializer
     permission_classes = [CommentPermissions]
+    pagination_class = PageNumberOrKeysetPagination
+    query_plans = {
+        'default': {
+            'select_related': ['author', 'issue'],
+        },
+    }
+    sparse_plans = {
+        'author': {'select_related': ['author'], 'only': ['author__username']},
+        'issue': {'select_related': ['issue'], 'only': ['issue__title']},
+    }
 
     def get_queryset(self):
-        return Comment.objects.filter(issue_id=self.kwargs['issue_pk'])
+        # only the issue of the project of the url (checked by the permissions),
+        # and the project of the comment for the permissions, without loading its issue
+        return Comment.objects.filter(
+            issue_id=self.kwargs['issue_pk'], issue__project_id=self.kwargs['project_pk']).annotate(
+            project_id=F('issue__project_id'))
+
+    def get_version_stamp(self):
+        # the permissions already checked the user is a contributor of the project
+        return project_version_stamp(self.kwargs['project_pk'])
+
+    async def aget_version_stamp(self):
+        return await aproject_version_stamp(self.kwargs['project_pk'])
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(
             instance, context={'detail_view': True})
         return Response(serializer.data)
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """
+    Full-text search over the issues and comments of the user projects.
+
+    Query parameters:
+    - q: the words to search, all of them must be found.
+    - project: ID of a project to limit the search to.
+    the results are ordered by relevance and paginated.
+    """
+
+    def list(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': "Veuillez indiquer les mots à rechercher."})
+
+        project_ids = get_project_ids(request)
+        project = request.query_params.get('project')
+        if project is not None:
+            if not project.isdigit():
+                raise ValidationError({'project': "L'ID du projet doit être un nombre."})
+            project_ids = project_ids & {int(project)}
+
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(SearchResults(query, project_ids), request, view=self)
+        return paginator.get_paginated_response(page)
+
+
+class ImportViewSet(viewsets.ViewSet):
+    """
+    Bulk import of users, projects, issues and comments (admin only).
+
+    The body is NDJSON (see importer.py), read line by line and inserted by batches.
+    the response is the import report with the errors of each invalid line.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def create(self, request):
+        importer = NDJSONImporter()
+        report = importer.run(request.stream or [])
+        return Response(
+            report,
+            status=status.HTTP_201_CREATED if importer.created else status.HTTP_400_BAD_REQUEST
+        )
+
+
+class ChangeFeedViewSet(viewsets.ViewSet):
+    """
+    Changes of the projects the user contributes to, after a cursor.
+
+    Query parameters:
+    - since: cursor of the last change read, without it only the current cursor is returned.
+    - limit: maximum number of changes read (CHANGE_FEED_PAGE_SIZE).
+    while has_more is true, the client ask again from the returned cursor.
+    """
+
+    def list(self, request):
+        params = {}
+        for name in ('since', 'limit'):
+            value = request.query_params.get(name)
+            if value is not None:
+                if not value.isdigit():
+                    raise ValidationError({name: "Veuillez indiquer un nombre positif."})
+                params[name] = int(value)
+
+        if 'since' not in params:
+            return Response({"cursor": current_cursor(), "has_more": False, "changes": []})
+        return Response(get_changes(
+            request.user, get_project_ids(request), params['since'], params.get('limit')))
+
+
+class ProjectEventViewSet(AsyncReadMixin, viewsets.GenericViewSet):
+    """
+    Server-Sent Events of the issues, comments and contributors of a project (see events.py).
+
+    an event is sent for each change, with the cursor of the change feed as id.
+    after a reconnection (Last-Event-ID header, or ?since=), the missed events are sent first.
+    the stream is always async: with a sync server it would hold a worker,
+    and only served under ASGI, the WSGI handler read the whole stream before sending it (501).
+    """
+
+    permission_classes = [IssuePermissions]
+    renderer_classes = [EventStreamRenderer]
+    pagination_class = None
+    async_actions = ['list']
+    async_formats = ['sse']
+    async_required = True
+
+    async def alist(self, request, *args, **kwargs):
+        since = request.headers.get('Last-Event-ID', request.query_params.get('since'))
+        if since is not None and not since.isdigit():
+            raise ValidationError({'since': "Veuillez indiquer un nombre positif."})
+        if not isinstance(request._request, ASGIRequest):
+            raise EventStreamUnavailable()
+        response = StreamingHttpResponse(
+            event_stream(request.user, int(self.kwargs['project_pk']),
+                         None if since is None else int(since)),
+            content_type=EventStreamRenderer.media_type)
+        response['Cache-Control'] = 'no-cache'
+        # sent as they come through nginx
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        # only reached by the requests that don't accept the stream
+        raise NotAcceptable()
+
+
+class TokenObtainPairView(jwt_views.TokenObtainPairView):
+    """
+    Login: the password is hashed for each request, even with an unknown username.
+    the logins are throttled by IP and username, and the hashes bounded by process (see hashers.py).
+    """
+
+    throttle_classes = [LoginRateThrottle, LoginUsernameRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        with hashing_slot():
+            return super().post(request, *args, **kwargs)